@@ -3,6 +3,9 @@ import launch
 if not launch.is_installed("bs4"):
     launch.run_pip("install bs4", "bs4 requirement for GDick links parsing")
 
+if not launch.is_installed("six"):
+    launch.run_pip("install six", "six requirement for Google Drive downloads")
+
 # Make this installation optional only for Firebase storage due to incompatible
 # protobuf (4.22.0) version dependency of latest (6.1.0) firebase-admin version. But tensorboard requires 3.20.0
 # Firebase version that should work fine is 4.5.0
@@ -1,7 +1,4 @@
-// add tinymce
-const script = document.createElement('script');
-script.src = 'file=extensions/sd-model-organizer/javascript/tinymce/tinymce.min.js';
-document.head.appendChild(script);
+let tinymceLoading = null
 
 let isHomeInitialStateInvoked = false
 
@@ -23,6 +20,26 @@ function logMo(text) {
     // console.log(text)
 }
 
+/**
+ * Loads tinymce on the first description display, so WebUI page load doesn't fetch the editor.
+ * @returns {Promise} resolved when tinymce is available.
+ */
+function loadTinymce() {
+    if (tinymceLoading == null) {
+        tinymceLoading = new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = 'file=extensions/sd-model-organizer/javascript/tinymce/tinymce.min.js';
+            script.onload = resolve
+            script.onerror = () => {
+                tinymceLoading = null
+                reject(new Error('Failed to load tinymce'))
+            }
+            document.head.appendChild(script);
+        })
+    }
+    return tinymceLoading
+}
+
 /**
  * Creates tinymce instance if it doesn't exist, setups theme and NOT editable content.
  * @param content - html content to display.
@@ -60,8 +77,8 @@ function setupDescriptionPreview(content, theme) {
 function handleDescriptionPreviewContentChange(content) {
     logMo('handleDescriptionPreviewContentChange')
 
-    getTheme()
-        .then(theme => {
+    Promise.all([getTheme(), loadTinymce()])
+        .then(([theme]) => {
             setupDescriptionPreview(content, theme)
         })
 
@@ -104,8 +121,8 @@ function setupDescriptionEdit(content, theme) {
 function handleDescriptionEditorContentChange(content) {
     logMo('handleDescriptionEditorContentChange')
 
-    getTheme()
-        .then(theme => {
+    Promise.all([getTheme(), loadTinymce()])
+        .then(([theme]) => {
             setupDescriptionEdit(content, theme)
         })
 
@@ -114,12 +131,13 @@ function handleDescriptionEditorContentChange(content) {
 
 function handleRecordSave() {
     logMo('Handling record save')
+    promptCache.clear()
 
     // This random token required to trigger change event in gradio in the textbox widget :/
     const token = '<[[token="' + generateUUID() + '"]]>'
 
     let output;
-    if (tinymce.get('mo-description-editor') == null) {
+    if (typeof tinymce === 'undefined' || tinymce.get('mo-description-editor') == null) {
         output = token
     } else {
         output = token + tinymce.get('mo-description-editor').getContent()
@@ -434,21 +452,6 @@ function navigateEditPrefilled(json_data, event) {
             var jsdata = textarea.value;
             opts = JSON.parse(jsdata);
 
-
-
-
-            // record_data = gradioApp().querySelector('#mo_record_info_nav_box textarea');
-
-            // if (record_data == null) return;
-            // var terminate = false;
-            // var jsdata = record_data.value;
-            // var jsdata = jsdata.replace(/'/g, '"').replace(/"checkpoint": True/mg, '"checkpoint": true').replace(/"checkpoint": False/mg, '"checkpoint": false');
-            // recordInfo = JSON.parse(jsdata);
-
-            // var weight = gradioApp().querySelector('#mo-edit-prompt-weight');
-            // weight.value = recordInfo["weight"];
-            // weight.dispatchEvent(changeEvent);
-
             if (opts['mo_autobind_file']) {
                 var bind = gradioApp().querySelector('#model_organizer_add_bind input');
                 var modelName = gradioApp().querySelector('#model_organizer_edit_name input');
@@ -463,6 +466,22 @@ function navigateEditPrefilled(json_data, event) {
     return []
 }
 
+function navigateAddLocalFile(key, event) {
+    if (event !== undefined) {
+        event.stopPropagation();
+        event.preventDefault();
+    }
+    logMo('Loading local file record for key: ' + key)
+    fetch(origin + '/mo/local-files/' + key)
+        .then(response => {
+            if (!response.ok) throw new Error('status ' + response.status);
+            return response.json();
+        })
+        .then(data => navigateEditPrefilled(JSON.stringify(data)))
+        .catch(error => logMo('Local file record request failed: ' + error));
+    return []
+}
+
 function navigateDownloadRecord(id, event) {
     if (event !== undefined) {
         event.stopPropagation();
@@ -542,6 +561,17 @@ function invokeHomeInitialStateLoad() {
     return []
 }
 
+const SEARCH_DEBOUNCE_MS = 300;
+let searchDebounceTimer = null;
+
+function debounceSearchQuery(query, stateJson) {
+    // Only the query typed last within the delay is sent, promises of the replaced ones are never resolved.
+    clearTimeout(searchDebounceTimer)
+    return new Promise(resolve => {
+        searchDebounceTimer = setTimeout(() => resolve([query, stateJson]), SEARCH_DEBOUNCE_MS)
+    })
+}
+
 function getTheme() {
     return new Promise((resolve, _) => {
         const parsedUrl = new URL(window.location.href)
@@ -638,6 +668,7 @@ const changeEvent = new Event('change', { 'bubbles': true, "composed": true });
 // Extra networks tab integration
 // Huge thanks to https://github.com/CurtisDS/sd-model-preview-xd/tree/main for how to do this
 onUiUpdate(function () {
+    observePromptCards();
 
     // get the organizer tab
     let tabs = gradioApp().querySelectorAll("#tabs > div:first-of-type button");
@@ -723,52 +754,78 @@ function addRecordClick(event, name) {
 
 }
 
+// Prompt payloads of the visible records cards, keyed by record id.
+const promptCache = new Map();
+const promptPrefetchQueue = new Set();
+let promptPrefetchTimer = null;
+const promptObserver = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            const id = entry.target.getAttribute('data-mo-record-id');
+            promptObserver.unobserve(entry.target);
+            if (!promptCache.has(id)) promptPrefetchQueue.add(id);
+        }
+    });
+    if (promptPrefetchQueue.size > 0 && promptPrefetchTimer == null) {
+        promptPrefetchTimer = setTimeout(prefetchPrompts, 100);
+    }
+}, { rootMargin: '200px' });
+
+function observePromptCards() {
+    gradioApp().querySelectorAll('[data-mo-record-id]:not([data-mo-prompt-observed])').forEach(elem => {
+        // Cards are rendered again after home content reload, prompts might be changed since they were cached.
+        promptCache.delete(elem.getAttribute('data-mo-record-id'));
+        elem.setAttribute('data-mo-prompt-observed', true);
+        promptObserver.observe(elem);
+    });
+}
+
+function prefetchPrompts() {
+    promptPrefetchTimer = null;
+    const ids = Array.from(promptPrefetchQueue);
+    promptPrefetchQueue.clear();
+    logMo('Prefetching prompts for ids: ' + ids)
+    fetch(origin + '/mo/records/prompts?ids=' + ids.join(','))
+        .then(response => response.json())
+        .then(data => {
+            Object.entries(data).forEach(([id, recordInfo]) => promptCache.set(id, recordInfo));
+        })
+        .catch(error => logMo('Prompts prefetch failed: ' + error));
+}
+
+function applyPrompt(recordInfo) {
+    if (!recordInfo.hasOwnProperty('id')) return;
+
+    if (recordInfo['checkpoint']) {
+        selectCheckpoint(recordInfo['positive_prompts']);
+        return;
+    }
+
+    const pos = recordInfo['positive_prompts'] || "";
+    const neg = recordInfo['negative_prompts'] || "";
+    if (pos !== "") {
+        cardClicked(lastTabName, pos, "", false);
+    }
+    if (neg !== "") {
+        cardClicked(lastTabName, "", neg, true);
+    }
+}
+
 function fillPrompt(recordid) {
+    const cached = promptCache.get(String(recordid));
+    if (cached !== undefined) {
+        applyPrompt(cached);
+        return []
+    }
+
     logMo('Loading record info for id: ' + recordid)
-    const navObj = {
-        screen: "record_info",
-        record_info_id: recordid,
-        token: generateUUID(),
-        backstack: populateBackstack()
-    };
-    deliverNavObject(navObj)
-    var counter = 0;
-    var timer = setInterval(() => {
-        counter++;
-        record_data = gradioApp().querySelector('#mo_record_info_nav_box textarea');
-        if (counter > 10) clearInterval(timer);
-        if (record_data == null) return;
-        var terminate = false;
-        var jsdata = record_data.value;
-        var jsdata = jsdata.replace(/'/g, '"').replace(/"checkpoint": True/mg, '"checkpoint": true').replace(/"checkpoint": False/mg, '"checkpoint": false');
-        recordInfo = JSON.parse(jsdata);
-        if (recordInfo.hasOwnProperty("id") && recordInfo["id"] === recordid) {
-            var pos = "";
-            var neg = "";
-            if (recordInfo.hasOwnProperty('positive_prompts')) {
-                pos = recordInfo['positive_prompts'];
-                terminate = true;
-            }
-            if (recordInfo.hasOwnProperty('negative_prompts')) {
-                neg = recordInfo['negative_prompts'];
-                terminate = true;
-            }
-            if (recordInfo.hasOwnProperty('checkpoint') && recordInfo['checkpoint']) {
-                selectCheckpoint(recordInfo['positive_prompts']);
-                terminate = true;
-            } else {
-                if (pos !== "") {
-                    cardClicked(lastTabName, pos, "", false);
-                }
-                if (neg !== "") {
-                    cardClicked(lastTabName, "", neg, true);
-                }
-            }
-        }
-        if (terminate) {
-            clearInterval(timer);
-        }
-    }, 100)
+    fetch(origin + '/mo/records/' + recordid + '/prompt')
+        .then(response => response.json())
+        .then(recordInfo => {
+            if (recordInfo.hasOwnProperty('id')) promptCache.set(String(recordid), recordInfo);
+            applyPrompt(recordInfo);
+        })
+        .catch(error => logMo('Record info request failed: ' + error));
 
     return []
 }
@@ -1,9 +1,54 @@
 import os
+import re
+from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 
 from scripts.mo.environment import logger, env
 
+_BLOB_CHUNK_SIZE = 1024 * 1024
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _parse_range(range_header: str, size: int):
+    """
+    Parses single "bytes" range header.
+    :return: tuple of first and last byte positions or None if range is not satisfiable.
+    """
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if match is None or not any(match.groups()):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        # Suffix range, the last N bytes.
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def _check_api_control():
+    from fastapi import HTTPException
+
+    if not env.api_control():
+        raise HTTPException(status_code=403, detail='Changing downloads and jobs via API is disabled')
+
+
+def _iter_file(path: str, start: int, end: int):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = file.read(min(_BLOB_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
 
 def init_extension_api(app: FastAPI):
     @app.get('/mo/display-options')
@@ -24,4 +69,180 @@ def init_extension_api(app: FastAPI):
 
         return FileResponse(filename, headers={"Accept-Ranges": "bytes"})
 
+    @app.get('/mo/records/prompts')
+    def get_records_prompts(ids: str = ""):
+        from scripts.mo.utils import get_json_record_data
+
+        result = {}
+        for record_id in filter(None, ids.split(',')):
+            if record_id.isdigit():
+                data = get_json_record_data(int(record_id))
+                # Empty payloads (network not loaded yet) are skipped to not be cached by the client.
+                if data:
+                    result[record_id] = data
+        return result
+
+    @app.get('/mo/records/{record_id}/prompt')
+    def get_record_prompt(record_id: int):
+        from scripts.mo.utils import get_json_record_data
+
+        return get_json_record_data(record_id)
+
+    @app.get('/mo/local-files/{key}')
+    def get_local_file_record(key: str):
+        from fastapi import HTTPException
+        from scripts.mo.data.record_utils import get_local_file_record
+        from scripts.mo.data.storage import map_record_to_dict
+
+        record = get_local_file_record(key)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f'Local file not found: {key}')
+        return map_record_to_dict(record)
+
+    @app.get('/mo/jobs')
+    def get_jobs(limit: int = 50):
+        from scripts.mo.jobs import JobManager
+        return JobManager.instance().list_jobs(limit)
+
+    @app.get('/mo/jobs/{job_id}')
+    def get_job(job_id: str):
+        from fastapi import HTTPException
+        from scripts.mo.jobs import JobManager
+
+        job = JobManager.instance().get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f'Job not found: {job_id}')
+        return job
+
+    @app.post('/mo/jobs/{job_id}/cancel')
+    def cancel_job(job_id: str):
+        from scripts.mo.jobs import JobManager
+
+        _check_api_control()
+        return {'cancelled': JobManager.instance().cancel(job_id)}
+
+    @app.get('/mo/downloads/queue')
+    def get_download_queue(limit: int = 100):
+        from scripts.mo.dl.download_queue import DownloadQueue
+        return DownloadQueue.instance().list_items(limit)
+
+    @app.post('/mo/downloads/queue')
+    def enqueue_downloads(ids: str = ""):
+        from fastapi import HTTPException
+        from scripts.mo.dl.download_queue import DownloadQueue
+
+        _check_api_control()
+        record_ids = [int(record_id) for record_id in filter(None, ids.split(',')) if record_id.isdigit()]
+        if not record_ids:
+            raise HTTPException(status_code=400, detail='No record ids passed')
+        return {'items': DownloadQueue.instance().enqueue(record_ids)}
+
+    @app.post('/mo/downloads/queue/{item_id}/cancel')
+    def cancel_queued_download(item_id: int):
+        from scripts.mo.dl.download_queue import DownloadQueue
+
+        _check_api_control()
+        return {'cancelled': DownloadQueue.instance().cancel([item_id]) > 0}
+
+    @app.post('/mo/downloads/queue/{item_id}/retry')
+    def retry_queued_download(item_id: int):
+        from scripts.mo.dl.download_queue import DownloadQueue
+
+        _check_api_control()
+        return {'queued': DownloadQueue.instance().retry([item_id]) > 0}
+
+    @app.get('/mo/downloads/bandwidth')
+    def get_download_bandwidth():
+        from scripts.mo.dl.bandwidth import BandwidthShaper
+        return BandwidthShaper.instance().get_limits()
+
+    @app.post('/mo/downloads/bandwidth')
+    def set_download_bandwidth(limit: Optional[int] = None, download_limit: Optional[int] = None):
+        from scripts.mo.dl.bandwidth import BandwidthShaper
+
+        _check_api_control()
+        shaper = BandwidthShaper.instance()
+        shaper.set_limits(limit, download_limit)
+        return shaper.get_limits()
+
+    @app.delete('/mo/downloads/bandwidth')
+    def reset_download_bandwidth():
+        from scripts.mo.dl.bandwidth import BandwidthShaper
+
+        _check_api_control()
+        shaper = BandwidthShaper.instance()
+        shaper.reset_limits()
+        return shaper.get_limits()
+
+    @app.get('/mo/downloads/history')
+    def get_download_history(limit: int = 100):
+        from scripts.mo.dl.download_history import DownloadHistory
+        return DownloadHistory.instance().list_entries(limit)
+
+    @app.get('/mo/downloads/hosts')
+    def get_download_host_stats():
+        from scripts.mo.dl.download_history import DownloadHistory
+        return DownloadHistory.instance().host_stats()
+
+    @app.get('/mo/downloads/daily')
+    def get_download_daily_stats(days: int = 30):
+        from scripts.mo.dl.download_history import DownloadHistory
+        return DownloadHistory.instance().daily_stats(days)
+
+    @app.get('/mo/metrics')
+    def get_metrics():
+        from starlette.responses import Response
+        from scripts.mo import metrics
+        return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    @app.get('/mo/debug/timings')
+    def get_timings():
+        from scripts.mo import tracing
+        return tracing.get_report()
+
+    @app.post('/mo/debug/timings/reset')
+    def reset_timings():
+        from scripts.mo import tracing
+
+        _check_api_control()
+        tracing.reset()
+        return {'reset': True}
+
+    @app.api_route('/mo/blobs/{sha256}', methods=['GET', 'HEAD'])
+    def get_blob(sha256: str, request: Request):
+        from fastapi import HTTPException
+        from starlette.responses import Response, StreamingResponse
+        from scripts.mo.dl.peer_downloader import find_blob_file, is_sha256
+
+        if not env.serve_blobs():
+            raise HTTPException(status_code=403, detail='Serving model files is disabled')
+
+        path = find_blob_file(sha256) if is_sha256(sha256) else None
+        if path is None:
+            raise HTTPException(status_code=404, detail=f'File not found: {sha256}')
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status_code = 200
+        range_header = request.headers.get('range')
+        if range_header:
+            byte_range = _parse_range(range_header, size)
+            if byte_range is None:
+                return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+            start, end = byte_range
+            status_code = 206
+
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Length': str(end - start + 1),
+            'ETag': f'"{sha256.lower()}"'
+        }
+        if status_code == 206:
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+        if request.method == 'HEAD':
+            return Response(status_code=status_code, headers=headers)
+        return StreamingResponse(_iter_file(path, start, end), status_code=status_code, headers=headers,
+                                 media_type='application/octet-stream')
+
     logger.debug('Model Organizer API initialized')
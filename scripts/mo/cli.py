@@ -0,0 +1,340 @@
+"""
+Command line interface to Model Organizer for use without the WebUI, e.g. from provisioning scripts.
+Run it from the extension directory:
+
+    python -m scripts.mo.cli import records.json
+    python -m scripts.mo.cli download --missing --workers 4
+    python -m scripts.mo.cli sync manifest.json.gz
+
+Settings are read from the WebUI config.json, "--set mo_option=value" overrides them.
+Each command prints a single JSON document to stdout, logs and progress go to stderr.
+Exit code is 0 on success, 1 if the command failed or was cancelled.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from scripts.mo.data.records_io import FORMAT_JSON, FORMAT_NDJSON
+from scripts.mo.environment import env, logger, STORAGE_SQLITE
+from scripts.mo.jobs import JobContext, JobCancelled
+from scripts.mo.models import ModelType
+
+_EXTENSION_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_WEBUI_CONFIG_FILE = 'config.json'
+_PROGRESS_INTERVAL = 1
+_DEFAULT_DOWNLOAD_WORKERS = 3
+
+
+class _CommandError(Exception):
+    pass
+
+
+class _CliJobContext(JobContext):
+    """
+    Runs job functions in the CLI process, progress is printed to stderr instead of the jobs table.
+    Jobs are not registered in the JobManager, so a running WebUI sharing the data dir is not affected.
+    """
+
+    def __init__(self, title: str):
+        super().__init__(None, title)
+        self._printed_at = 0
+
+    def progress(self, processed: int, total: int = None, message: str = None):
+        now = time.time()
+        if now - self._printed_at < _PROGRESS_INTERVAL:
+            return
+        self._printed_at = now
+        counter = f'{processed}/{total}' if total is not None else str(processed)
+        print(f'{self.job_id}: {counter} {message or ""}'.rstrip(), file=sys.stderr, flush=True)
+
+
+def _run_job(title: str, fn, *args):
+    """
+    Runs job function on a background thread, so Ctrl+C cancels it the same way as the UI "Stop" button.
+    :return: job function result.
+    """
+    context = _CliJobContext(title)
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = fn(context, *args)
+        except JobCancelled:
+            pass
+        except Exception as ex:
+            logger.exception(ex)
+            outcome['error'] = str(ex)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    while thread.is_alive():
+        try:
+            thread.join(0.5)
+        except KeyboardInterrupt:
+            print(f'{title}: cancelling', file=sys.stderr, flush=True)
+            context.cancel_event.set()
+
+    if 'error' in outcome:
+        raise _CommandError(outcome['error'])
+    if context.is_cancelled():
+        raise _CommandError('Cancelled')
+    return outcome.get('result')
+
+
+def _parse_option_value(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _load_options(args) -> dict:
+    options = {}
+    config_path = os.path.join(args.webui_dir, _WEBUI_CONFIG_FILE)
+    if os.path.isfile(config_path):
+        with open(config_path, encoding='utf-8') as file:
+            options = {key: value for key, value in json.load(file).items() if key.startswith('mo_')}
+
+    for item in args.set:
+        key, separator, value = item.partition('=')
+        if not separator:
+            raise _CommandError(f'Option should be set as key=value: {item}')
+        options[key.strip()] = _parse_option_value(value)
+    return options
+
+
+def _configure_env(args):
+    """
+    Sets up the environment the same way as scripts/model_organizer.py does inside the WebUI.
+    """
+    options = _load_options(args)
+    models_dir = args.models_dir or os.path.join(args.webui_dir, 'models')
+
+    def option(key, default):
+        return lambda: options.get(key, default)
+
+    def path_option(key, default):
+        return lambda: options.get(key) or default
+
+    env.script_dir = args.data_dir
+    env.database_dir = lambda: args.database_dir or env.script_dir
+    env.storage_type = option('mo_storage_type', STORAGE_SQLITE)
+    env.download_preview = option('mo_download_preview', True)
+    env.resize_preview = option('mo_resize_preview', True)
+    env.nsfw_blur = option('mo_nsfw_blur', True)
+    env.prefill_pos_prompt = option('mo_prefill_pos_prompt', True)
+    env.prefill_neg_prompt = option('mo_prefill_neg_prompt', True)
+    env.autobind_file = option('mo_autobind_file', True)
+    env.api_key = option('mo_api_key', '')
+    env.check_duplicates = option('mo_check_duplicates', False)
+    env.model_path = path_option('mo_model_path', os.path.join(models_dir, 'Stable-diffusion'))
+    env.vae_path = path_option('mo_vae_path', os.path.join(models_dir, 'VAE'))
+    env.lora_path = path_option('mo_lora_path', os.path.join(models_dir, 'Lora'))
+    env.hypernetworks_path = path_option('mo_hypernetworks_path', os.path.join(models_dir, 'hypernetworks'))
+    env.lycoris_path = path_option('mo_lycoris_path', os.path.join(models_dir, 'LyCORIS'))
+    env.embeddings_path = path_option('mo_embeddings_path', os.path.join(args.webui_dir, 'embeddings'))
+    env.blob_store_enabled = option('mo_blob_store_enabled', False)
+    env.blob_store_path = path_option('mo_blob_store_path', os.path.join(models_dir, 'mo-blob-store'))
+    env.shared_cache_path = option('mo_shared_cache_path', '')
+    env.serve_blobs = lambda: False
+    env.api_control = lambda: False
+    env.peers = option('mo_peers', '')
+    env.mirror_racing = option('mo_mirror_racing', False)
+    env.download_workers = option('mo_download_workers', 1)
+    env.download_retries = option('mo_download_retries', 2)
+    env.download_limit = option('mo_download_limit', 0)
+    env.download_file_limit = option('mo_download_file_limit', 0)
+    env.download_limit_schedule = option('mo_download_limit_schedule', '')
+    env.is_debug_mode_enabled = lambda: False
+
+    from scripts.mo.data.init_storage import initialize_storage
+    initialize_storage()
+    if env.is_storage_has_errors():
+        raise _CommandError(env.storage_error)
+
+
+def _scan_command(args) -> dict:
+    from scripts.mo.data.hash_index import HashIndex
+    from scripts.mo.utils import get_model_files_in_dir, calculate_file_temp_hash
+
+    record_ids = {record.location: record.id_ for record in env.storage.get_all_records(list_view=True)
+                  if record.location}
+    hash_index = HashIndex.instance()
+    files = []
+    for model_type in ModelType:
+        dir_path = env.get_model_path(model_type) if model_type != ModelType.OTHER else None
+        if not dir_path:
+            continue
+        for path in get_model_files_in_dir(dir_path):
+            files.append({
+                'path': path,
+                'model_type': model_type.value,
+                'size': os.path.getsize(path),
+                'record_id': record_ids.get(path),
+                # Only already indexed hashes are reported, "hash" command calculates the rest.
+                'sha256': hash_index.get(path, calculate_file_temp_hash(path))
+            })
+    return {'count': len(files), 'files': files}
+
+
+def _hash_command(args) -> dict:
+    from scripts.mo.data import library_hashing
+    return _run_job('Hash model library', library_hashing.run_library_hashing, args.force)
+
+
+def _import_records_job(job: JobContext, path: str) -> dict:
+    from scripts.mo.data.records_io import import_records
+
+    imported_count = 0
+    for batch in import_records(path):
+        imported_count += len(batch)
+        job.progress(imported_count)
+        job.check_cancelled()
+    return {'count': imported_count}
+
+
+def _import_command(args) -> dict:
+    if not os.path.isfile(args.file):
+        raise _CommandError(f'File not found: {args.file}')
+    return _run_job(f'Import {os.path.basename(args.file)}', _import_records_job, args.file)
+
+
+def _export_command(args) -> dict:
+    from scripts.mo.data.records_io import export_records
+
+    export_format = args.format
+    if export_format is None:
+        export_format = FORMAT_NDJSON if '.ndjson' in os.path.basename(args.file) else FORMAT_JSON
+    count = export_records(env.storage.iterate_all_records(), args.file, export_format)
+    return {'count': count, 'path': os.path.abspath(args.file), 'format': export_format}
+
+
+def _download_records_job(job: JobContext, records: list, workers: int) -> dict:
+    from scripts.mo.dl.download_manager import DownloadManager
+
+    done = []
+    lock = threading.Lock()
+
+    def on_record_done(record, state):
+        with lock:
+            done.append(record.id_)
+            job.progress(len(done), len(records), record.name)
+
+    states = DownloadManager.download_records_parallel(records, job.cancel_event, workers, on_record_done)
+    return {
+        str(record_id): {
+            'status': state.get('status'),
+            'destination': state.get('destination'),
+            'exception': str(state['exception']) if state.get('exception') is not None else None
+        } for record_id, state in states.items()
+    }
+
+
+def _download_command(args) -> dict:
+    from scripts.mo.dl.download_manager import RECORD_STATUS_COMPLETED, RECORD_STATUS_EXISTS
+
+    if args.missing:
+        records = [record for record in env.storage.get_all_records(list_view=True)
+                   if record.download_url and not (record.location and os.path.isfile(record.location))]
+    else:
+        records = []
+        for record_id in args.ids:
+            record = env.storage.get_record_by_id(record_id)
+            if record is None:
+                raise _CommandError(f'Record not found: {record_id}')
+            records.append(record)
+
+    states = _run_job('Download', _download_records_job, records, args.workers)
+    failed = [record_id for record_id, state in states.items()
+              if state['status'] not in (RECORD_STATUS_COMPLETED, RECORD_STATUS_EXISTS)]
+    return {'count': len(records), 'failed': failed, 'records': states}
+
+
+def _sync_command(args) -> dict:
+    from scripts.mo.data import manifest_sync
+
+    if not os.path.isfile(args.manifest):
+        raise _CommandError(f'File not found: {args.manifest}')
+    if args.plan:
+        return _run_job('Sync plan', manifest_sync.plan_manifest_sync, args.manifest)
+    return _run_job('Sync', manifest_sync.run_manifest_sync, args.manifest)
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m scripts.mo.cli',
+                                     description='Model Organizer command line interface.')
+    parser.add_argument('--webui-dir', default=os.path.dirname(os.path.dirname(_EXTENSION_DIR)),
+                        help='WebUI directory, settings are read from its config.json '
+                             '(default: two levels above the extension directory)')
+    parser.add_argument('--models-dir', help='Models directory (default: <webui-dir>/models)')
+    parser.add_argument('--data-dir', default=_EXTENSION_DIR,
+                        help='Directory with extension data: hash index, jobs, settings (default: extension directory)')
+    parser.add_argument('--database-dir', help='Directory with the SQLite database (default: data dir)')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='Override Model Organizer setting, e.g. --set mo_lora_path=/models/lora. '
+                             'Value is parsed as JSON if possible.')
+    parser.add_argument('--verbose', action='store_true', help='Enable debug logging')
+
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('scan', help='List model files with bound records and indexed hashes') \
+        .set_defaults(handler=_scan_command)
+
+    hash_parser = commands.add_parser('hash', help='Calculate SHA256 of all model files into the hash index')
+    hash_parser.add_argument('--force', action='store_true', help='Rehash files that are already indexed')
+    hash_parser.set_defaults(handler=_hash_command)
+
+    import_parser = commands.add_parser('import', help='Import records from .json, .ndjson or gzip compressed file')
+    import_parser.add_argument('file')
+    import_parser.set_defaults(handler=_import_command)
+
+    export_parser = commands.add_parser('export', help='Export all records, gzip compressed if file ends with .gz')
+    export_parser.add_argument('file')
+    export_parser.add_argument('--format', choices=[FORMAT_JSON, FORMAT_NDJSON],
+                               help='Output format (default: ndjson for .ndjson files, json otherwise)')
+    export_parser.set_defaults(handler=_export_command)
+
+    download_parser = commands.add_parser('download', help='Download model files of records')
+    download_target = download_parser.add_mutually_exclusive_group(required=True)
+    download_target.add_argument('--ids', type=int, nargs='+', help='Record ids to download')
+    download_target.add_argument('--missing', action='store_true',
+                                 help='Download all records that have download URL and no local file')
+    download_parser.add_argument('--workers', type=int, default=_DEFAULT_DOWNLOAD_WORKERS,
+                                 help=f'Concurrent downloads (default: {_DEFAULT_DOWNLOAD_WORKERS})')
+    download_parser.set_defaults(handler=_download_command)
+
+    sync_parser = commands.add_parser('sync', help='Sync records and model files to exported records manifest')
+    sync_parser.add_argument('manifest')
+    sync_parser.add_argument('--plan', action='store_true', help='Only print the plan, change nothing')
+    sync_parser.set_defaults(handler=_sync_command)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = _create_parser().parse_args(argv)
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        for handler in logger.handlers:
+            handler.setLevel(logging.DEBUG)
+
+    try:
+        _configure_env(args)
+        output = args.handler(args)
+        # Commands processing several items succeed partially, failed items are listed in the output.
+        exit_code = 1 if isinstance(output, dict) and output.get('failed') else 0
+    except _CommandError as ex:
+        output = {'error': str(ex)}
+        exit_code = 1
+
+    json.dump(output, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
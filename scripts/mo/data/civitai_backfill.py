@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from scripts.mo.data.hash_index import HashIndex
+from scripts.mo.environment import env, logger
+from scripts.mo.jobs import JobContext
+from scripts.mo.models import ModelType
+from scripts.mo.utils import get_model_files_in_dir, find_info_file, get_model_filename_without_extension
+
+_STATE_FILENAME = 'civitai_backfill.json'
+_BY_HASH_URL = 'https://civitai.com/api/v1/model-versions/by-hash/{hash}'
+_BULK_BY_HASH_URL = 'https://civitai.com/api/v1/model-versions/by-hash'
+_INFO_EXTENSION = '.civitai.info'
+
+_BATCH_SIZE = 50
+_MAX_WORKERS = 4
+_MAX_RETRIES = 3
+_REQUEST_TIMEOUT = 15
+_DEFAULT_RETRY_AFTER = 10
+
+LOOKUP_FOUND = 'found'
+LOOKUP_NOT_FOUND = 'not_found'
+LOOKUP_ERROR = 'error'
+
+JOB_KIND = 'civitai_backfill'
+
+
+def _get_state_file():
+    return os.path.join(env.script_dir, _STATE_FILENAME)
+
+
+def _read_lookup_state() -> dict:
+    path = _get_state_file()
+    if os.path.isfile(path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except Exception as ex:
+            logger.warning('Failed to read Civitai backfill state: %s', ex)
+    return {}
+
+
+def _write_lookup_state(state: dict):
+    with open(_get_state_file(), 'w') as file:
+        json.dump(state, file, indent=4)
+
+
+def _info_file_path(model_file_path) -> str:
+    filename_no_ext = get_model_filename_without_extension(model_file_path)
+    return os.path.join(os.path.dirname(model_file_path), filename_no_ext + _INFO_EXTENSION)
+
+
+def _find_unbound_files_without_info() -> List:
+    model_files = []
+    for model_type in ModelType:
+        if model_type == ModelType.OTHER:
+            continue
+        dir_path = env.get_model_path(model_type)
+        if dir_path:
+            model_files.extend(get_model_files_in_dir(dir_path))
+
+    bound_files = set(filter(None, env.storage.get_all_records_locations()))
+    return [path for path in model_files if path not in bound_files and find_info_file(path) is None]
+
+
+def _request(method: str, url: str, stop_event: threading.Event, **kwargs):
+    """
+    Sends Civitai API request, waits and retries when the rate limit is reached.
+    :return: response or None if the request failed or was interrupted.
+    """
+    headers = {'Content-Type': 'application/json'}
+    api_key = env.api_key()
+    if api_key:
+        headers['Authorization'] = 'Bearer ' + api_key
+
+    for _ in range(_MAX_RETRIES):
+        if stop_event.is_set():
+            break
+        try:
+            response = requests.request(method, url, headers=headers, timeout=_REQUEST_TIMEOUT, **kwargs)
+        except Exception as ex:
+            logger.warning('Civitai request %s failed: %s', url, ex)
+            return None
+
+        if response.status_code != 429:
+            return response
+        retry_after = response.headers.get('Retry-After')
+        delay = int(retry_after) if retry_after is not None and retry_after.isdigit() else _DEFAULT_RETRY_AFTER
+        logger.debug('Civitai rate limit reached, retrying in %s seconds', delay)
+        stop_event.wait(delay)
+    return None
+
+
+def _fetch_version_by_hash(sha256: str, stop_event: threading.Event):
+    """
+    Requests Civitai model version by SHA256 file hash.
+    :param sha256: file hash.
+    :param stop_event: event to interrupt retries.
+    :return: tuple of lookup result and model version json (if found).
+    """
+    response = _request('GET', _BY_HASH_URL.format(hash=sha256), stop_event)
+    if response is None:
+        return LOOKUP_ERROR, None
+    if response.status_code == 200:
+        return LOOKUP_FOUND, response.json()
+    elif response.status_code == 404:
+        return LOOKUP_NOT_FOUND, None
+    logger.warning('Civitai lookup for %s returned status code: %s', sha256, response.status_code)
+    return LOOKUP_ERROR, None
+
+
+def _fetch_versions_by_hashes(hashes: List[str], stop_event: threading.Event) -> Optional[Dict[str, dict]]:
+    """
+    Requests Civitai model versions of several SHA256 file hashes at once.
+    :param hashes: file hashes.
+    :param stop_event: event to interrupt retries.
+    :return: model version json by lowercase file hash, hashes that were not found are missing.
+    None if the request failed.
+    """
+    response = _request('POST', _BULK_BY_HASH_URL, stop_event, json=hashes)
+    if response is None or response.status_code != 200:
+        logger.warning('Civitai bulk lookup failed: %s', response.status_code if response is not None else None)
+        return None
+
+    versions = {}
+    for version_json in response.json():
+        for file in version_json.get('files') or []:
+            sha256 = ((file.get('hashes') or {}).get('SHA256') or '').lower()
+            if sha256:
+                versions[sha256] = version_json
+    return versions
+
+
+def _lookup_hashes(hashes: List[str], executor: ThreadPoolExecutor, stop_event: threading.Event) -> Dict[str, tuple]:
+    """
+    Looks up the hashes with a single bulk request. Hashes missing from its response are looked up with a request
+    per hash, as the bulk response may be limited, so only a 404 of the single lookup marks a file as not found.
+    :return: tuple of lookup result and model version json (if found) by file hash.
+    """
+    versions = (_fetch_versions_by_hashes(hashes, stop_event) if hashes else None) or {}
+    results = {sha256: (LOOKUP_FOUND, versions[sha256.lower()]) for sha256 in hashes if sha256.lower() in versions}
+
+    futures = {sha256: executor.submit(_fetch_version_by_hash, sha256, stop_event) for sha256 in hashes
+               if sha256 not in results}
+    results.update({sha256: future.result() for sha256, future in futures.items()})
+    return results
+
+
+def _progress_message(counters: dict) -> str:
+    return f"Found: {counters['found']}, not found: {counters['not_found']}, errors: {counters['errors']}"
+
+
+def run_civitai_backfill(job: JobContext, retry_not_found: bool = False) -> dict:
+    """
+    Job that fills Civitai metadata for unbound local model files using cached SHA256 hashes.
+    Results are persisted as ".civitai.info" files next to the models, so they are picked up by the home screen
+    without additional requests. Misses are tracked in the state file, so each file is looked up only once.
+    :param job: job context.
+    :param retry_not_found: look up again files that were not found on previous runs.
+    :return: lookup counters.
+    """
+    files = _find_unbound_files_without_info()
+    counters = {'processed': 0, 'found': 0, 'not_found': 0, 'errors': 0}
+    job.progress(0, len(files), _progress_message(counters))
+
+    lookup_state = _read_lookup_state()
+    hash_index = HashIndex.instance()
+
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        for start in range(0, len(files), _BATCH_SIZE):
+            if job.is_cancelled():
+                break
+            batch = files[start:start + _BATCH_SIZE]
+            _process_batch(job, batch, executor, lookup_state, hash_index, retry_not_found, counters)
+            _write_lookup_state(lookup_state)
+
+    return counters
+
+
+def _process_batch(job: JobContext, batch: List, executor: ThreadPoolExecutor, lookup_state: dict,
+                   hash_index: HashIndex, retry_not_found: bool, counters: dict):
+    def count(**kwargs):
+        for key, value in kwargs.items():
+            counters[key] += value
+        job.progress(counters['processed'], message=_progress_message(counters))
+
+    pending = {}
+    for path in batch:
+        if job.is_cancelled():
+            return
+        try:
+            sha256 = hash_index.get_sha256(path)
+        except OSError as ex:
+            logger.warning('Failed to hash %s: %s', path, ex)
+            count(errors=1, processed=1)
+            continue
+        entry = lookup_state.get(sha256)
+        if entry is not None and entry['status'] == LOOKUP_NOT_FOUND and not retry_not_found:
+            count(processed=1)
+            continue
+        pending.setdefault(sha256, []).append(path)
+
+    results = _lookup_hashes(list(pending), executor, job.cancel_event)
+    for sha256, paths in pending.items():
+        result, version_json = results[sha256]
+
+        if result == LOOKUP_FOUND:
+            for path in paths:
+                try:
+                    with open(_info_file_path(path), 'w') as file:
+                        json.dump(version_json, file, indent=4)
+                    count(found=1)
+                except OSError as ex:
+                    logger.warning('Failed to save Civitai info for %s: %s', path, ex)
+                    count(errors=1)
+        elif result == LOOKUP_NOT_FOUND:
+            count(not_found=len(paths))
+        else:
+            count(errors=len(paths))
+
+        if result != LOOKUP_ERROR:
+            lookup_state[sha256] = {'status': result, 'checked_at': time.time()}
+        count(processed=len(paths))
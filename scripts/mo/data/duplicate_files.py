@@ -0,0 +1,213 @@
+import hashlib
+import os
+import uuid
+from typing import Dict, List, Optional
+
+from scripts.mo.data.hash_index import HashIndex
+from scripts.mo.data.library_hashing import find_model_files
+from scripts.mo.environment import env, logger
+from scripts.mo.jobs import JobContext
+from scripts.mo.models import ModelType
+from scripts.mo.utils import calculate_file_temp_hash
+
+_PARTIAL_HASH_SIZE = 64 * 1024
+
+MODE_HARDLINK = 'Replace with hardlinks'
+MODE_REMOVE = 'Remove duplicates'
+
+FIND_JOB_KIND = 'find_duplicate_files'
+RESOLVE_JOB_KIND = 'resolve_duplicate_files'
+
+
+def _partial_hash(path: str, size: int) -> str:
+    """
+    Hashes the first and the last blocks of the file, enough to tell apart most files of the same size.
+    """
+    md5_hash = hashlib.md5()
+    with open(path, 'rb') as file:
+        md5_hash.update(file.read(_PARTIAL_HASH_SIZE))
+        if size > _PARTIAL_HASH_SIZE * 2:
+            file.seek(-_PARTIAL_HASH_SIZE, os.SEEK_END)
+            md5_hash.update(file.read(_PARTIAL_HASH_SIZE))
+    return md5_hash.hexdigest()
+
+
+def _split_by(paths: List, key_fn) -> List[List]:
+    buckets = {}
+    for path in paths:
+        try:
+            key = key_fn(path)
+        except OSError as ex:
+            logger.warning('Failed to read %s: %s', path, ex)
+            continue
+        buckets.setdefault(key, []).append(path)
+    return [bucket for bucket in buckets.values() if len(bucket) > 1]
+
+
+def _model_root(path: str) -> Optional[str]:
+    """
+    :return: the deepest model type directory containing the path or None for files outside of model directories.
+    """
+    path = os.path.realpath(path)
+    roots = [os.path.realpath(env.get_model_path(model_type)) for model_type in ModelType
+             if model_type != ModelType.OTHER and env.get_model_path(model_type)]
+    roots = [root for root in roots if os.path.commonpath([root, path]) == root]
+    return max(roots, key=len) if roots else None
+
+
+def is_removable_duplicate(keeper: str, duplicate: str) -> bool:
+    """
+    A duplicate may be removed only if it is in the same model type directory as the kept file, otherwise WebUI would
+    not find the model of the other type anymore.
+    """
+    root = _model_root(keeper)
+    return root is not None and root == _model_root(duplicate)
+
+
+def _choose_keeper(paths: List, aliases: Dict[str, List], bound_locations: set) -> str:
+    """
+    Keeps the file bound to a record, otherwise the oldest one.
+    """
+    def is_bound(path):
+        return any(alias in bound_locations for alias in aliases[path])
+
+    keeper = min(paths, key=lambda path: (not is_bound(path), os.path.getmtime(path), path))
+    return next((alias for alias in aliases[keeper] if alias in bound_locations), keeper)
+
+
+def find_duplicate_files(job: JobContext) -> dict:
+    """
+    Job that finds identical model files. Files are bucketed by size, then compared by head and tail partial hash,
+    full SHA256 is calculated only for files that still collide. Hardlinks of the same file are compared once
+    and reported together, as space is reclaimed only when all of them are resolved.
+    :param job: job context.
+    :return: duplicate groups and reclaimable space in bytes.
+    """
+    by_inode: Dict[tuple, str] = {}
+    aliases: Dict[str, List] = {}
+    sizes = {}
+    for path in find_model_files():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        inode = (stat.st_dev, stat.st_ino)
+        if inode in by_inode:
+            aliases[by_inode[inode]].append(path)
+        else:
+            by_inode[inode] = path
+            aliases[path] = [path]
+            sizes[path] = stat.st_size
+
+    size_buckets = _split_by(list(sizes), lambda path: sizes[path])
+    candidates = [path for bucket in size_buckets for path in bucket]
+    job.progress(0, len(candidates), f'Files with the same size: {len(candidates)}')
+
+    partial_buckets = []
+    for bucket in size_buckets:
+        job.check_cancelled()
+        partial_buckets.extend(_split_by(bucket, lambda path: _partial_hash(path, sizes[path])))
+
+    hash_index = HashIndex.instance()
+    processed = 0
+    total = sum(len(bucket) for bucket in partial_buckets)
+    job.progress(processed, total, f'Files with the same partial hash: {total}')
+
+    def full_hash(path):
+        nonlocal processed
+        job.check_cancelled()
+        sha256 = hash_index.get_sha256(path)
+        processed += 1
+        job.progress(processed, total, os.path.basename(path))
+        return sha256
+
+    bound_locations = set(filter(None, env.storage.get_all_records_locations()))
+    groups = []
+    for bucket in partial_buckets:
+        for duplicates in _split_by(bucket, full_hash):
+            keeper = _choose_keeper(duplicates, aliases, bound_locations)
+            size = sizes[duplicates[0]]
+            groups.append({
+                'sha256': hash_index.get_sha256(keeper),
+                'size': size,
+                'keep': keeper,
+                'duplicates': sorted(alias for path in duplicates for alias in aliases[path]
+                                     if not os.path.samefile(alias, keeper)),
+                'reclaimable': size * (len(duplicates) - 1)
+            })
+
+    groups.sort(key=lambda group: group['reclaimable'], reverse=True)
+    reclaimable = sum(group['reclaimable'] for group in groups)
+    job.progress(total, total, f'Duplicate groups: {len(groups)}, reclaimable: {reclaimable / 1024 ** 3:.2f} GB')
+    return {'groups': groups, 'reclaimable': reclaimable}
+
+
+def _replace_with_hardlink(keeper: str, duplicate: str):
+    temp_path = f'{duplicate}.{uuid.uuid4().hex}.tmp'
+    os.link(keeper, temp_path)
+    try:
+        os.replace(temp_path, duplicate)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+
+def resolve_duplicate_files(job: JobContext, groups: List[dict], mode: str) -> dict:
+    """
+    Job that replaces duplicate files with hardlinks to the kept file or removes them.
+    Each file is verified against the kept file hash before it is touched. Only duplicates in the same model type
+    directory as the kept file are removed, others are replaced with hardlinks in both modes. Records bound to removed
+    files are moved to the kept file.
+    :param job: job context.
+    :param groups: duplicate groups found by find_duplicate_files.
+    :param mode: MODE_HARDLINK or MODE_REMOVE.
+    :return: counters and reclaimed space in bytes.
+    """
+    hash_index = HashIndex.instance()
+    counters = {'resolved': 0, 'skipped': 0, 'reclaimed': 0}
+    removed_locations = {}
+    total = sum(len(group['duplicates']) for group in groups)
+
+    for group in groups:
+        keeper = group['keep']
+        if not os.path.isfile(keeper) or hash_index.get_sha256(keeper) != group['sha256']:
+            logger.warning('Kept file changed, skipping duplicates of %s', keeper)
+            counters['skipped'] += len(group['duplicates'])
+            continue
+
+        for duplicate in group['duplicates']:
+            job.check_cancelled()
+            try:
+                if not os.path.isfile(duplicate) or os.path.samefile(keeper, duplicate) or \
+                        hash_index.get_sha256(duplicate) != group['sha256']:
+                    counters['skipped'] += 1
+                    continue
+
+                # Space is freed once the last link to the duplicate data is gone.
+                is_last_link = os.stat(duplicate).st_nlink == 1
+                if mode == MODE_HARDLINK or not is_removable_duplicate(keeper, duplicate):
+                    _replace_with_hardlink(keeper, duplicate)
+                    # Linking changes the inode ctime, both paths are indexed right away to avoid rehashing.
+                    for path in (keeper, duplicate):
+                        hash_index.put(path, calculate_file_temp_hash(path), group['size'], group['sha256'])
+                else:
+                    os.remove(duplicate)
+                    removed_locations[duplicate] = keeper
+                counters['resolved'] += 1
+                if is_last_link:
+                    counters['reclaimed'] += group['size']
+            except OSError as ex:
+                # Hardlinks can't cross devices, such files are left as is.
+                logger.warning('Failed to resolve duplicate %s: %s', duplicate, ex)
+                counters['skipped'] += 1
+            job.progress(counters['resolved'] + counters['skipped'], total)
+
+    if removed_locations:
+        records = [record for record in env.storage.get_all_records(list_view=True)
+                   if record.location in removed_locations]
+        for record in records:
+            record.location = removed_locations[record.location]
+        if records:
+            env.storage.update_records(records)
+
+    return counters
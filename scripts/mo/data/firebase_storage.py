@@ -1,16 +1,22 @@
 import os.path
-from typing import List
+import time
+from typing import List, Iterator
 
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
 from google.cloud.firestore_v1 import CollectionReference
 
-from scripts.mo.data.storage import Storage, map_dict_to_record, map_record_to_dict
+from scripts.mo.data.storage import Storage, map_dict_to_record, map_record_to_dict, LIST_VIEW_SKIPPED_FIELDS, \
+    mark_updated
 from scripts.mo.environment import env
 from scripts.mo.models import Record
 
 FIREBASE_APP_NAME = "sd-model-organizer-app"
+_BATCH_LIMIT = 500  # Firestore limit of operations in a single batch
+_LIST_VIEW_FIELDS = ['name', 'model_type', 'download_url', 'backup_url', 'url', 'download_path', 'download_filename',
+                     'preview_url', 'sha256_hash', 'md5_hash', 'created_at', 'groups', 'subdir', 'location', 'weight',
+                     'updated_at']
 
 
 def _filter_download(record: Record, show_downloaded, show_not_downloaded):
@@ -31,23 +37,34 @@ class FirebaseStorage(Storage):
     def _records(self) -> CollectionReference:
         return self.firestore_client.collection('records')
 
-    def get_all_records(self) -> List:
-        record_refs = self._records().stream()
-        records = []
-        for ref in record_refs:
-            records.append(map_dict_to_record(ref.id, ref.to_dict()))
-        return records
+    def _load_heavy_fields(self, id_) -> tuple:
+        raw = self._records().document(id_).get(LIST_VIEW_SKIPPED_FIELDS).to_dict() or {}
+        return tuple(raw.get(field, '') for field in LIST_VIEW_SKIPPED_FIELDS)
+
+    def _stream_records(self, query_ref, list_view: bool) -> List:
+        if not list_view:
+            return [map_dict_to_record(ref.id, ref.to_dict()) for ref in query_ref.stream()]
+
+        # Closure instead of bound method, so deep copies of records (gr.State) don't copy the client.
+        loader = lambda id_: self._load_heavy_fields(id_)
+        return [map_dict_to_record(ref.id, ref.to_dict(), loader)
+                for ref in query_ref.select(_LIST_VIEW_FIELDS).stream()]
+
+    def get_all_records(self, list_view: bool = False) -> List:
+        return self._stream_records(self._records(), list_view)
+
+    def iterate_all_records(self) -> Iterator[Record]:
+        for ref in self._records().stream():
+            yield map_dict_to_record(ref.id, ref.to_dict())
 
     def query_records(self, name_query=None, groups=None, model_types=None, show_downloaded=None,
-                      show_not_downloaded=None) -> List:
+                      show_not_downloaded=None, list_view: bool = False) -> List:
 
         query_ref = self._records()
         if model_types is not None and model_types:
             query_ref = query_ref.where('model_type', 'in', model_types)
 
-        records = []
-        for ref in query_ref.stream():
-            records.append(map_dict_to_record(ref.id, ref.to_dict()))
+        records = self._stream_records(query_ref, list_view)
 
         if name_query is not None and name_query:
             records = [record for record in records if name_query.lower() in record.name.lower()]
@@ -64,17 +81,46 @@ class FirebaseStorage(Storage):
         return map_dict_to_record(doc.id, doc.to_dict())
 
     def add_record(self, record: Record):
+        mark_updated([record])
         self._records().add(map_record_to_dict(record))
 
     def update_record(self, record: Record):
+        mark_updated([record])
         ref = self._records().document(record.id_)
         ref.update(map_record_to_dict(record))
 
     def remove_record(self, _id):
         self._records().document(_id).delete()
 
+    def add_records(self, records: List[Record]):
+        mark_updated(records)
+        self._write_batched(records, lambda batch, record: batch.set(self._records().document(),
+                                                                      map_record_to_dict(record)))
+
+    def update_records(self, records: List[Record]):
+        mark_updated(records)
+        self._write_batched(records, lambda batch, record: batch.update(self._records().document(record.id_),
+                                                                         map_record_to_dict(record)))
+
+    def set_missing_sha256(self, location: str, sha256_hash: str) -> int:
+        refs = [ref for ref in self._records().where('location', '==', location).select(['sha256_hash']).stream()
+                if not (ref.to_dict() or {}).get('sha256_hash')]
+        self._write_batched(refs, lambda batch, ref: batch.update(ref.reference, {'sha256_hash': sha256_hash,
+                                                                                  'updated_at': time.time()}))
+        return len(refs)
+
+    def remove_records(self, ids: List):
+        self._write_batched(ids, lambda batch, _id: batch.delete(self._records().document(_id)))
+
+    def _write_batched(self, items: List, write):
+        for start in range(0, len(items), _BATCH_LIMIT):
+            batch = self.firestore_client.batch()
+            for item in items[start:start + _BATCH_LIMIT]:
+                write(batch, item)
+            batch.commit()
+
     def get_available_groups(self) -> List:
-        records = self.get_all_records()
+        records = self.get_all_records(list_view=True)
         groups = []
         for record in records:
             if len(record.groups) > 0:
@@ -92,7 +138,7 @@ class FirebaseStorage(Storage):
         return records
 
     def get_all_records_locations(self) -> List:
-        records = self.get_all_records()
+        records = self.get_all_records(list_view=True)
         locations = []
         for record in records:
             if record.location:
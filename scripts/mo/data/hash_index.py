@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from typing import List, Optional
+
+from scripts.mo.data.sqlite_pool import SQLitePool
+from scripts.mo.environment import env, logger
+from scripts.mo.utils import read_hash_cache, get_hash_cache_file, calculate_file_temp_hash, calculate_sha256
+
+_DB_FILE = 'hash_index.sqlite'
+
+
+class HashIndex:
+    """
+    Persistent index of SHA256 hashes of local files. An entry is valid while the file "temp" hash
+    (timestamps and size) is unchanged, so each file is hashed once until it is modified.
+    Replaces hash_cache.json, which is imported on the first start.
+    """
+    __instance = None
+    __lock = threading.Lock()
+
+    def __init__(self):
+        self._pool = SQLitePool(os.path.join(env.database_dir(), _DB_FILE), max_connections=4)
+        self._initialize()
+
+    @staticmethod
+    def instance():
+        if HashIndex.__instance is None:
+            with HashIndex.__lock:
+                if HashIndex.__instance is None:
+                    HashIndex.__instance = HashIndex()
+        return HashIndex.__instance
+
+    def _initialize(self):
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute('''CREATE TABLE IF NOT EXISTS FileHash
+                                        (path TEXT PRIMARY KEY,
+                                        temp_hash TEXT,
+                                        size INTEGER,
+                                        sha256 TEXT,
+                                        hashed_at REAL)''')
+                connection.execute('CREATE INDEX IF NOT EXISTS FileHashSha256 ON FileHash(sha256)')
+            is_empty = connection.execute('SELECT COUNT(*) FROM FileHash').fetchone()[0] == 0
+
+        if is_empty and os.path.isfile(get_hash_cache_file()):
+            self._import_hash_cache()
+
+    def _import_hash_cache(self):
+        try:
+            entries = [entry for entry in read_hash_cache() if entry.get('path') and entry.get('sha256')]
+        except Exception as ex:
+            logger.warning('Failed to import hash cache: %s', ex)
+            return
+
+        now = time.time()
+        with self._pool.connection() as connection:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO FileHash VALUES (?, ?, ?, ?, ?)',
+                                       [(entry['path'], entry.get('temp_hash'), entry.get('file_size'),
+                                         entry['sha256'], now) for entry in entries])
+        logger.info('Imported %s entries from hash cache', len(entries))
+
+    def get(self, path: str, temp_hash: str = None) -> Optional[str]:
+        """
+        Looks up file hash.
+        :param path: file path.
+        :param temp_hash: current file "temp" hash, calculated when omitted.
+        :return: SHA256 hex digest or None if file is not indexed or was changed.
+        """
+        if temp_hash is None:
+            temp_hash = calculate_file_temp_hash(path)
+        with self._pool.connection() as connection:
+            row = connection.execute('SELECT sha256 FROM FileHash WHERE path=? AND temp_hash=?',
+                                     (path, temp_hash)).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, path: str, temp_hash: str, size: int, sha256: str):
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO FileHash VALUES (?, ?, ?, ?, ?)',
+                                   (path, temp_hash, size, sha256, time.time()))
+
+    def put_entries(self, entries: List[dict]):
+        """
+        Stores entries in hash_cache.json format.
+        :param entries: list of dictionaries with path, temp_hash, sha256 and optional file_size keys.
+        :return: None.
+        """
+        now = time.time()
+        with self._pool.connection() as connection:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO FileHash VALUES (?, ?, ?, ?, ?)',
+                                       [(entry['path'], entry.get('temp_hash'), entry.get('file_size'),
+                                         entry['sha256'], now) for entry in entries if entry.get('sha256')])
+
+    def find_path(self, sha256: str) -> Optional[str]:
+        """
+        Looks up local file by hash.
+        :param sha256: SHA256 hex digest.
+        :return: path of unchanged indexed file with the given hash or None.
+        """
+        with self._pool.connection() as connection:
+            rows = connection.execute('SELECT path, temp_hash FROM FileHash WHERE sha256=?',
+                                      (sha256.lower(),)).fetchall()
+        for path, temp_hash in rows:
+            if os.path.isfile(path) and calculate_file_temp_hash(path) == temp_hash:
+                return path
+        return None
+
+    def get_all_entries(self) -> List[dict]:
+        with self._pool.connection() as connection:
+            rows = connection.execute('SELECT path, temp_hash, size, sha256 FROM FileHash ORDER BY path').fetchall()
+        return [{'path': row[0], 'temp_hash': row[1], 'file_size': row[2], 'sha256': row[3]} for row in rows]
+
+    def get_sha256(self, path: str) -> str:
+        """
+        Returns indexed file hash, calculates and indexes it if file is not indexed or was changed.
+        :param path: file path.
+        :return: SHA256 hex digest.
+        """
+        temp_hash = calculate_file_temp_hash(path)
+        sha256 = self.get(path, temp_hash)
+        if sha256 is None:
+            sha256 = calculate_sha256(path)
+            self.put(path, temp_hash, os.path.getsize(path), sha256)
+        return sha256
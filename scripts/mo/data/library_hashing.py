@@ -0,0 +1,171 @@
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+from scripts.mo.data.hash_index import HashIndex
+from scripts.mo.environment import env, logger
+from scripts.mo.jobs import JobContext, JobCancelled
+from scripts.mo.models import ModelType
+from scripts.mo.utils import get_model_files_in_dir, calculate_file_temp_hash
+
+_READERS_PER_DEVICE = 1
+_CHUNK_SIZE = 1024 * 1024
+_MB = 1024 * 1024
+_REPORT_INTERVAL = 1
+
+JOB_KIND = 'library_hashing'
+
+
+class _DeviceStats:
+    def __init__(self, device: int):
+        self.device = device
+        self.files = 0
+        self.bytes = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def mb_per_second(self) -> float:
+        if self.started_at is None:
+            return 0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.bytes / _MB / elapsed if elapsed > 0 else 0
+
+    def to_dict(self) -> dict:
+        return {
+            'device': self.device,
+            'files': self.files,
+            'bytes': self.bytes,
+            'mb_per_second': round(self.mb_per_second(), 1)
+        }
+
+
+def find_model_files() -> List:
+    """
+    Collects model files from all model directories and locations bound to records.
+    :return: list of unique existing file paths.
+    """
+    files = []
+    for model_type in ModelType:
+        if model_type == ModelType.OTHER:
+            continue
+        dir_path = env.get_model_path(model_type)
+        if dir_path:
+            files.extend(get_model_files_in_dir(dir_path))
+    # Records with custom download path may point outside of models dirs.
+    files.extend(filter(None, env.storage.get_all_records_locations()))
+    return list(dict.fromkeys(path for path in files if os.path.isfile(path)))
+
+
+def _group_by_device(paths: List, index: HashIndex, force: bool) -> Dict[int, deque]:
+    """
+    Groups files that are not indexed yet by underlying device, largest files first.
+    :return: dictionary of device id to queue of (path, temp hash, size) tuples.
+    """
+    groups = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            temp_hash = calculate_file_temp_hash(path)
+        except OSError as ex:
+            logger.warning('Failed to stat %s: %s', path, ex)
+            continue
+        if not force and index.get(path, temp_hash) is not None:
+            continue
+        groups.setdefault(stat.st_dev, []).append((path, temp_hash, stat.st_size))
+
+    return {device: deque(sorted(files, key=lambda file: file[2], reverse=True)) for device, files in groups.items()}
+
+
+def _hash_file(path: str, job: JobContext, on_read) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(_CHUNK_SIZE):
+            job.check_cancelled()
+            sha256_hash.update(chunk)
+            on_read(len(chunk))
+    return sha256_hash.hexdigest()
+
+
+def run_library_hashing(job: JobContext, force: bool = False) -> dict:
+    """
+    Job that hashes every local model file into the hash index.
+    Files are grouped by device, each device is read by its own readers, so slow disks and network shares
+    don't hold back fast ones and a spinning disk is not thrashed by concurrent reads.
+    :param job: job context.
+    :param force: rehash files that are already indexed.
+    :return: hashing counters and throughput per device.
+    """
+    index = HashIndex.instance()
+    paths = find_model_files()
+    groups = _group_by_device(paths, index, force)
+
+    total_files = sum(len(files) for files in groups.values())
+    total_bytes = sum(file[2] for files in groups.values() for file in files)
+    stats = {device: _DeviceStats(device) for device in groups}
+    lock = threading.Lock()
+    counters = {'hashed': 0, 'bytes': 0, 'errors': 0}
+    reported_at = [0]
+
+    def report():
+        reported_at[0] = time.time()
+        throughput = ', '.join(f'dev {item.device}: {item.mb_per_second():.1f} MB/s' for item in stats.values())
+        job.progress(counters['hashed'], total_files,
+                     f"{counters['bytes'] // _MB} / {total_bytes // _MB} MB. {throughput}")
+
+    def read_device(device: int):
+        device_stats = stats[device]
+        queue = groups[device]
+
+        def on_read(size):
+            with lock:
+                device_stats.bytes += size
+                counters['bytes'] += size
+            # Large files take minutes, throughput is refreshed while they are read.
+            if time.time() - reported_at[0] >= _REPORT_INTERVAL:
+                report()
+
+        while not job.is_cancelled():
+            with lock:
+                if not queue:
+                    break
+                path, temp_hash, size = queue.popleft()
+                if device_stats.started_at is None:
+                    device_stats.started_at = time.time()
+            try:
+                sha256 = _hash_file(path, job, on_read)
+            except OSError as ex:
+                logger.warning('Failed to hash %s: %s', path, ex)
+                with lock:
+                    counters['errors'] += 1
+                continue
+            except JobCancelled:
+                break
+            index.put(path, temp_hash, size, sha256)
+            with lock:
+                device_stats.files += 1
+                counters['hashed'] += 1
+            report()
+
+        with lock:
+            device_stats.finished_at = time.time()
+
+    report()
+    readers = [threading.Thread(target=read_device, args=(device,), name=f'mo-hash-{device}-{number}', daemon=True)
+               for device in groups for number in range(_READERS_PER_DEVICE)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    report()
+
+    return {
+        'files': len(paths),
+        'already_indexed': len(paths) - total_files,
+        'hashed': counters['hashed'],
+        'errors': counters['errors'],
+        'bytes': counters['bytes'],
+        'devices': [item.to_dict() for item in stats.values()]
+    }
@@ -0,0 +1,200 @@
+import os
+import threading
+from typing import List, Optional
+
+from scripts.mo.data.hash_index import HashIndex
+from scripts.mo.data.records_io import iterate_import_file, IMPORT_BATCH_SIZE
+from scripts.mo.data.storage import map_dict_to_record
+from scripts.mo.dl.download_manager import DownloadManager, RECORD_STATUS_COMPLETED, RECORD_STATUS_EXISTS
+from scripts.mo.environment import env
+from scripts.mo.jobs import JobContext
+from scripts.mo.models import Record
+
+_DOWNLOAD_WORKERS = 3
+
+PLAN_JOB_KIND = 'manifest_plan'
+SYNC_JOB_KIND = 'manifest_sync'
+
+REASON_MISSING = 'missing'
+REASON_MISMATCH = 'mismatch'
+
+
+def _record_key(record: Record) -> str:
+    return f'{record.name}-{record.url}'
+
+
+class _LocalRecords:
+    """
+    Local records matched against manifest records by SHA256, or by name and model URL when hash is unknown.
+    """
+
+    def __init__(self):
+        records = env.storage.get_all_records(list_view=True)
+        self._by_sha256 = {record.sha256_hash.lower(): record for record in records if record.sha256_hash}
+        self._by_key = {_record_key(record): record for record in records}
+
+    def match(self, manifest_record: Record) -> Optional[Record]:
+        sha256 = manifest_record.sha256_hash.lower()
+        if sha256 and sha256 in self._by_sha256:
+            return self._by_sha256[sha256]
+        return self._by_key.get(_record_key(manifest_record))
+
+
+class _SyncPlan:
+    def __init__(self):
+        self.total = 0
+        self.up_to_date = 0
+        self.imports: List[Record] = []
+        # Lists of (manifest record, local record or None if it is imported, details) tuples.
+        self.binds = []
+        self.downloads = []
+        self.no_source = []
+
+    def to_dict(self) -> dict:
+        def describe(items, details_key):
+            return [{'name': manifest_record.name, 'sha256': manifest_record.sha256_hash, details_key: details}
+                    for manifest_record, _, details in items]
+
+        return {
+            'total': self.total,
+            'up_to_date': self.up_to_date,
+            'import': [record.name for record in self.imports],
+            'bind': describe(self.binds, 'path'),
+            'download': describe(self.downloads, 'reason'),
+            'no_source': describe(self.no_source, 'reason')
+        }
+
+
+def _build_plan(path: str, job: JobContext) -> _SyncPlan:
+    local_records = _LocalRecords()
+    hash_index = HashIndex.instance()
+    plan = _SyncPlan()
+
+    for record_dict in iterate_import_file(path):
+        job.check_cancelled()
+        manifest_record = map_dict_to_record('', record_dict)
+        # Location is specific to the node the manifest was exported from.
+        manifest_record.location = ''
+        sha256 = manifest_record.sha256_hash.lower()
+        plan.total += 1
+        job.progress(plan.total, message=manifest_record.name)
+
+        local_record = local_records.match(manifest_record)
+        if local_record is None:
+            plan.imports.append(manifest_record)
+
+        if local_record is not None and local_record.location and os.path.isfile(local_record.location):
+            if not sha256 or hash_index.get_sha256(local_record.location) == sha256:
+                plan.up_to_date += 1
+            else:
+                plan.downloads.append((manifest_record, local_record, REASON_MISMATCH))
+            continue
+
+        found_path = hash_index.find_path(sha256) if sha256 else None
+        if found_path is not None:
+            plan.binds.append((manifest_record, local_record, found_path))
+        elif manifest_record.download_url:
+            plan.downloads.append((manifest_record, local_record, REASON_MISSING))
+        else:
+            plan.no_source.append((manifest_record, local_record, REASON_MISSING))
+
+    return plan
+
+
+def plan_manifest_sync(job: JobContext, path: str) -> dict:
+    """
+    Job that compares manifest (exported records file) with local records and model files without changing them.
+    :param job: job context.
+    :param path: manifest file path.
+    :return: sync plan.
+    """
+    return _build_plan(path, job).to_dict()
+
+
+def run_manifest_sync(job: JobContext, path: str) -> dict:
+    """
+    Job that makes local storage and model files match the manifest: imports missing records, binds records
+    to local files with the same SHA256 and downloads missing files in parallel, verifying their hash.
+    :param job: job context.
+    :param path: manifest file path.
+    :return: executed sync plan and results.
+    """
+    plan = _build_plan(path, job)
+    result = plan.to_dict()
+
+    for start in range(0, len(plan.imports), IMPORT_BATCH_SIZE):
+        job.check_cancelled()
+        env.storage.add_records(plan.imports[start:start + IMPORT_BATCH_SIZE])
+        job.progress(start, len(plan.imports), 'Importing records')
+
+    # Imported records got ids, they are matched again to bind files and download.
+    local_records = _LocalRecords()
+
+    def resolve(items) -> List:
+        resolved = []
+        for manifest_record, local_record, details in items:
+            local_record = local_record if local_record is not None else local_records.match(manifest_record)
+            if local_record is not None:
+                resolved.append((manifest_record, local_record, details))
+        return resolved
+
+    bound = []
+    for manifest_record, local_record, found_path in resolve(plan.binds):
+        local_record.location = found_path
+        bound.append(local_record)
+    if bound:
+        env.storage.update_records(bound)
+
+    downloads = resolve(plan.downloads)
+    expected = {}
+    for manifest_record, local_record, _ in downloads:
+        if manifest_record.sha256_hash:
+            # Known hash lets the download be served from the blob store, shared cache or peers.
+            local_record.sha256_hash = manifest_record.sha256_hash
+            expected[local_record.id_] = manifest_record.sha256_hash.lower()
+
+    counters = {'downloaded': 0, 'failed': 0}
+    failures = []
+    results_lock = threading.Lock()
+    hash_index = HashIndex.instance()
+
+    def on_record_done(record: Record, state: dict):
+        expected_sha256 = expected.get(record.id_)
+        status = state.get('status')
+        if status == RECORD_STATUS_EXISTS and expected_sha256:
+            # File with the same name is already in place, it is bound if it is the expected one.
+            destination = state.get('destination')
+            if destination and hash_index.get_sha256(destination) == expected_sha256:
+                record.location = destination
+                record.sha256_hash = expected_sha256
+                env.storage.update_record(record)
+                status = RECORD_STATUS_COMPLETED
+            else:
+                state['exception'] = f'Different file already exists: {destination}'
+
+        if status == RECORD_STATUS_COMPLETED and expected_sha256 and record.sha256_hash.lower() != expected_sha256:
+            state['exception'] = f'Downloaded file hash {record.sha256_hash} does not match {expected_sha256}'
+            status = None
+            # The file is not the one the manifest describes, so the record is not left bound to it.
+            if os.path.isfile(record.location):
+                os.remove(record.location)
+            record.location = ''
+            record.sha256_hash = expected_sha256
+            env.storage.update_record(record)
+
+        # Called from download workers concurrently.
+        with results_lock:
+            if status == RECORD_STATUS_COMPLETED:
+                counters['downloaded'] += 1
+            else:
+                counters['failed'] += 1
+                failures.append({'name': record.name, 'error': str(state.get('exception') or status)})
+            job.progress(counters['downloaded'] + counters['failed'], len(downloads),
+                         f"Downloaded: {counters['downloaded']}, failed: {counters['failed']}")
+
+    job.progress(0, len(downloads), 'Downloading')
+    DownloadManager.download_records_parallel([local_record for _, local_record, _ in downloads], job.cancel_event,
+                                              _DOWNLOAD_WORKERS, on_record_done)
+
+    result.update(imported=len(plan.imports), bound=len(bound), failures=failures, **counters)
+    return result
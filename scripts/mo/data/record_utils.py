@@ -1,13 +1,44 @@
+import hashlib
 import json
 import os
 from typing import List, Dict
 
+import scripts.mo.tracing as tracing
 from scripts.mo.data.mapping_utils import create_version_dict
 from scripts.mo.environment import env
 from scripts.mo.models import ModelSort, Record, ModelType
 from scripts.mo.utils import get_model_files_in_dir, find_info_file, find_info_json_file
 
 
+# Unbound local files records of the last listing, keyed by local_file_key of the file path.
+_local_files_catalog: Dict[str, Record] = {}
+
+
+def local_file_key(path: str) -> str:
+    """
+    Opaque key of a local model file, used by the UI instead of embedding the record data in the page.
+    :param path: local model file path.
+    :return: key to request the record with get_local_file_record.
+    """
+    return hashlib.md5(path.encode('utf-8')).hexdigest()
+
+
+def get_local_file_record(key: str):
+    """
+    Looks for the unbound local file record by key. Files are rescanned if the key is not in the catalog,
+    e.g. after the listing was refreshed with a different filter or from another tab.
+    :param key: local file key.
+    :return: record created from the local file or None if there is no such file.
+    """
+    record = _local_files_catalog.get(key)
+    if record is None:
+        for path in _find_local_model_files():
+            if local_file_key(path) == key:
+                record = _create_record_from_file(path)
+                break
+    return record
+
+
 def _sort_records(records: List, sort_order: ModelSort, sort_downloaded_first: bool) -> List:
     if sort_downloaded_first:
         if sort_order == ModelSort.TIME_ADDED_ASC:
@@ -61,10 +92,20 @@ def _create_model_from_info_file(path, info_file_path, model_type):
         json_data = json.load(file)
     version_dict = create_version_dict(json_data)
     filename = os.path.basename(path)
+
+    name = filename
+    if json_data.get('model') is not None and json_data['model'].get('name'):
+        name = f"{json_data['model']['name']} [{version_dict['name']}]"
+
+    url = ''
+    if json_data.get('modelId') is not None:
+        url = f"https://civitai.com/models/{json_data['modelId']}"
+
     return Record(
         id_=None,
-        name=filename,
+        name=name,
         model_type=model_type,
+        url=url,
         location=path,
         created_at=os.path.getctime(path),
         download_filename=filename,
@@ -144,7 +185,8 @@ def _create_record_from_files(model_file_list):
 
 def _filter_records_by_state(records: List, state: Dict):
     if state['query']:
-        records = list(filter(lambda r: state['query'].lower() in r.name.lower(), records))
+        query = state['query'].lower()
+        records = list(filter(lambda r: query in r.name.lower() or query in r.download_filename.lower(), records))
 
     groups = state['groups']
     if len(groups) > 0:
@@ -157,31 +199,41 @@ def _filter_records_by_state(records: List, state: Dict):
     return records
 
 
-def load_records_and_filter(state: Dict, include_local_files: bool):
-    records = env.storage.query_records(
-        name_query=state['query'],
-        groups=state['groups'],
-        model_types=state['model_types'],
-        show_downloaded=state['show_downloaded'],
-        show_not_downloaded=state['show_not_downloaded']
-    )
+def load_records_and_filter(state: Dict, include_local_files: bool, list_view: bool = False):
+    with tracing.span('records.query') as span:
+        records = env.storage.query_records(
+            name_query=state['query'],
+            groups=state['groups'],
+            model_types=state['model_types'],
+            show_downloaded=state['show_downloaded'],
+            show_not_downloaded=state['show_not_downloaded'],
+            list_view=list_view
+        )
+        span.count('records', len(records))
 
     if state['show_local_files'] and include_local_files:
-        model_files_list = _find_local_model_files()
-
-        if len(model_files_list) > 0:
-            bound_files = env.storage.get_all_records_locations()
-            bound_files = list(filter(lambda r: bool(r), bound_files))
-            not_bound_files = list(filter(lambda r: r not in bound_files, model_files_list))
-            if len(not_bound_files) > 0:
-                local_records = _create_record_from_files(not_bound_files)
-                local_records = _filter_records_by_state(local_records, state)
-                if len(local_records) > 0:
-                    records.extend(local_records)
-
-    records = _sort_records(
-        records=records,
-        sort_order=ModelSort.by_value(state['sort_order']),
-        sort_downloaded_first=state['sort_downloaded_first']
-    )
+        with tracing.span('records.local_files_scan') as span:
+            model_files_list = _find_local_model_files()
+            span.count('files', len(model_files_list))
+
+            if len(model_files_list) > 0:
+                bound_files = env.storage.get_all_records_locations()
+                bound_files = list(filter(lambda r: bool(r), bound_files))
+                not_bound_files = list(filter(lambda r: r not in bound_files, model_files_list))
+                span.count('not_bound_files', len(not_bound_files))
+                if len(not_bound_files) > 0:
+                    local_records = _create_record_from_files(not_bound_files)
+                    global _local_files_catalog
+                    _local_files_catalog = {local_file_key(record.location): record for record in local_records}
+                    local_records = _filter_records_by_state(local_records, state)
+                    if len(local_records) > 0:
+                        records.extend(local_records)
+
+    with tracing.span('records.sort') as span:
+        records = _sort_records(
+            records=records,
+            sort_order=ModelSort.by_value(state['sort_order']),
+            sort_downloaded_first=state['sort_downloaded_first']
+        )
+        span.count('records', len(records))
     return records
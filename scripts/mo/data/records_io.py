@@ -0,0 +1,152 @@
+import gzip
+import json
+import re
+from typing import Iterable, Iterator, List
+
+from scripts.mo.data.storage import map_record_to_dict, map_dict_to_record
+from scripts.mo.environment import env
+
+FORMAT_JSON = 'JSON'
+FORMAT_NDJSON = 'NDJSON'
+
+IMPORT_BATCH_SIZE = 500
+
+_CHUNK_SIZE = 64 * 1024
+_GZIP_MAGIC = b'\x1f\x8b'
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _open_text(path: str, mode: str):
+    if mode.startswith('r'):
+        with open(path, 'rb') as file:
+            is_gzip = file.read(2) == _GZIP_MAGIC
+    else:
+        is_gzip = path.endswith('.gz')
+
+    if is_gzip:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def export_records(records: Iterable, path: str, export_format: str = FORMAT_JSON) -> int:
+    """
+    Writes records to the file one by one without building the whole document in memory.
+    :param records: records iterable, can be a lazy storage cursor.
+    :param path: output file path, gzip compressed if it ends with ".gz".
+    :param export_format: FORMAT_JSON for a single JSON array or FORMAT_NDJSON for a record per line.
+    :return: number of exported records.
+    """
+    count = 0
+    with _open_text(path, 'w') as file:
+        if export_format == FORMAT_NDJSON:
+            for record in records:
+                file.write(json.dumps(map_record_to_dict(record)))
+                file.write('\n')
+                count += 1
+        else:
+            file.write('[')
+            for record in records:
+                if count > 0:
+                    file.write(', ')
+                file.write(json.dumps(map_record_to_dict(record)))
+                count += 1
+            file.write(']')
+    return count
+
+
+def _iterate_json_array(file) -> Iterator:
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    state = 'start'
+
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer) or state == 'incomplete':
+            if eof:
+                raise ValueError('Unexpected end of JSON array')
+            # Read at least as much as already buffered to keep re-parsing of large objects linear.
+            chunk = file.read(max(_CHUNK_SIZE, len(buffer) - pos))
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            if state == 'incomplete':
+                state = 'value'
+            continue
+
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                raise ValueError('JSON array expected')
+            pos += 1
+            state = 'first'
+        elif state in ('first', 'value'):
+            if state == 'first' and char == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                state = 'incomplete'
+                continue
+            # A number at the end of the buffer might continue in the next chunk,
+            # the value is taken only when the separator after it is buffered.
+            separator = _WHITESPACE.match(buffer, end).end()
+            if not eof and (separator == len(buffer) or buffer[separator] not in ',]'):
+                state = 'incomplete'
+                continue
+            pos = end
+            yield value
+            state = 'separator'
+        elif char == ',':
+            pos += 1
+            state = 'value'
+        elif char == ']':
+            return
+        else:
+            raise ValueError(f'Unexpected character in JSON array: {char}')
+
+
+def _iterate_ndjson(file) -> Iterator:
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iterate_import_file(path: str) -> Iterator:
+    """
+    Incrementally parses records dictionaries from JSON array or NDJSON file, optionally gzip compressed.
+    :param path: path to import file.
+    :return: iterator of records dictionaries.
+    """
+    with _open_text(path, 'r') as file:
+        head = file.read(_CHUNK_SIZE)
+        first_char = head.lstrip()[:1]
+        file.seek(0)
+        if first_char == '[':
+            yield from _iterate_json_array(file)
+        else:
+            yield from _iterate_ndjson(file)
+
+
+def import_records(path: str, batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[List]:
+    """
+    Imports records from file into the storage in batches.
+    :param path: path to import file.
+    :param batch_size: number of records inserted in a single transaction.
+    :return: iterator of imported records batches.
+    """
+    batch = []
+    for record_dict in iterate_import_file(path):
+        batch.append(map_dict_to_record('', record_dict))
+        if len(batch) >= batch_size:
+            env.storage.add_records(batch)
+            yield batch
+            batch = []
+
+    if batch:
+        env.storage.add_records(batch)
+        yield batch
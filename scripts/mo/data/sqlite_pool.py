@@ -0,0 +1,91 @@
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List
+
+from scripts.mo.environment import logger
+
+_DEFAULT_MAX_CONNECTIONS = 8
+_DEFAULT_TIMEOUT = 30
+
+_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',  # 16MB page cache per connection
+    'PRAGMA mmap_size=268435456',  # 256MB memory mapped I/O
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+class SQLitePool:
+    """
+    Bounded pool of SQLite connections shared between Gradio workers and background threads.
+    Connections are borrowed for the duration of an operation and returned right after, so no connection
+    stays bound to a thread after it exits. Nested borrowing from the same thread reuses the held connection.
+    """
+
+    def __init__(self, database_path: str, max_connections: int = _DEFAULT_MAX_CONNECTIONS,
+                 timeout: float = _DEFAULT_TIMEOUT):
+        self._database_path = database_path
+        self._timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._idle: List[sqlite3.Connection] = []
+        self._local = threading.local()
+        self._closed = False
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._database_path, self._timeout, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            connection.execute(pragma)
+        return connection
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, 'connection', None)
+        if held is not None:
+            yield held
+            return
+
+        if not self._semaphore.acquire(timeout=self._timeout):
+            raise TimeoutError(f'No free SQLite connection for {self._database_path} in {self._timeout} seconds')
+
+        try:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError(f'SQLite pool for {self._database_path} is closed')
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self._connect()
+
+            self._local.connection = connection
+            try:
+                yield connection
+            finally:
+                self._local.connection = None
+                if connection.in_transaction:
+                    connection.rollback()
+                self._release(connection)
+        finally:
+            self._semaphore.release()
+
+    def _release(self, connection: sqlite3.Connection):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+
+        for connection in idle:
+            try:
+                connection.close()
+            except Exception as ex:
+                logger.warning('Failed to close SQLite connection: %s', ex)
@@ -1,20 +1,23 @@
 import os
-import shutil
 import sqlite3
-import threading
-from typing import List
-from modules import shared
-
-from scripts.mo.data.storage import Storage
+import time
+from contextlib import closing
+from typing import List, Iterator, Callable
+
+import scripts.mo.metrics as metrics
+import scripts.mo.tracing as tracing
+from scripts.mo.data.sqlite_pool import SQLitePool
+from scripts.mo.data.storage import Storage, mark_updated
 from scripts.mo.environment import env, logger
-from scripts.mo.models import Record, ModelType
+from scripts.mo.models import Record, ModelType, NOT_LOADED
 
 _DB_FILE = 'database.sqlite'
-_DB_VERSION = 7
+_DB_VERSION = 8
 _DB_TIMEOUT = 30
+_FETCH_BATCH_SIZE = 500
 
 
-def map_row_to_record(row) -> Record:
+def map_row_to_record(row, heavy_fields_loader: Callable = None) -> Record:
     return Record(
         id_=row[0],
         name=row[1],
@@ -34,70 +37,179 @@ def map_row_to_record(row) -> Record:
         subdir=row[15],
         location=row[16],
         weight=row[17],
-        backup_url=row[18]
+        backup_url=row[18],
+        updated_at=row[19],
+        heavy_fields_loader=heavy_fields_loader
+    )
+
+
+# Same columns order as in Record table, heavy fields are replaced with NULL to keep row mapping.
+_LIST_VIEW_SELECT = """SELECT id, _name, model_type, download_url, url, download_path, download_filename, preview_url,
+                    NULL, NULL, NULL, sha256_hash, md5_hash, created_at, groups, subdir, location, weight, backup_url,
+                    updated_at FROM Record"""
+
+
+def map_list_view_row_to_record(row, heavy_fields_loader: Callable) -> Record:
+    return map_row_to_record(row[:8] + (NOT_LOADED, NOT_LOADED, NOT_LOADED) + row[11:], heavy_fields_loader)
+
+
+_INSERT_RECORD_QUERY = """INSERT INTO Record(
+                    _name,
+                    model_type,
+                    download_url,
+                    url,
+                    download_path,
+                    download_filename,
+                    preview_url,
+                    description,
+                    positive_prompts,
+                    negative_prompts,
+                    sha256_hash,
+                    md5_hash,
+                    created_at,
+                    groups,
+                    subdir,
+                    location,
+                    weight,
+                    backup_url,
+                    updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+_UPDATE_RECORD_QUERY = """UPDATE Record SET 
+                    _name=?,
+                    model_type=?,
+                    download_url=?,
+                    url=?,
+                    download_path=?,
+                    download_filename=?,
+                    preview_url=?,
+                    description=?,
+                    positive_prompts=?,
+                    negative_prompts=?,
+                    sha256_hash=?,
+                    md5_hash=?,
+                    groups=?,
+                    subdir=?,
+                    location=?,
+                    weight=?,
+                    backup_url=?,
+                    updated_at=?
+                WHERE id=?
+            """
+
+
+def _map_record_to_insert_row(record: Record) -> tuple:
+    return (
+        record.name,
+        record.model_type.value,
+        record.download_url,
+        record.url,
+        record.download_path,
+        record.download_filename,
+        record.preview_url,
+        record.description,
+        record.positive_prompts,
+        record.negative_prompts,
+        record.sha256_hash,
+        record.md5_hash,
+        record.created_at,
+        ",".join(record.groups),
+        record.subdir,
+        record.location,
+        record.weight,
+        record.backup_url,
+        record.updated_at
+    )
+
+
+def _map_record_to_update_row(record: Record) -> tuple:
+    return (
+        record.name,
+        record.model_type.value,
+        record.download_url,
+        record.url,
+        record.download_path,
+        record.download_filename,
+        record.preview_url,
+        record.description,
+        record.positive_prompts,
+        record.negative_prompts,
+        record.sha256_hash,
+        record.md5_hash,
+        ",".join(record.groups),
+        record.subdir,
+        record.location,
+        record.weight,
+        record.backup_url,
+        record.updated_at,
+        record.id_
     )
 
 
 class SQLiteStorage(Storage):
 
     def __init__(self):
-        self.local = threading.local()
+        self._pool = SQLitePool(self._database_path(), timeout=_DB_TIMEOUT)
         self._initialize()
 
     def _database_path(self):
-        mo_database_dir = getattr(shared.cmd_opts, "mo_database_dir")
-        database_dir = mo_database_dir if mo_database_dir is not None else env.script_dir
+        database_dir = env.database_dir()
         db_file_path = os.path.join(database_dir, _DB_FILE)
         return db_file_path
 
     def _connection(self):
-        if not hasattr(self.local, "connection"):
-            self.local.connection = sqlite3.connect(self._database_path(), _DB_TIMEOUT)
-        return self.local.connection
+        return self._pool.connection()
+
+    def close(self):
+        self._pool.close()
 
+    @tracing.traced('storage.initialize')
     def _initialize(self):
-        cursor = self._connection().cursor()
-
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Record
-                                    (id INTEGER PRIMARY KEY,
-                                    _name TEXT,
-                                    model_type TEXT,
-                                    download_url TEXT,
-                                    url TEXT DEFAULT '',
-                                    download_path TEXT DEFAULT '',
-                                    download_filename TEXT DEFAULT '',
-                                    preview_url TEXT DEFAULT '',
-                                    description TEXT DEFAULT '',
-                                    positive_prompts TEXT DEFAULT '',
-                                    negative_prompts TEXT DEFAULT '',
-                                    sha256_hash TEXT DEFAULT '',
-                                    md5_hash TEXT DEFAULT '',
-                                    created_at INTEGER DEFAULT 0,
-                                    groups TEXT DEFAULT '',
-                                    subdir TEXT DEFAULT '',
-                                    location TEXT DEFAULT '',
-                                    weight REAL DEFAULT 1,
-                                    backup_url TEXT)
-                                 ''')
-
-        cursor.execute(f'''CREATE TABLE IF NOT EXISTS Version
-                                (version INTEGER DEFAULT {_DB_VERSION})''')
-        self._connection().commit()
-        self._check_database_version()
+        with self._connection() as connection:
+            cursor = connection.cursor()
+
+            cursor.execute('''CREATE TABLE IF NOT EXISTS Record
+                                        (id INTEGER PRIMARY KEY,
+                                        _name TEXT,
+                                        model_type TEXT,
+                                        download_url TEXT,
+                                        url TEXT DEFAULT '',
+                                        download_path TEXT DEFAULT '',
+                                        download_filename TEXT DEFAULT '',
+                                        preview_url TEXT DEFAULT '',
+                                        description TEXT DEFAULT '',
+                                        positive_prompts TEXT DEFAULT '',
+                                        negative_prompts TEXT DEFAULT '',
+                                        sha256_hash TEXT DEFAULT '',
+                                        md5_hash TEXT DEFAULT '',
+                                        created_at INTEGER DEFAULT 0,
+                                        groups TEXT DEFAULT '',
+                                        subdir TEXT DEFAULT '',
+                                        location TEXT DEFAULT '',
+                                        weight REAL DEFAULT 1,
+                                        backup_url TEXT,
+                                        updated_at REAL DEFAULT 0)
+                                     ''')
+
+            cursor.execute(f'''CREATE TABLE IF NOT EXISTS Version
+                                    (version INTEGER DEFAULT {_DB_VERSION})''')
+            connection.commit()
+            self._check_database_version()
 
     def _check_database_version(self):
-        cursor = self._connection().cursor()
-        cursor.execute('SELECT * FROM Version ', )
-        row = cursor.fetchone()
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute('SELECT * FROM Version ', )
+            row = cursor.fetchone()
 
-        if row is None:
-            cursor.execute(f'INSERT INTO Version VALUES ({_DB_VERSION})')
-            self._connection().commit()
+            if row is None:
+                cursor.execute(f'INSERT INTO Version VALUES ({_DB_VERSION})')
+                connection.commit()
 
-        version = _DB_VERSION if row is None else row[0]
-        if version != _DB_VERSION:
-            self._run_migration(version)
+            version = _DB_VERSION if row is None else row[0]
+            if version != _DB_VERSION:
+                self._run_migration(version)
 
+    @tracing.traced('storage.migration')
     def _run_migration(self, current_version):
         migration_map = {
             1: self._migrate_1_to_2,
@@ -106,6 +218,7 @@ class SQLiteStorage(Storage):
             4: self._migrate_4_to_5,
             5: self._migrate_5_to_6,
             6: self._migrate_6_to_7,
+            7: self._migrate_7_to_8,
         }
         for ver in range(current_version, _DB_VERSION):
             self._backup_database(ver)
@@ -114,6 +227,7 @@ class SQLiteStorage(Storage):
                 raise Exception(f'Missing SQLite migration from {ver} to {_DB_VERSION}')
             migration()
 
+    @tracing.traced('storage.backup')
     def _backup_database(self, migrate_from):
         db_file_path = self._database_path()
         backup_db_file_path = f'{db_file_path}.v{migrate_from}.bak'
@@ -121,264 +235,259 @@ class SQLiteStorage(Storage):
         if last_backup_db_file_path and os.path.isfile(last_backup_db_file_path):
             os.remove(last_backup_db_file_path)
             logger.info('Backup database v%s removed', migrate_from - 1)
-        shutil.copy(db_file_path, backup_db_file_path)
+        with self._connection() as connection, closing(sqlite3.connect(backup_db_file_path)) as backup:
+            # Backup API includes changes still kept in the WAL file, unlike plain file copy.
+            connection.backup(backup)
         logger.info('Database v%s backup created', migrate_from)
 
     def _migrate_1_to_2(self):
-        cursor = self._connection().cursor()
-        cursor.execute('ALTER TABLE Record ADD COLUMN created_at INTEGER DEFAULT 0;')
-        cursor.execute("DELETE FROM Version")
-        cursor.execute('INSERT INTO Version VALUES (2)')
-        self._connection().commit()
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute('ALTER TABLE Record ADD COLUMN created_at INTEGER DEFAULT 0;')
+            cursor.execute("DELETE FROM Version")
+            cursor.execute('INSERT INTO Version VALUES (2)')
+            connection.commit()
 
     def _migrate_2_to_3(self):
-        cursor = self._connection().cursor()
-        cursor.execute("ALTER TABLE Record ADD COLUMN groups TEXT DEFAULT '';")
-        cursor.execute("DELETE FROM Version")
-        cursor.execute('INSERT INTO Version VALUES (3)')
-        self._connection().commit()
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("ALTER TABLE Record ADD COLUMN groups TEXT DEFAULT '';")
+            cursor.execute("DELETE FROM Version")
+            cursor.execute('INSERT INTO Version VALUES (3)')
+            connection.commit()
 
     def _migrate_3_to_4(self):
-        cursor = self._connection().cursor()
-        cursor.execute("ALTER TABLE Record RENAME COLUMN model_hash TO sha256_hash;")
-        cursor.execute("ALTER TABLE Record ADD COLUMN subdir TEXT DEFAULT '';")
-        cursor.execute("DELETE FROM Version")
-        cursor.execute('INSERT INTO Version VALUES (4)')
-        self._connection().commit()
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("ALTER TABLE Record RENAME COLUMN model_hash TO sha256_hash;")
+            cursor.execute("ALTER TABLE Record ADD COLUMN subdir TEXT DEFAULT '';")
+            cursor.execute("DELETE FROM Version")
+            cursor.execute('INSERT INTO Version VALUES (4)')
+            connection.commit()
 
     def _migrate_4_to_5(self):
-        cursor = self._connection().cursor()
-        cursor.execute("ALTER TABLE Record ADD COLUMN location TEXT DEFAULT '';")
-        cursor.execute("DELETE FROM Version")
-        cursor.execute('INSERT INTO Version VALUES (5)')
-        self._connection().commit()
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("ALTER TABLE Record ADD COLUMN location TEXT DEFAULT '';")
+            cursor.execute("DELETE FROM Version")
+            cursor.execute('INSERT INTO Version VALUES (5)')
+            connection.commit()
 
     def _migrate_5_to_6(self):
-        cursor = self._connection().cursor()
-        cursor.execute("ALTER TABLE Record ADD COLUMN weight REAL DEFAULT 1;")
-        cursor.execute("DELETE FROM Version")
-        cursor.execute('INSERT INTO Version VALUES (6)')
-        self._connection().commit()
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("ALTER TABLE Record ADD COLUMN weight REAL DEFAULT 1;")
+            cursor.execute("DELETE FROM Version")
+            cursor.execute('INSERT INTO Version VALUES (6)')
+            connection.commit()
 
     def _migrate_6_to_7(self):
-        cursor = self._connection().cursor()
-        cursor.execute("ALTER TABLE Record ADD COLUMN backup_url TEXT DEFAULT '';")
-        cursor.execute("DELETE FROM Version")
-        cursor.execute('INSERT INTO Version VALUES (7)')
-        self._connection().commit()
-
-    def get_all_records(self) -> List:
-        cursor = self._connection().cursor()
-        cursor.execute('SELECT * FROM Record')
-        rows = cursor.fetchall()
-        result = []
-        for row in rows:
-            result.append(map_row_to_record(row))
-        return result
-
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("ALTER TABLE Record ADD COLUMN backup_url TEXT DEFAULT '';")
+            cursor.execute("DELETE FROM Version")
+            cursor.execute('INSERT INTO Version VALUES (7)')
+            connection.commit()
+
+    def _migrate_7_to_8(self):
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("ALTER TABLE Record ADD COLUMN updated_at REAL DEFAULT 0;")
+            cursor.execute("DELETE FROM Version")
+            cursor.execute('INSERT INTO Version VALUES (8)')
+            connection.commit()
+
+    def _load_heavy_fields(self, id_) -> tuple:
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute('SELECT description, positive_prompts, negative_prompts FROM Record WHERE id=?', (id_,))
+            row = cursor.fetchone()
+            return row if row is not None else ('', '', '')
+
+    def _map_rows(self, rows, list_view: bool) -> List:
+        if not list_view:
+            return [map_row_to_record(row) for row in rows]
+
+        # Closure instead of bound method, so deep copies of records (gr.State) don't copy the storage.
+        loader = lambda id_: self._load_heavy_fields(id_)
+        return [map_list_view_row_to_record(row, loader) for row in rows]
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='get_all_records')
+    def get_all_records(self, list_view: bool = False) -> List:
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(_LIST_VIEW_SELECT if list_view else 'SELECT * FROM Record')
+            rows = cursor.fetchall()
+            return self._map_rows(rows, list_view)
+
+    def iterate_all_records(self) -> Iterator[Record]:
+        # Each batch borrows a connection shortly, so the pool isn't held while the consumer processes records.
+        last_id = 0
+        while True:
+            with self._connection() as connection:
+                rows = connection.execute('SELECT * FROM Record WHERE id > ? ORDER BY id LIMIT ?',
+                                          (last_id, _FETCH_BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for row in rows:
+                yield map_row_to_record(row)
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='query_records')
     def query_records(self, name_query: str = None, groups=None, model_types=None, show_downloaded=True,
-                      show_not_downloaded=True) -> List:
+                      show_not_downloaded=True, list_view: bool = False) -> List:
+        with self._connection() as connection:
 
-        query = 'SELECT * FROM Record'
+            query = _LIST_VIEW_SELECT if list_view else 'SELECT * FROM Record'
 
-        is_where_appended = False
-        append_and = False
+            is_where_appended = False
+            append_and = False
 
-        if name_query is not None and name_query:
-            if not is_where_appended:
-                query += ' WHERE'
-                is_where_appended = True
+            if name_query is not None and name_query:
+                if not is_where_appended:
+                    query += ' WHERE'
+                    is_where_appended = True
 
-            query += f" LOWER(_name) LIKE '%{name_query}%'"
-            append_and = True
-
-        if model_types is not None and len(model_types) > 0:
-            if not is_where_appended:
-                query += ' WHERE'
-                is_where_appended = True
-
-            if append_and:
-                query += ' AND'
-
-            query += ' ('
-            append_or = False
-            for model_type in model_types:
-                if append_or:
-                    query += ' OR'
-                query += f" model_type='{model_type}'"
-                append_or = True
-
-            query += ')'
-
-            append_and = True
-            pass
+                query += f" LOWER(_name) LIKE '%{name_query}%'"
+                append_and = True
 
-        if groups is not None and len(groups) > 0:
-            if not is_where_appended:
-                query += ' WHERE'
+            if model_types is not None and len(model_types) > 0:
+                if not is_where_appended:
+                    query += ' WHERE'
+                    is_where_appended = True
 
-            for group in groups:
                 if append_and:
                     query += ' AND'
-                query += f" LOWER(groups) LIKE '%{group}%'"
-                append_and = True
-
-        logger.debug('query: %s',query)
-        cursor = self._connection().cursor()
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        result = []
-        for row in rows:
-            record = map_row_to_record(row)
-            is_downloaded = bool(record.location) and os.path.exists(record.location)
 
-            if show_downloaded and is_downloaded:
-                result.append(record)
-            elif show_not_downloaded and not is_downloaded:
-                result.append(record)
+                query += ' ('
+                append_or = False
+                for model_type in model_types:
+                    if append_or:
+                        query += ' OR'
+                    query += f" model_type='{model_type}'"
+                    append_or = True
 
-        return result
+                query += ')'
 
+                append_and = True
+                pass
+
+            if groups is not None and len(groups) > 0:
+                if not is_where_appended:
+                    query += ' WHERE'
+
+                for group in groups:
+                    if append_and:
+                        query += ' AND'
+                    query += f" LOWER(groups) LIKE '%{group}%'"
+                    append_and = True
+
+            logger.debug('query: %s',query)
+            cursor = connection.cursor()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            result = []
+            for record in self._map_rows(rows, list_view):
+                is_downloaded = bool(record.location) and os.path.exists(record.location)
+
+                if show_downloaded and is_downloaded:
+                    result.append(record)
+                elif show_not_downloaded and not is_downloaded:
+                    result.append(record)
+
+            return result
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='get_record_by_id')
     def get_record_by_id(self, id_) -> Record:
-        cursor = self._connection().cursor()
-        cursor.execute('SELECT * FROM Record WHERE id=?', (id_,))
-        row = cursor.fetchone()
-        return None if row is None else map_row_to_record(row)
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute('SELECT * FROM Record WHERE id=?', (id_,))
+            row = cursor.fetchone()
+            return None if row is None else map_row_to_record(row)
 
+    @metrics.STORAGE_QUERY_DURATION.time(operation='get_records_by_group')
     def get_records_by_group(self, group: str) -> List:
-        cursor = self._connection().cursor()
-        cursor.execute(f"SELECT * FROM Record WHERE LOWER(groups) LIKE '%{group}%'")
-        rows = cursor.fetchall()
-        result = []
-        for row in rows:
-            result.append(map_row_to_record(row))
-        return result
-
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT * FROM Record WHERE LOWER(groups) LIKE '%{group}%'")
+            rows = cursor.fetchall()
+            result = []
+            for row in rows:
+                result.append(map_row_to_record(row))
+            return result
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='get_records_by_query')
     def get_records_by_query(self, query: str) -> List:
-        cursor = self._connection().cursor()
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        result = []
-        for row in rows:
-            result.append(map_row_to_record(row))
-        return result
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            result = []
+            for row in rows:
+                result.append(map_row_to_record(row))
+            return result
 
     def add_record(self, record: Record):
-        cursor = self._connection().cursor()
-        data = (
-            record.name,
-            record.model_type.value,
-            record.download_url,
-            record.url,
-            record.download_path,
-            record.download_filename,
-            record.preview_url,
-            record.description,
-            record.positive_prompts,
-            record.negative_prompts,
-            record.sha256_hash,
-            record.md5_hash,
-            record.created_at,
-            ",".join(record.groups),
-            record.subdir,
-            record.location,
-            record.weight,
-            record.backup_url
-        )
-        cursor.execute(
-            """INSERT INTO Record(
-                    _name,
-                    model_type,
-                    download_url,
-                    url,
-                    download_path,
-                    download_filename,
-                    preview_url,
-                    description,
-                    positive_prompts,
-                    negative_prompts,
-                    sha256_hash,
-                    md5_hash,
-                    created_at,
-                    groups,
-                    subdir,
-                    location,
-                    weight,
-                    backup_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            data)
-        self._connection().commit()
+        self.add_records([record])
 
     def update_record(self, record: Record):
-        cursor = self._connection().cursor()
-        data = (
-            record.name,
-            record.model_type.value,
-            record.download_url,
-            record.url,
-            record.download_path,
-            record.download_filename,
-            record.preview_url,
-            record.description,
-            record.positive_prompts,
-            record.negative_prompts,
-            record.sha256_hash,
-            record.md5_hash,
-            ",".join(record.groups),
-            record.subdir,
-            record.location,
-            record.weight,
-            record.backup_url,
-            record.id_
-        )
-        cursor.execute(
-            """UPDATE Record SET 
-                    _name=?,
-                    model_type=?,
-                    download_url=?,
-                    url=?,
-                    download_path=?,
-                    download_filename=?,
-                    preview_url=?,
-                    description=?,
-                    positive_prompts=?,
-                    negative_prompts=?,
-                    sha256_hash=?,
-                    md5_hash=?,
-                    groups=?,
-                    subdir=?,
-                    location=?,
-                    weight=?,
-                    backup_url=?
-                WHERE id=?
-            """, data
-        )
-
-        self._connection().commit()
+        self.update_records([record])
 
     def remove_record(self, _id):
-        cursor = self._connection().cursor()
-        cursor.execute("DELETE FROM Record WHERE id=?", (_id,))
-        self._connection().commit()
-
+        self.remove_records([_id])
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='add_records')
+    def add_records(self, records: List[Record]):
+        mark_updated(records)
+        with self._connection() as connection:
+            with connection:
+                connection.executemany(_INSERT_RECORD_QUERY, [_map_record_to_insert_row(record) for record in records])
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='update_records')
+    def update_records(self, records: List[Record]):
+        mark_updated(records)
+        with self._connection() as connection:
+            with connection:
+                connection.executemany(_UPDATE_RECORD_QUERY, [_map_record_to_update_row(record) for record in records])
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='set_missing_sha256')
+    def set_missing_sha256(self, location: str, sha256_hash: str) -> int:
+        with self._connection() as connection:
+            with connection:
+                cursor = connection.execute("UPDATE Record SET sha256_hash=?, updated_at=? "
+                                            "WHERE location=? AND (sha256_hash IS NULL OR sha256_hash='')",
+                                            (sha256_hash, time.time(), location))
+                return cursor.rowcount
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='remove_records')
+    def remove_records(self, ids: List):
+        with self._connection() as connection:
+            with connection:
+                connection.executemany("DELETE FROM Record WHERE id=?", [(id_,) for id_ in ids])
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='get_available_groups')
     def get_available_groups(self) -> List:
-        cursor = self._connection().cursor()
-        cursor.execute('SELECT groups FROM Record')
-        rows = cursor.fetchall()
-        result = []
-        for row in rows:
-            if row[0]:
-                result.extend(row[0].split(","))
-
-        result = list(set(result))
-        return list(filter(None, result))
-
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute('SELECT groups FROM Record')
+            rows = cursor.fetchall()
+            result = []
+            for row in rows:
+                if row[0]:
+                    result.extend(row[0].split(","))
+
+            result = list(set(result))
+            return list(filter(None, result))
+
+    @metrics.STORAGE_QUERY_DURATION.time(operation='get_all_records_locations')
     def get_all_records_locations(self) -> List:
-        cursor = self._connection().cursor()
-        cursor.execute('SELECT location FROM Record')
-        rows = cursor.fetchall()
-        result = []
-        for row in rows:
-            if row[0]:
-                result.append(row[0])
-
-        return result
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute('SELECT location FROM Record')
+            rows = cursor.fetchall()
+            result = []
+            for row in rows:
+                if row[0]:
+                    result.append(row[0])
+
+            return result
@@ -1,10 +1,17 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Dict, List, Iterator, Callable
 
-from scripts.mo.models import Record, ModelType
+from scripts.mo.models import Record, ModelType, NOT_LOADED
 
+LIST_VIEW_SKIPPED_FIELDS = ('description', 'positive_prompts', 'negative_prompts')
+
+
+def map_dict_to_record(id_, raw: Dict, heavy_fields_loader: Callable = None) -> Record:
+    if heavy_fields_loader is not None:
+        # List view projection, heavy fields are loaded on demand.
+        raw = {**{field: NOT_LOADED for field in LIST_VIEW_SKIPPED_FIELDS}, **raw}
 
-def map_dict_to_record(id_, raw: Dict) -> Record:
     return Record(
         id_=id_,
         name=raw['name'],
@@ -24,7 +31,9 @@ def map_dict_to_record(id_, raw: Dict) -> Record:
         groups=raw['groups'],
         subdir=raw['subdir'],
         location=raw['location'],
-        weight=raw['weight']
+        weight=raw['weight'],
+        updated_at=raw.get('updated_at', 0),
+        heavy_fields_loader=heavy_fields_loader
     )
 
 
@@ -48,19 +57,39 @@ def map_record_to_dict(record: Record) -> dict:
         'groups': record.groups,
         'subdir': record.subdir,
         'location': record.location,
-        "weight": record.weight
+        "weight": record.weight,
+        'updated_at': record.updated_at
     }
 
 
+def mark_updated(records: List[Record]):
+    """
+    Bumps records version, used to invalidate rendered records cache.
+    """
+    updated_at = time.time()
+    for record in records:
+        record.updated_at = updated_at
+
+
 class Storage(ABC):
 
     @abstractmethod
-    def get_all_records(self) -> List:
+    def get_all_records(self, list_view: bool = False) -> List:
+        """
+        :param list_view: skip heavy fields (description and prompts), they are loaded on first access.
+        """
+        pass
+
+    @abstractmethod
+    def iterate_all_records(self) -> Iterator[Record]:
         pass
 
     @abstractmethod
     def query_records(self, name_query=None, groups=None, model_types=None, show_downloaded=None,
-                      show_not_downloaded=None) -> List:
+                      show_not_downloaded=None, list_view: bool = False) -> List:
+        """
+        :param list_view: skip heavy fields (description and prompts), they are loaded on first access.
+        """
         pass
 
     @abstractmethod
@@ -79,6 +108,18 @@ class Storage(ABC):
     def remove_record(self, _id):
         pass
 
+    @abstractmethod
+    def add_records(self, records: List[Record]):
+        pass
+
+    @abstractmethod
+    def update_records(self, records: List[Record]):
+        pass
+
+    @abstractmethod
+    def remove_records(self, ids: List):
+        pass
+
     @abstractmethod
     def get_available_groups(self) -> List:
         pass
@@ -90,3 +131,11 @@ class Storage(ABC):
     @abstractmethod
     def get_all_records_locations(self) -> List:
         pass
+
+    @abstractmethod
+    def set_missing_sha256(self, location: str, sha256_hash: str) -> int:
+        """
+        Sets hash of records bound to the file which don't have hash yet, other fields are left as is.
+        :return: number of updated records.
+        """
+        pass
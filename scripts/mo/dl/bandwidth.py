@@ -0,0 +1,189 @@
+import re
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from scripts.mo.environment import env, logger
+
+_KIB = 1024
+
+# Unlimited downloads check for changed limits once per this number of bytes.
+_UNLIMITED_STEP = 4 * 1024 * 1024
+# Limited downloads account received bytes about this often, so the speed stays even.
+_THROTTLE_INTERVAL = 0.1
+_MIN_STEP = 16 * 1024
+_BURST_SECONDS = 0.5
+
+_SCHEDULE_WINDOW_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\d+)$')
+
+
+def parse_schedule(value: str) -> List[Tuple[int, int, int]]:
+    """
+    Parses comma separated speed limit windows like "22:00-07:00=0, 09:00-18:00=2048".
+    :param value: windows in the "HH:MM-HH:MM=limit" format, limit in KiB/s, 0 is unlimited.
+    :return: list of window start and end minutes of the day and limit in bytes per second. Invalid windows are skipped.
+    """
+    windows = []
+    for window in filter(None, (part.strip() for part in (value or '').split(','))):
+        match = _SCHEDULE_WINDOW_PATTERN.match(window)
+        if match is None:
+            logger.warning('Invalid download speed schedule window: %s', window)
+            continue
+        start_hour, start_minute, end_hour, end_minute, limit = map(int, match.groups())
+        windows.append((start_hour * 60 + start_minute, end_hour * 60 + end_minute, limit * _KIB))
+    return windows
+
+
+def _find_window(windows: List[Tuple[int, int, int]], minute: int) -> Optional[Tuple[int, int, int]]:
+    for window in windows:
+        start, end, _ = window
+        # Windows with the end before the start span midnight.
+        if start <= minute < end or (end <= start and (minute >= start or minute < end)):
+            return window
+    return None
+
+
+class _TokenBucket:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._updated_at = time.monotonic()
+
+    def reserve(self, amount: int, rate: int) -> float:
+        """
+        Takes tokens for received bytes, the balance may go below zero.
+        :param amount: received bytes.
+        :param rate: allowed bytes per second.
+        :return: delay in seconds needed to stay within the rate.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._updated_at) * rate, rate * _BURST_SECONDS) - amount
+            self._updated_at = now
+            return -self._tokens / rate if self._tokens < 0 else 0
+
+
+class Throttle:
+    """
+    Speed limit handle of a single download. Downloaders sum received bytes and call consume() only when the returned
+    step is reached, so the chunk loop is not slowed down by the limiter, including when there is no limit at all.
+    """
+
+    def __init__(self, shaper, stop_event: threading.Event):
+        self._shaper = shaper
+        self._stop_event = stop_event
+        self._bucket = _TokenBucket()
+        self._is_limited = False
+
+    def consume(self, amount: int) -> int:
+        """
+        Accounts received bytes and sleeps if they exceed the global or per download limit.
+        Thread safe, one handle may be shared by threads downloading parts of the same file.
+        :param amount: bytes received since the previous call.
+        :return: number of bytes to receive before the next call.
+        """
+        limit, download_limit = self._shaper.get_rates()
+        if not limit and not download_limit:
+            self._is_limited = False
+            return _UNLIMITED_STEP
+
+        # Bytes received before the limit was applied are not charged.
+        if self._is_limited:
+            delay = max(self._shaper.bucket.reserve(amount, limit) if limit else 0,
+                        self._bucket.reserve(amount, download_limit) if download_limit else 0)
+            if delay > 0:
+                self._stop_event.wait(delay)
+        self._is_limited = True
+        rate = min(rate for rate in (limit, download_limit) if rate)
+        return max(int(rate * _THROTTLE_INTERVAL), _MIN_STEP)
+
+
+class BandwidthShaper:
+    """
+    Limits the total speed of all downloads and the speed of each download.
+    Limits come from the settings, the schedule windows override the total limit at given time of the day.
+    Both can be overridden at runtime from the UI or the API until reset or restart.
+    """
+    __instance = None
+    __lock = threading.Lock()
+
+    def __init__(self):
+        self.bucket = _TokenBucket()
+        self._limit_override = None
+        self._download_limit_override = None
+        self._schedule = ('', [])
+
+    @staticmethod
+    def instance():
+        if BandwidthShaper.__instance is None:
+            with BandwidthShaper.__lock:
+                if BandwidthShaper.__instance is None:
+                    BandwidthShaper.__instance = BandwidthShaper()
+        return BandwidthShaper.__instance
+
+    def throttle(self, stop_event: threading.Event) -> Throttle:
+        """
+        :param stop_event: download stop event, interrupts waiting.
+        :return: speed limit handle for a new download.
+        """
+        return Throttle(self, stop_event)
+
+    def set_limits(self, limit: Optional[int] = None, download_limit: Optional[int] = None):
+        """
+        Overrides limits from the settings and the schedule.
+        :param limit: total speed limit in KiB/s, 0 is unlimited, None keeps the current value.
+        :param download_limit: speed limit of each download in KiB/s, 0 is unlimited, None keeps the current value.
+        """
+        if limit is not None:
+            self._limit_override = max(int(limit), 0) * _KIB
+        if download_limit is not None:
+            self._download_limit_override = max(int(download_limit), 0) * _KIB
+        logger.info('Download speed limits changed: %s', self.get_limits())
+
+    def reset_limits(self):
+        """
+        Drops runtime overrides, limits from the settings and the schedule are used again.
+        """
+        self._limit_override = None
+        self._download_limit_override = None
+        logger.info('Download speed limits reset: %s', self.get_limits())
+
+    def _scheduled_window(self) -> Optional[Tuple[int, int, int]]:
+        value = env.download_limit_schedule()
+        if value != self._schedule[0]:
+            self._schedule = (value, parse_schedule(value))
+        now = datetime.now()
+        return _find_window(self._schedule[1], now.hour * 60 + now.minute)
+
+    def get_rates(self) -> Tuple[int, int]:
+        """
+        :return: current total and per download speed limits in bytes per second, 0 is unlimited.
+        """
+        limit = self._limit_override
+        if limit is None:
+            window = self._scheduled_window()
+            limit = window[2] if window is not None else int(env.download_limit()) * _KIB
+        download_limit = self._download_limit_override
+        if download_limit is None:
+            download_limit = int(env.download_file_limit()) * _KIB
+        return limit, download_limit
+
+    def get_limits(self) -> dict:
+        """
+        :return: current limits in KiB/s and where the total limit comes from: override, schedule or settings.
+        """
+        limit, download_limit = self.get_rates()
+        if self._limit_override is not None:
+            source = 'override'
+        elif self._scheduled_window() is not None:
+            source = 'schedule'
+        else:
+            source = 'settings'
+        return {
+            'limit': limit // _KIB,
+            'download_limit': download_limit // _KIB,
+            'source': source,
+            'is_download_limit_overridden': self._download_limit_override is not None,
+            'schedule': env.download_limit_schedule()
+        }
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+from scripts.mo.environment import env, logger
+from scripts.mo.utils import calculate_sha256
+
+_BLOBS_DIR = 'sha256'
+_URLS_DIR = 'urls'
+_LOCKS_DIR = 'locks'
+_TEMP_DIR = 'tmp'
+
+_LOCK_HEARTBEAT_INTERVAL = 10
+_LOCK_STALE_SECONDS = 120
+_SHA256_PATTERN = re.compile(r'^[0-9a-fA-F]{64}$')
+
+# Linux ioctl request to clone file extents (btrfs, XFS, bcachefs).
+_FICLONE = 0x40049409
+
+LINK_HARDLINK = 'hardlink'
+LINK_REFLINK = 'reflink'
+LINK_COPY = 'copy'
+
+
+def is_sha256(value: str) -> bool:
+    return bool(value) and _SHA256_PATTERN.match(value) is not None
+
+
+def _reflink(source: str, destination: str):
+    import fcntl
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+        fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+
+
+def _link_or_copy(source: str, destination: str) -> str:
+    """
+    Places source file content at destination path without copying data when file system allows it.
+    :return: used method.
+    """
+    try:
+        os.link(source, destination)
+        return LINK_HARDLINK
+    except OSError as ex:
+        logger.debug('Hardlink %s failed: %s', destination, ex)
+
+    try:
+        _reflink(source, destination)
+        return LINK_REFLINK
+    except (OSError, ImportError) as ex:
+        logger.debug('Reflink %s failed: %s', destination, ex)
+        if os.path.exists(destination):
+            os.remove(destination)
+
+    shutil.copyfile(source, destination)
+    return LINK_COPY
+
+
+def _url_key(url: str) -> str:
+    return hashlib.md5(url.encode('utf-8')).hexdigest()
+
+
+class BlobLock:
+    """
+    Cross-process lock file created with O_EXCL, which is atomic on local file systems and NFS.
+    The holder refreshes the file modification time, a lock that was not refreshed for a while is considered
+    abandoned by a crashed process and is taken over. Each holder writes a unique token into the file and removes
+    the file only while the token is its own, so a holder that lost the lock never removes the lock of another one.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._token = uuid.uuid4().hex
+        self._refreshed_at = 0
+
+    def try_acquire(self) -> bool:
+        if self._create():
+            return True
+
+        stale_token = self._read_token(self._path)
+        if stale_token is not None and self._is_stale(self._path):
+            logger.warning('Taking over abandoned lock: %s', self._path)
+            if self._remove_if_owned_by(stale_token, stale_only=True):
+                return self._create()
+        return False
+
+    def refresh(self):
+        now = time.time()
+        if now - self._refreshed_at >= _LOCK_HEARTBEAT_INTERVAL:
+            self._refreshed_at = now
+            if self._read_token(self._path) != self._token:
+                logger.warning('Lock was taken over by another process: %s', self._path)
+                return
+            os.utime(self._path)
+
+    def release(self):
+        if not self._remove_if_owned_by(self._token):
+            logger.warning('Lock was taken over by another process, not removed: %s', self._path)
+
+    def _create(self) -> bool:
+        try:
+            fd = os.open(self._path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(fd, 'w') as file:
+            json.dump({'token': self._token, 'host': socket.gethostname(), 'pid': os.getpid(),
+                       'created_at': time.time()}, file)
+        self._refreshed_at = time.time()
+        return True
+
+    def _remove_if_owned_by(self, token: str, stale_only: bool = False) -> bool:
+        """
+        Moves the lock file aside first, rename is atomic, so only one process gets the file. The file is put back
+        if it turns out to be a lock created or refreshed by another process in the meantime.
+        :param token: token of the lock to remove.
+        :param stale_only: remove the lock only if it was not refreshed for a while.
+        :return: True if the lock with the token was removed.
+        """
+        moved_path = f'{self._path}.{uuid.uuid4().hex}.released'
+        try:
+            os.rename(self._path, moved_path)
+        except FileNotFoundError:
+            return False
+
+        if self._read_token(moved_path) == token and (not stale_only or self._is_stale(moved_path)):
+            os.remove(moved_path)
+            return True
+
+        try:
+            # Unlike rename, link doesn't replace a lock created after the file was moved.
+            os.link(moved_path, self._path)
+        except FileExistsError:
+            pass
+        os.remove(moved_path)
+        return False
+
+    @staticmethod
+    def _read_token(path: str) -> Optional[str]:
+        try:
+            with open(path) as file:
+                return json.load(file).get('token')
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Written by an older version or not written completely yet.
+            return ''
+
+    @staticmethod
+    def _is_stale(path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) > _LOCK_STALE_SECONDS
+        except FileNotFoundError:
+            return False
+
+
+class BlobStore:
+    """
+    Content-addressed store of downloaded model files keyed by SHA256. Each file is downloaded into the store once
+    and materialized into model directories via hardlink, reflink or copy, whichever the file system supports.
+    Download URLs are remembered, so repeated downloads of the same URL are served from the store as well.
+    All state is kept in plain files, so a store can be shared between machines over a network mount.
+    """
+    __instances: Dict[str, 'BlobStore'] = {}
+    __lock = threading.Lock()
+
+    def __init__(self, root: str):
+        self.root = root
+        self.temp_dir = os.path.join(root, _TEMP_DIR)
+        for directory in (_BLOBS_DIR, _URLS_DIR, _LOCKS_DIR, _TEMP_DIR):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    @staticmethod
+    def for_path(root: str):
+        with BlobStore.__lock:
+            store = BlobStore.__instances.get(root)
+            if store is None:
+                store = BlobStore(root)
+                BlobStore.__instances[root] = store
+        return store
+
+    @staticmethod
+    def instance():
+        """
+        :return: local blob store.
+        """
+        return BlobStore.for_path(env.blob_store_path())
+
+    @staticmethod
+    def shared_cache():
+        """
+        :return: blob store in the shared cache directory or None if it is not configured.
+        """
+        path = env.shared_cache_path().strip()
+        return BlobStore.for_path(path) if path else None
+
+    def blob_path(self, sha256: str) -> str:
+        sha256 = sha256.lower()
+        return os.path.join(self.root, _BLOBS_DIR, sha256[:2], sha256)
+
+    def has_blob(self, sha256: str) -> bool:
+        return bool(sha256) and os.path.isfile(self.blob_path(sha256))
+
+    def find(self, sha256: str = None, url: str = None) -> Optional[str]:
+        """
+        Looks up stored blob by file hash or by the URL it was downloaded from. The URL is used only when the expected
+        hash is unknown, as the URL might serve another file now or the entry might be written by another machine.
+        :param sha256: expected file hash, if known.
+        :param url: download URL.
+        :return: SHA256 of the stored blob or None.
+        """
+        if sha256 and self.has_blob(sha256):
+            return sha256.lower()
+        if is_sha256(sha256):
+            return None
+
+        if url:
+            url_sha256, _ = self._read_url_entry(url)
+            if self.has_blob(url_sha256):
+                return url_sha256
+        return None
+
+    def url_filename(self, url: str) -> Optional[str]:
+        """
+        :return: original name of the file downloaded from the URL, if it was remembered.
+        """
+        return self._read_url_entry(url)[1] if url else None
+
+    def _read_url_entry(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        # The first line is the blob hash, the second one is the original filename (absent in old entries).
+        try:
+            with open(os.path.join(self.root, _URLS_DIR, _url_key(url))) as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            return None, None
+        return (lines[0].strip() if lines else None), ((lines[1].strip() or None) if len(lines) > 1 else None)
+
+    def add(self, file_path: str, url: str = None, on_progress: Callable = None, filename: str = None) -> str:
+        """
+        Moves downloaded file into the store.
+        :param file_path: downloaded file, should be located in the store temp dir.
+        :param url: download URL to remember.
+        :param on_progress: callback called periodically while the file is hashed, e.g. to refresh a lock.
+        :param filename: original filename to remember with the URL.
+        :return: SHA256 of the stored blob.
+        """
+        sha256 = calculate_sha256(file_path, on_progress)
+        blob_path = self.blob_path(sha256)
+        if os.path.isfile(blob_path):
+            os.remove(file_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.chmod(file_path, 0o644)
+            os.replace(file_path, blob_path)
+
+        if url:
+            self._write_atomically(os.path.join(self.root, _URLS_DIR, _url_key(url)),
+                                   f'{sha256}\n{filename}' if filename else sha256)
+        logger.debug('Blob stored: %s', sha256)
+        return sha256
+
+    def import_blob(self, source: 'BlobStore', sha256: str, url: str = None, filename: str = None) -> str:
+        """
+        Adds blob from another store, e.g. from the shared cache into the local store.
+        :return: used method, one of LINK_HARDLINK, LINK_REFLINK or LINK_COPY.
+        """
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        method = _link_or_copy(source.blob_path(sha256), temp_path)
+        self.add(temp_path, url, filename=filename)
+        return method
+
+    def materialize(self, sha256: str, destination: str) -> str:
+        """
+        Places stored blob at destination path.
+        :param sha256: blob hash.
+        :param destination: target file path, must not exist.
+        :return: used method, one of LINK_HARDLINK, LINK_REFLINK or LINK_COPY.
+        """
+        temp_path = os.path.join(os.path.dirname(destination), f'.{uuid.uuid4().hex}.tmp')
+        try:
+            method = _link_or_copy(self.blob_path(sha256), temp_path)
+            os.replace(temp_path, destination)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        logger.debug('Blob %s materialized via %s: %s', sha256, method, destination)
+        return method
+
+    def lock(self, sha256: str = None, url: str = None) -> BlobLock:
+        """
+        Creates lock for the blob download, so concurrent processes sharing the store download it only once.
+        """
+        key = sha256.lower() if sha256 else _url_key(url)
+        return BlobLock(os.path.join(self.root, _LOCKS_DIR, key + '.lock'))
+
+    @staticmethod
+    def _write_atomically(path: str, content: str):
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(content)
+        os.replace(temp_path, path)
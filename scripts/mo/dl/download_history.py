@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from typing import List, Optional
+
+from scripts.mo.data.sqlite_pool import SQLitePool
+from scripts.mo.environment import env
+
+_DB_FILE = 'download_history.sqlite'
+_HISTORY_LIMIT = 10000
+
+_ENTRY_FIELDS = ('id', 'record_id', 'record_name', 'url', 'host', 'bytes', 'duration', 'average_speed',
+                 'peak_speed', 'outcome', 'retries', 'error', 'finished_at')
+
+# Speed is calculated over downloads that transferred data, files served from the blob store take no time.
+_AGGREGATE_COLUMNS = '''COUNT(*),
+                        SUM(CASE WHEN outcome='Completed' THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN outcome='Error' THEN 1 ELSE 0 END),
+                        SUM(bytes),
+                        SUM(CASE WHEN duration > 0 THEN bytes ELSE 0 END),
+                        SUM(duration),
+                        MAX(peak_speed),
+                        SUM(retries)'''
+
+_AGGREGATE_FIELDS = ('downloads', 'completed', 'failed', 'bytes', 'transferred_bytes', 'duration', 'peak_speed',
+                     'retries')
+
+
+def _map_aggregate_row(key_field: str, row) -> dict:
+    result = dict(zip((key_field,) + _AGGREGATE_FIELDS, row))
+    duration = result['duration'] or 0
+    result['average_speed'] = result.pop('transferred_bytes') / duration if duration > 0 else None
+    return result
+
+
+class DownloadHistory:
+    """
+    Persistent log of finished record downloads with their transfer statistics.
+    Used to compare mirrors and hosts by measured throughput and to size download concurrency.
+    """
+    __instance = None
+    __lock = threading.Lock()
+
+    def __init__(self):
+        self._pool = SQLitePool(os.path.join(env.database_dir(), _DB_FILE), max_connections=4)
+        self._initialize()
+
+    @staticmethod
+    def instance():
+        if DownloadHistory.__instance is None:
+            with DownloadHistory.__lock:
+                if DownloadHistory.__instance is None:
+                    DownloadHistory.__instance = DownloadHistory()
+        return DownloadHistory.__instance
+
+    def _initialize(self):
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute('''CREATE TABLE IF NOT EXISTS Download
+                                        (id INTEGER PRIMARY KEY,
+                                        record_id INTEGER,
+                                        record_name TEXT,
+                                        url TEXT,
+                                        host TEXT,
+                                        bytes INTEGER DEFAULT 0,
+                                        duration REAL DEFAULT 0,
+                                        average_speed REAL,
+                                        peak_speed REAL,
+                                        outcome TEXT,
+                                        retries INTEGER DEFAULT 0,
+                                        error TEXT,
+                                        finished_at REAL)''')
+                connection.execute('CREATE INDEX IF NOT EXISTS DownloadFinishedAt ON Download(finished_at)')
+
+    def add(self, record_id, record_name: str, url: str, host: str, bytes_: int, duration: float,
+            peak_speed: Optional[float], outcome: str, retries: int = 0, error: str = None):
+        """
+        Saves finished download.
+        :param record_id: downloaded record id.
+        :param record_name: record name, kept in case the record is removed.
+        :param url: URL the file was transferred from.
+        :param host: URL host.
+        :param bytes_: transferred bytes, 0 if the file was not transferred.
+        :param duration: transfer duration in seconds.
+        :param peak_speed: highest reported speed in bytes per second.
+        :param outcome: final record download status.
+        :param retries: number of URLs tried before the one used.
+        :param error: error message of failed download.
+        """
+        average_speed = bytes_ / duration if duration > 0 else None
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute(f'INSERT INTO Download({", ".join(_ENTRY_FIELDS[1:])}) '
+                                   f'VALUES ({", ".join("?" * (len(_ENTRY_FIELDS) - 1))})',
+                                   (record_id, record_name, url, host, bytes_, duration, average_speed, peak_speed,
+                                    outcome, retries, error, time.time()))
+                connection.execute('DELETE FROM Download WHERE id <= (SELECT MAX(id) FROM Download) - ?',
+                                   (_HISTORY_LIMIT,))
+
+    def list_entries(self, limit: int = 100) -> List[dict]:
+        """
+        :param limit: maximum number of entries.
+        :return: latest downloads, newest first.
+        """
+        with self._pool.connection() as connection:
+            rows = connection.execute(f'SELECT {", ".join(_ENTRY_FIELDS)} FROM Download ORDER BY id DESC LIMIT ?',
+                                      (limit,)).fetchall()
+        return [dict(zip(_ENTRY_FIELDS, row)) for row in rows]
+
+    def host_stats(self) -> List[dict]:
+        """
+        :return: downloads, failures, bytes and average/peak speed by host, busiest hosts first.
+        """
+        with self._pool.connection() as connection:
+            rows = connection.execute(f'SELECT host, {_AGGREGATE_COLUMNS} FROM Download '
+                                      f'GROUP BY host ORDER BY SUM(bytes) DESC').fetchall()
+        return [_map_aggregate_row('host', row) for row in rows]
+
+    def daily_stats(self, days: int = 30) -> List[dict]:
+        """
+        :param days: number of days to include.
+        :return: downloads, failures, bytes and average/peak speed by local date, newest first.
+        """
+        with self._pool.connection() as connection:
+            rows = connection.execute(f"SELECT DATE(finished_at, 'unixepoch', 'localtime') AS day, "
+                                      f"{_AGGREGATE_COLUMNS} FROM Download WHERE finished_at >= ? "
+                                      f"GROUP BY day ORDER BY day DESC",
+                                      (time.time() - days * 24 * 60 * 60,)).fetchall()
+        return [_map_aggregate_row('day', row) for row in rows]
+
+    def average_speed(self, host: str) -> Optional[float]:
+        """
+        :param host: URL host.
+        :return: measured average download speed of the host in bytes per second or None if unknown.
+        """
+        with self._pool.connection() as connection:
+            row = connection.execute('SELECT SUM(bytes), SUM(duration) FROM Download '
+                                     'WHERE host=? AND duration > 0', (host,)).fetchone()
+        return row[0] / row[1] if row is not None and row[1] else None
@@ -1,16 +1,24 @@
 import os
 import tempfile
 import threading
-from copy import deepcopy
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
 from urllib.parse import urlparse
 
+import scripts.mo.metrics as metrics
+import scripts.mo.tracing as tracing
+from scripts.mo.data.hash_index import HashIndex
+from scripts.mo.dl.blob_store import BlobStore
+from scripts.mo.dl.download_history import DownloadHistory
 from scripts.mo.dl.downloader import Downloader
 from scripts.mo.dl.gdrive_downloader import GDriveDownloader
 from scripts.mo.dl.http_downloader import HttpDownloader
+from scripts.mo.dl.mirror_racing import choose_mirror
+from scripts.mo.dl.peer_downloader import PeerDownloader, get_peers, is_sha256, peer_url
 from scripts.mo.environment import env, logger, calculate_md5
 from scripts.mo.models import Record
-from scripts.mo.utils import resize_preview_image, get_model_filename_without_extension, calculate_sha256
+from scripts.mo.utils import resize_preview_image, get_model_filename_without_extension, calculate_file_temp_hash
 
 GENERAL_STATUS_IN_PROGRESS = 'In Progress'
 GENERAL_STATUS_CANCELLED = 'Cancelled'
@@ -24,6 +32,9 @@ RECORD_STATUS_EXISTS = 'Exists'
 RECORD_STATUS_ERROR = 'Error'
 RECORD_STATUS_CANCELLED = 'Cancelled'
 
+_SHARED_CACHE_POLL_INTERVAL = 1
+_PEAK_SPEED_WINDOW = 1
+
 
 def _get_destination_dir_path(record: Record) -> str:
     path = record.download_path
@@ -54,19 +65,36 @@ def _get_filename_from_url(url):
     return filename + extension
 
 
-def _get_filename(downloader: Downloader,url , record: Record) -> str:
+def _get_filename(downloader: Downloader, url, record: Record, is_stored: bool = False) -> str:
+    """
+    Resolves model filename. The URL is requested for the filename only if the file is not stored locally.
+    """
     if record.download_filename:
         filename = record.download_filename
     else:
         url_filename = _get_filename_from_url(url)
         if url_filename is not None:
             return url_filename
-        filename = downloader.fetch_filename(url)
+        filename = _get_stored_filename(url, record) if is_stored else downloader.fetch_filename(url)
         if filename is None:
             filename = str(record.id_)
     return filename
 
 
+def _get_stored_filename(url, record: Record) -> Optional[str]:
+    stores = [BlobStore.instance() if env.blob_store_enabled() else None, BlobStore.shared_cache()]
+    for store in stores:
+        filename = store.url_filename(url) if store is not None else None
+        if filename:
+            return filename
+    return os.path.basename(record.location) if record.location else None
+
+
+def _original_filename(record: Record, filename: str) -> Optional[str]:
+    # Custom filename of the record is not the name of the file behind the URL.
+    return None if record.download_filename else filename
+
+
 def _change_file_extension(filename, new_extension):
     base, ext = os.path.splitext(filename)
     if not ext:
@@ -86,12 +114,13 @@ class DownloadManager:
         self._stop_event = threading.Event()
         self._stop_event.set()
 
-        self._state = {}
-        self._latest_state = {}
-        self._thread = None
         self._temp_files = set()
+        # Statistics of the current record download, saved into the download history when it ends.
+        self._transfer = None
+        self._retries = 0
 
         self._downloaders: List = [
+            PeerDownloader(),
             GDriveDownloader(),
             HttpDownloader()  # Should always be the last one to give a chance for other http schemas
         ]
@@ -104,100 +133,87 @@ class DownloadManager:
                     DownloadManager.__instance = DownloadManager()
         return DownloadManager.__instance
 
-    def is_running(self) -> bool:
-        return not self._stop_event.is_set()
-
-    def get_state(self) -> dict:
-        return self._state
-
-    def get_latest_state(self) -> dict:
-        return self._latest_state
-
-    def start_download(self, records: List):
-        if not self._stop_event.is_set():
-            logger.warning('Download already running')
-            return
-
-        self._stop_event.clear()
-        self._state = {}
-        self._latest_state = {}
-        self._state_update(general_status=GENERAL_STATUS_IN_PROGRESS)
-        self._thread = threading.Thread(target=self._download_loop, args=(records,), daemon=True)
-        self._thread.start()
-
-    def stop_download(self):
-        if self._stop_event.is_set():
-            logger.warning('Download not running')
-            return
-
-        self._stop_event.set()
-        self._thread.join()
-
-    def _state_update(self, general_status=None, exception=None, record_id=None, record_state=None):
-        new_general_state = deepcopy(self._state)
-
-        latest_state = {}
-
-        if general_status is not None:
-            new_general_state['general_status'] = general_status
-            latest_state['general_status'] = general_status
-
-        if exception is not None:
-            new_general_state['exception'] = str(exception)
-            latest_state['exception'] = str(exception)
-
-        if record_id is not None and record_state is not None:
-            if new_general_state.get('records') is None:
-                new_general_state['records'] = {}
-
-            if new_general_state['records'].get(record_id) is None:
-                new_general_state['records'][record_id] = record_state
-            else:
-                new_general_state['records'][record_id].update(record_state)
-
-            latest_state['records'] = {record_id: record_state}
-
-        if general_status == GENERAL_STATUS_CANCELLED and new_general_state.get('records') is not None:
-            for key, value in new_general_state['records'].items():
-                if value.get('status') and \
-                        (value['status'] == RECORD_STATUS_PENDING or value['status'] == RECORD_STATUS_IN_PROGRESS):
-                    value['status'] = RECORD_STATUS_CANCELLED
-
-        self._state = new_general_state
-        self._latest_state = latest_state
-
-    def _download_loop(self, records: List):
+    @staticmethod
+    def download_record(record: Record, stop_event: threading.Event, on_update: Callable = None) -> dict:
+        """
+        Downloads single record independently of other downloads.
+        Each call uses its own manager, so temp files of concurrent downloads are tracked separately.
+        :param record: record to download.
+        :param stop_event: event that cancels the download when set.
+        :param on_update: callback called with each record state update.
+        :return: final record state.
+        """
+        worker = DownloadManager()
+        worker._stop_event = stop_event
+        state = {}
         try:
-            self._clear_temp_files()
-            for record in records:
-                for upd in self._download_record(record):
-                    self._state_update(record_id=record.id_, record_state=upd)
-
-                    if self._stop_event.is_set():
-                        break
-
-            exception = None
-            for key, value in self._state['records'].items():
-                if value.get('exception') is not None:
-                    exception = value['exception']
-                    break
-
-            if exception is not None:
-                self._state_update(general_status=GENERAL_STATUS_ERROR)
-            elif self._stop_event.is_set():
-                self._state_update(general_status=GENERAL_STATUS_CANCELLED)
-            else:
-                self._state_update(general_status=GENERAL_STATUS_COMPLETED)
+            with tracing.span('download.record'):
+                for upd in worker._download_record(record):
+                    state.update(upd)
+                    if on_update is not None:
+                        on_update(upd)
+        finally:
+            worker._clear_temp_files()
+        if stop_event.is_set() and state.get('status') == RECORD_STATUS_IN_PROGRESS:
+            state['status'] = RECORD_STATUS_CANCELLED
+        worker._finish_record(record, state)
+        return state
 
+    @staticmethod
+    def download_records_parallel(records: List, stop_event: threading.Event, max_workers: int,
+                                  on_record_done: Callable = None) -> dict:
+        """
+        Downloads records concurrently, independently of the download queue.
+        :param records: records to download.
+        :param stop_event: event that cancels the downloads when set.
+        :param max_workers: maximum number of concurrent downloads.
+        :param on_record_done: callback called with record and its final state when record download ends.
+        :return: dictionary of final record states by record id.
+        """
+
+        def download(record: Record) -> dict:
+            try:
+                state = DownloadManager.download_record(record, stop_event)
+            finally:
+                metrics.DOWNLOAD_QUEUE_DEPTH.dec()
+            if on_record_done is not None:
+                on_record_done(record, state)
+            return state
+
+        metrics.DOWNLOAD_QUEUE_DEPTH.inc(len(records))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            states = list(executor.map(download, records))
+        return {record.id_: state for record, state in zip(records, states)}
+
+    def _finish_record(self, record: Record, state: dict):
+        """
+        Updates download metrics and saves the finished record download into the history.
+        :param record: downloaded record.
+        :param state: final record download state.
+        """
+        status = state.get('status')
+        if status == RECORD_STATUS_IN_PROGRESS or status == RECORD_STATUS_PENDING:
+            status = RECORD_STATUS_CANCELLED
+        exception = state.get('exception')
+        metrics.DOWNLOADS.inc(status=status)
+        if status == RECORD_STATUS_ERROR and exception is not None:
+            # Some downloaders report errors as messages rather than exceptions.
+            metrics.DOWNLOAD_FAILURES.inc(exception=type(exception).__name__ if isinstance(exception, Exception)
+                                          else 'Other')
+
+        transfer = self._transfer or {}
+        url = transfer.get('url', record.backup_url if self._retries else record.download_url)
+        try:
+            DownloadHistory.instance().add(record.id_, record.name, url, urlparse(url).hostname or '',
+                                           transfer.get('bytes', 0), transfer.get('duration', 0),
+                                           transfer.get('peak_speed'), status, self._retries,
+                                           str(exception) if exception is not None else None)
         except Exception as ex:
-            self._state_update(general_status=GENERAL_STATUS_ERROR, exception=str(ex))
-            logger.exception(ex)
-        self._clear_temp_files()
-
-        self._stop_event.set()
-        self._running = False
+            logger.warning('Failed to save download history: %s', ex)
 
     def _download_record(self, record: Record):
+        self._transfer = None
+        self._retries = 0
         try:
             yield {'status': RECORD_STATUS_IN_PROGRESS}
 
@@ -205,7 +221,21 @@ class DownloadManager:
             logger.debug('Start download record with id: %s', record.id_)
 
             download_url = record.download_url
-            url_availability, url_exception_message = downloader.check_url_available(download_url)
+            with tracing.span('download.check_sources'):
+                is_stored = self._is_stored(record)
+                is_on_peers = not is_stored and self._is_on_peers(record)
+                mirror = None
+                if not is_stored and not is_on_peers and env.mirror_racing() and self._has_http_mirrors(record):
+                    mirror = choose_mirror([record.download_url, record.backup_url], record.sha256_hash,
+                                           self._stop_event)
+                if is_stored or is_on_peers:
+                    # Served from the local store, shared cache or peers, the download URL is not requested.
+                    url_availability, url_exception_message = True, None
+                elif mirror is not None:
+                    download_url, downloader = mirror.url, mirror.downloader
+                    url_availability, url_exception_message = True, None
+                else:
+                    url_availability, url_exception_message = downloader.check_url_available(download_url)
 
             if not url_availability:
                 logger.debug(
@@ -216,6 +246,7 @@ class DownloadManager:
                 )
                 if record.backup_url != '':
                     download_url = record.backup_url
+                    self._retries += 1
                 else:
                     yield {'status': RECORD_STATUS_ERROR, 'exception': url_exception_message}
                     return
@@ -234,9 +265,14 @@ class DownloadManager:
             if self._stop_event.is_set():
                 return
 
-            filename = _get_filename(downloader, download_url, record)
+            filename = _get_filename(downloader, download_url, record, is_stored)
             logger.debug('filename: %s', filename)
 
+            if is_on_peers:
+                logger.debug('Downloading %s from peers', record.sha256_hash)
+                download_url = peer_url(record.sha256_hash)
+                downloader = self._get_downloader(download_url)
+
             yield {'filename': filename}
 
             if self._stop_event.is_set():
@@ -256,25 +292,29 @@ class DownloadManager:
             if self._stop_event.is_set():
                 return
 
-            with tempfile.NamedTemporaryFile(delete=False, dir=destination_dir) as temp:
-                logger.debug('Downloading into tmp file: %s', temp.name)
-                self._temp_files.add(temp)
-                for upd in downloader.download(download_url, temp.name, filename, self._stop_event):
-                    yield {'dl': upd}
-
-                temp.close()
-
-                if self._stop_event.is_set():
-                    return
-
-                os.rename(temp.name, destination_file_path)
-                self._temp_files.remove(temp)
-                os.chmod(destination_file_path, 0o644)
-                logger.debug('Move from tmp file to destination: %s', destination_file_path)
+            blob_store = BlobStore.instance() if env.blob_store_enabled() else None
+            shared_cache = BlobStore.shared_cache()
+            with tracing.span('download.transfer'):
+                if shared_cache is not None:
+                    sha256 = yield from self._fetch_via_shared_cache(shared_cache, blob_store, downloader,
+                                                                     download_url, filename, record,
+                                                                     destination_file_path)
+                else:
+                    sha256 = yield from self._fetch_via_blob_store(blob_store, downloader, download_url, filename,
+                                                                   record, destination_file_path)
+            if self._stop_event.is_set():
+                return
 
+            tracing.count('bytes', os.path.getsize(destination_file_path))
             record.location = destination_file_path
-            record.md5_hash = calculate_md5(destination_file_path)
-            record.sha256_hash = calculate_sha256(destination_file_path)
+            with tracing.span('download.hash'):
+                record.md5_hash = calculate_md5(destination_file_path)
+                if sha256 is not None:
+                    HashIndex.instance().put(destination_file_path, calculate_file_temp_hash(destination_file_path),
+                                             os.path.getsize(destination_file_path), sha256)
+                    record.sha256_hash = sha256
+                else:
+                    record.sha256_hash = HashIndex.instance().get_sha256(destination_file_path)
 
             env.storage.update_record(record)
 
@@ -328,6 +368,131 @@ class DownloadManager:
 
         yield {'status': RECORD_STATUS_COMPLETED}
 
+    @staticmethod
+    def _is_stored(record: Record) -> bool:
+        stores = [BlobStore.instance() if env.blob_store_enabled() else None, BlobStore.shared_cache()]
+        return any(store is not None and store.find(record.sha256_hash, record.download_url) is not None
+                   for store in stores)
+
+    def _has_http_mirrors(self, record: Record) -> bool:
+        urls = [record.download_url, record.backup_url]
+        return all(url and isinstance(self._get_downloader(url), HttpDownloader) for url in urls)
+
+    def _is_on_peers(self, record: Record) -> bool:
+        if not get_peers() or not is_sha256(record.sha256_hash):
+            return False
+        return self._get_downloader(peer_url(record.sha256_hash)).check_url_available(peer_url(record.sha256_hash))[0]
+
+    def _download_into(self, downloader: Downloader, url: str, temp_dir: str, filename: str, on_update=None):
+        """
+        Downloads file into temp dir.
+        :return: downloaded temp file path or None if download was stopped.
+        """
+        host = urlparse(url).hostname or ''
+        started_at = time.perf_counter()
+        peak_speed = None
+        window_started_at, window_bytes = started_at, 0
+        with tempfile.NamedTemporaryFile(delete=False, dir=temp_dir) as temp:
+            logger.debug('Downloading into tmp file: %s', temp.name)
+            self._temp_files.add(temp)
+            try:
+                for upd in downloader.download(url, temp.name, filename, self._stop_event):
+                    if on_update is not None:
+                        on_update()
+                    bytes_ready = upd.get('bytes_ready')
+                    if isinstance(bytes_ready, int):
+                        now = time.perf_counter()
+                        if now - window_started_at >= _PEAK_SPEED_WINDOW:
+                            speed = (bytes_ready - window_bytes) / (now - window_started_at)
+                            peak_speed = speed if peak_speed is None else max(peak_speed, speed)
+                            window_started_at, window_bytes = now, bytes_ready
+                    yield {'dl': upd}
+            finally:
+                # Observed once per transfer, so the chunks loop is not slowed down.
+                duration = time.perf_counter() - started_at
+                bytes_ = os.path.getsize(temp.name) if os.path.isfile(temp.name) else 0
+                metrics.DOWNLOAD_DURATION.observe(duration, host=host)
+                metrics.DOWNLOAD_BYTES.inc(bytes_, host=host)
+                if duration > 0:
+                    # Transfers shorter than the speed window and their last partial window are measured on average.
+                    peak_speed = max(peak_speed or 0, bytes_ / duration)
+                self._transfer = {'url': url, 'bytes': bytes_, 'duration': duration, 'peak_speed': peak_speed}
+
+            temp.close()
+
+        if self._stop_event.is_set():
+            return None
+        self._temp_files.remove(temp)
+        return temp.name
+
+    def _fetch_via_blob_store(self, blob_store: Optional[BlobStore], downloader: Downloader, url: str, filename: str,
+                              record: Record, destination_file_path: str):
+        """
+        Places model file at destination, downloads it unless it is already in the local blob store.
+        :return: SHA256 of the file if it is known.
+        """
+        sha256 = blob_store.find(record.sha256_hash, url) if blob_store is not None else None
+        if sha256 is not None:
+            method = blob_store.materialize(sha256, destination_file_path)
+            logger.debug('Model taken from blob store via %s: %s', method, destination_file_path)
+            return sha256
+
+        temp_dir = blob_store.temp_dir if blob_store is not None else os.path.dirname(destination_file_path)
+        temp_path = yield from self._download_into(downloader, url, temp_dir, filename)
+        if temp_path is None:
+            return None
+
+        if blob_store is not None:
+            sha256 = blob_store.add(temp_path, url, filename=_original_filename(record, filename))
+            blob_store.materialize(sha256, destination_file_path)
+        else:
+            os.rename(temp_path, destination_file_path)
+            os.chmod(destination_file_path, 0o644)
+        logger.debug('Move from tmp file to destination: %s', destination_file_path)
+        return sha256
+
+    def _fetch_via_shared_cache(self, shared_cache: BlobStore, blob_store: Optional[BlobStore],
+                                downloader: Downloader, url: str, filename: str, record: Record,
+                                destination_file_path: str):
+        """
+        Places model file at destination, taking it from the shared cache. A missing file is downloaded into
+        the shared cache under a lock file, concurrent nodes wait for it instead of downloading it again.
+        :return: SHA256 of the file.
+        """
+        sha256 = shared_cache.find(record.sha256_hash, url)
+        if sha256 is None:
+            lock = shared_cache.lock(record.sha256_hash, url)
+            while not lock.try_acquire():
+                yield {'waiting_shared_cache': True}
+                if self._stop_event.wait(_SHARED_CACHE_POLL_INTERVAL):
+                    return None
+                sha256 = shared_cache.find(record.sha256_hash, url)
+                if sha256 is not None:
+                    break
+
+            if sha256 is None:
+                try:
+                    # Another node might have finished the download right before the lock was released.
+                    sha256 = shared_cache.find(record.sha256_hash, url)
+                    if sha256 is None:
+                        temp_path = yield from self._download_into(downloader, url, shared_cache.temp_dir, filename,
+                                                                   on_update=lock.refresh)
+                        if temp_path is None:
+                            return None
+                        sha256 = shared_cache.add(temp_path, url, on_progress=lock.refresh,
+                                                 filename=_original_filename(record, filename))
+                finally:
+                    lock.release()
+
+        if blob_store is not None:
+            if not blob_store.has_blob(sha256):
+                blob_store.import_blob(shared_cache, sha256, url, shared_cache.url_filename(url))
+            method = blob_store.materialize(sha256, destination_file_path)
+        else:
+            method = shared_cache.materialize(sha256, destination_file_path)
+        logger.debug('Model taken from shared cache via %s: %s', method, destination_file_path)
+        return sha256
+
     def _get_downloader(self, url: str) -> Downloader:
         for downloader in self._downloaders:
             if downloader.accepts_url(url):
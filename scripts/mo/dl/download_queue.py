@@ -0,0 +1,327 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import scripts.mo.metrics as metrics
+from scripts.mo.data.sqlite_pool import SQLitePool
+from scripts.mo.dl.download_manager import DownloadManager, RECORD_STATUS_PENDING, RECORD_STATUS_IN_PROGRESS, \
+    RECORD_STATUS_ERROR, RECORD_STATUS_CANCELLED
+from scripts.mo.environment import env, logger
+
+_DB_FILE = 'download_queue.sqlite'
+_HISTORY_LIMIT = 500
+_FINISHED_STATES_LIMIT = 200
+
+# Delay before the second attempt, doubled after each next failed attempt.
+_RETRY_DELAY = 30
+_MAX_RETRY_DELAY = 30 * 60
+
+ACTIVE_STATUSES = (RECORD_STATUS_PENDING, RECORD_STATUS_IN_PROGRESS)
+
+_ITEM_FIELDS = ('id', 'record_id', 'record_name', 'status', 'attempts', 'max_attempts', 'destination', 'error',
+                'created_at', 'started_at', 'finished_at', 'next_attempt_at')
+
+
+def _format_error(exception) -> str:
+    if isinstance(exception, Exception):
+        return f'{type(exception).__name__}: {exception}'
+    return str(exception)
+
+
+class DownloadQueue:
+    """
+    Persistent queue of record downloads processed by background workers.
+    Records are enqueued from any screen or the API, the download screen only observes their progress,
+    so closing the browser tab doesn't stop downloads. Items left unfinished by the previous WebUI run are resumed.
+    Failed downloads are retried with growing delay up to the configured number of attempts.
+    """
+    __instance = None
+    __lock = threading.Lock()
+
+    def __init__(self):
+        self._pool = SQLitePool(os.path.join(env.database_dir(), _DB_FILE), max_connections=4)
+        # Guards claiming of queued items, workers wait on it for new items.
+        self._condition = threading.Condition()
+        self._lock = threading.Lock()
+        self._stop_events: Dict[int, threading.Event] = {}
+        self._states: Dict[int, dict] = {}
+        self._finished_states = OrderedDict()
+        self._initialize()
+
+        for index in range(max(int(env.download_workers()), 1)):
+            threading.Thread(target=self._worker_loop, name=f'mo-download-{index}', daemon=True).start()
+
+    @staticmethod
+    def instance():
+        if DownloadQueue.__instance is None:
+            with DownloadQueue.__lock:
+                if DownloadQueue.__instance is None:
+                    DownloadQueue.__instance = DownloadQueue()
+        return DownloadQueue.__instance
+
+    def _initialize(self):
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute('''CREATE TABLE IF NOT EXISTS QueueItem
+                                        (id INTEGER PRIMARY KEY,
+                                        record_id INTEGER,
+                                        record_name TEXT,
+                                        status TEXT,
+                                        attempts INTEGER DEFAULT 0,
+                                        max_attempts INTEGER DEFAULT 1,
+                                        destination TEXT,
+                                        error TEXT,
+                                        created_at REAL,
+                                        started_at REAL,
+                                        finished_at REAL,
+                                        next_attempt_at REAL DEFAULT 0)''')
+                connection.execute('CREATE INDEX IF NOT EXISTS QueueItemStatus ON QueueItem(status, next_attempt_at)')
+                # Downloads interrupted by the previous run are started over.
+                connection.execute('UPDATE QueueItem SET status=? WHERE status=?',
+                                   (RECORD_STATUS_PENDING, RECORD_STATUS_IN_PROGRESS))
+                pending = connection.execute('SELECT COUNT(*) FROM QueueItem WHERE status=?',
+                                             (RECORD_STATUS_PENDING,)).fetchone()[0]
+        metrics.DOWNLOAD_QUEUE_DEPTH.inc(pending)
+        if pending:
+            logger.info('Resuming %s queued downloads', pending)
+
+    def enqueue(self, record_ids: List[int]) -> List[int]:
+        """
+        Adds records to the queue. Record that is already queued or downloading is not added again.
+        :param record_ids: ids of records to download.
+        :return: queue item ids in the order of record ids, existing items are returned for already queued records.
+        """
+        max_attempts = max(int(env.download_retries()), 0) + 1
+        item_ids = []
+        added = 0
+        with self._pool.connection() as connection:
+            with connection:
+                for record_id in record_ids:
+                    row = connection.execute('SELECT id FROM QueueItem WHERE record_id=? AND status IN (?, ?)',
+                                             (record_id,) + ACTIVE_STATUSES).fetchone()
+                    if row is not None:
+                        item_ids.append(row[0])
+                        continue
+
+                    record = env.storage.get_record_by_id(record_id)
+                    cursor = connection.execute('INSERT INTO QueueItem(record_id, record_name, status, max_attempts, '
+                                                'created_at) VALUES (?, ?, ?, ?, ?)',
+                                                (record_id, record.name if record is not None else None,
+                                                 RECORD_STATUS_PENDING, max_attempts, time.time()))
+                    item_ids.append(cursor.lastrowid)
+                    added += 1
+                connection.execute('DELETE FROM QueueItem WHERE status NOT IN (?, ?) AND id <= '
+                                   '(SELECT MAX(id) FROM QueueItem) - ?', ACTIVE_STATUSES + (_HISTORY_LIMIT,))
+
+        metrics.DOWNLOAD_QUEUE_DEPTH.inc(added)
+        logger.info('%s downloads queued', added)
+        with self._condition:
+            self._condition.notify_all()
+        return item_ids
+
+    def cancel(self, item_ids: List[int]) -> int:
+        """
+        Cancels queued items and stops running ones.
+        :param item_ids: queue item ids.
+        :return: number of cancelled items.
+        """
+        cancelled = 0
+        with self._condition:
+            with self._pool.connection() as connection:
+                with connection:
+                    for item_id in item_ids:
+                        cancelled += connection.execute('UPDATE QueueItem SET status=?, finished_at=? '
+                                                        'WHERE id=? AND status=?',
+                                                        (RECORD_STATUS_CANCELLED, time.time(), item_id,
+                                                         RECORD_STATUS_PENDING)).rowcount
+        metrics.DOWNLOAD_QUEUE_DEPTH.dec(cancelled)
+
+        with self._lock:
+            for item_id in item_ids:
+                stop_event = self._stop_events.get(item_id)
+                if stop_event is not None:
+                    stop_event.set()
+                    cancelled += 1
+        return cancelled
+
+    def retry(self, item_ids: List[int]) -> int:
+        """
+        Queues failed and cancelled items again with a fresh number of attempts.
+        :param item_ids: queue item ids.
+        :return: number of queued items.
+        """
+        queued = 0
+        with self._pool.connection() as connection:
+            with connection:
+                for item_id in item_ids:
+                    queued += connection.execute('UPDATE QueueItem SET status=?, attempts=0, error=NULL, '
+                                                 'finished_at=NULL, next_attempt_at=0 WHERE id=? AND status IN (?, ?)',
+                                                 (RECORD_STATUS_PENDING, item_id, RECORD_STATUS_ERROR,
+                                                  RECORD_STATUS_CANCELLED)).rowcount
+        metrics.DOWNLOAD_QUEUE_DEPTH.inc(queued)
+        with self._lock:
+            for item_id in item_ids:
+                self._finished_states.pop(item_id, None)
+        with self._condition:
+            self._condition.notify_all()
+        return queued
+
+    def get_items(self, item_ids: List[int]) -> List[dict]:
+        """
+        :param item_ids: queue item ids.
+        :return: queue items, unknown ids are skipped.
+        """
+        if not item_ids:
+            return []
+        with self._pool.connection() as connection:
+            rows = connection.execute(f'SELECT {", ".join(_ITEM_FIELDS)} FROM QueueItem '
+                                      f'WHERE id IN ({", ".join("?" * len(item_ids))})', tuple(item_ids)).fetchall()
+        return [dict(zip(_ITEM_FIELDS, row)) for row in rows]
+
+    def list_items(self, limit: int = 100) -> List[dict]:
+        """
+        :param limit: maximum number of finished items.
+        :return: active items followed by latest finished ones, newest first.
+        """
+        with self._pool.connection() as connection:
+            rows = connection.execute(f'SELECT {", ".join(_ITEM_FIELDS)} FROM QueueItem WHERE status IN (?, ?) '
+                                      f'ORDER BY id DESC', ACTIVE_STATUSES).fetchall()
+            rows += connection.execute(f'SELECT {", ".join(_ITEM_FIELDS)} FROM QueueItem WHERE status NOT IN (?, ?) '
+                                       f'ORDER BY id DESC LIMIT ?', ACTIVE_STATUSES + (limit,)).fetchall()
+        return [dict(zip(_ITEM_FIELDS, row)) for row in rows]
+
+    def active_item_ids(self, record_ids: List[int]) -> List[int]:
+        """
+        :param record_ids: record ids.
+        :return: ids of queued and running items of the records.
+        """
+        if not record_ids:
+            return []
+        with self._pool.connection() as connection:
+            rows = connection.execute(f'SELECT id FROM QueueItem WHERE status IN (?, ?) '
+                                      f'AND record_id IN ({", ".join("?" * len(record_ids))}) ORDER BY id',
+                                      ACTIVE_STATUSES + tuple(record_ids)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_states(self, item_ids: List[int]) -> Dict[int, dict]:
+        """
+        :param item_ids: queue item ids.
+        :return: record download states by item id in the DownloadManager format: status, filename, destination,
+        progress of the running download or the final state of the finished one. Unknown ids are skipped.
+        """
+        states = {}
+        with self._lock:
+            for item_id in item_ids:
+                state = self._states.get(item_id) or self._finished_states.get(item_id)
+                if state is not None:
+                    states[item_id] = dict(state)
+
+        # Queued items and items finished by the previous run are read from the table.
+        for item in self.get_items([item_id for item_id in item_ids if item_id not in states]):
+            state = {'status': item['status']}
+            if item['destination']:
+                state['destination'] = item['destination']
+            if item['error'] and item['status'] == RECORD_STATUS_ERROR:
+                state['exception'] = item['error']
+            states[item['id']] = state
+        return states
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                item = self._claim_next()
+                if item is None:
+                    self._condition.wait(self._seconds_to_next_attempt())
+                    continue
+            try:
+                self._process(item)
+            except Exception as ex:
+                logger.exception(ex)
+
+    def _claim_next(self) -> Optional[dict]:
+        with self._pool.connection() as connection:
+            with connection:
+                row = connection.execute(f'SELECT {", ".join(_ITEM_FIELDS)} FROM QueueItem '
+                                         f'WHERE status=? AND next_attempt_at <= ? ORDER BY id LIMIT 1',
+                                         (RECORD_STATUS_PENDING, time.time())).fetchone()
+                if row is None:
+                    return None
+                item = dict(zip(_ITEM_FIELDS, row))
+                connection.execute('UPDATE QueueItem SET status=?, started_at=? WHERE id=?',
+                                   (RECORD_STATUS_IN_PROGRESS, time.time(), item['id']))
+
+        with self._lock:
+            self._stop_events[item['id']] = threading.Event()
+            self._states[item['id']] = {'status': RECORD_STATUS_IN_PROGRESS}
+        return item
+
+    def _seconds_to_next_attempt(self) -> Optional[float]:
+        with self._pool.connection() as connection:
+            row = connection.execute('SELECT MIN(next_attempt_at) FROM QueueItem WHERE status=?',
+                                     (RECORD_STATUS_PENDING,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return max(row[0] - time.time(), 0)
+
+    def _process(self, item: dict):
+        item_id = item['id']
+        with self._lock:
+            stop_event = self._stop_events[item_id]
+
+        def on_update(upd: dict):
+            with self._lock:
+                self._states[item_id].update(upd)
+
+        state = {}
+        try:
+            record = env.storage.get_record_by_id(item['record_id'])
+            if record is None:
+                state = {'status': RECORD_STATUS_ERROR, 'exception': f'Record not found: {item["record_id"]}'}
+            else:
+                state = DownloadManager.download_record(record, stop_event, on_update)
+        except Exception as ex:
+            logger.exception(ex)
+            state = {'status': RECORD_STATUS_ERROR, 'exception': ex}
+        finally:
+            self._finish(item, stop_event, state)
+
+    def _finish(self, item: dict, stop_event: threading.Event, state: dict):
+        item_id = item['id']
+        attempts = item['attempts'] + 1
+        status = state.get('status')
+        if stop_event.is_set() or status in ACTIVE_STATUSES:
+            status = RECORD_STATUS_CANCELLED
+        error = _format_error(state['exception']) if state.get('exception') is not None else None
+
+        now = time.time()
+        is_retried = status == RECORD_STATUS_ERROR and attempts < item['max_attempts']
+        with self._pool.connection() as connection:
+            with connection:
+                if is_retried:
+                    delay = min(_RETRY_DELAY * 2 ** (attempts - 1), _MAX_RETRY_DELAY)
+                    connection.execute('UPDATE QueueItem SET status=?, attempts=?, error=?, next_attempt_at=? '
+                                       'WHERE id=?', (RECORD_STATUS_PENDING, attempts, error, now + delay, item_id))
+                    logger.info('Download of record %s failed, retrying in %s seconds: %s', item['record_id'],
+                                delay, error)
+                else:
+                    connection.execute('UPDATE QueueItem SET status=?, attempts=?, destination=?, error=?, '
+                                       'finished_at=? WHERE id=?',
+                                       (status, attempts, state.get('destination'), error, now, item_id))
+
+        with self._lock:
+            del self._stop_events[item_id]
+            del self._states[item_id]
+            if not is_retried:
+                state = dict(state)
+                state['status'] = status
+                self._finished_states[item_id] = state
+                while len(self._finished_states) > _FINISHED_STATES_LIMIT:
+                    self._finished_states.popitem(last=False)
+
+        if not is_retried:
+            metrics.DOWNLOAD_QUEUE_DEPTH.dec()
+        with self._condition:
+            # Wakes workers to recalculate the time of the next retry.
+            self._condition.notify_all()
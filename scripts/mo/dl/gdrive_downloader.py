@@ -33,8 +33,8 @@ import six
 
 import requests
 import tqdm
-from bs4 import BeautifulSoup
 
+from scripts.mo.dl.bandwidth import BandwidthShaper
 from scripts.mo.dl.downloader import Downloader
 from scripts.mo.environment import logger
 
@@ -297,6 +297,8 @@ def _download(
             total = int(total)
 
         pbar = tqdm.tqdm(total=total, unit="iB", unit_scale=True, desc=description)
+        throttle = BandwidthShaper.instance().throttle(stop_event)
+        throttle_step, throttle_pending = throttle.consume(0), 0
 
         if stop_event.is_set():
             return
@@ -307,6 +309,10 @@ def _download(
             if stop_event.is_set():
                 return
 
+            throttle_pending += len(chunk)
+            if throttle_pending >= throttle_step:
+                throttle_step, throttle_pending = throttle.consume(throttle_pending), 0
+
             pbar.update(len(chunk))
             format_dict = pbar.format_dict
             yield {
@@ -361,6 +367,7 @@ class GDriveDownloader(Downloader):
                 return filename_from_url.replace(os.path.sep, "_")
 
             if res.headers["Content-Type"].startswith("text/html"):
+                from bs4 import BeautifulSoup
                 soup = BeautifulSoup(res.text, 'html.parser')
                 filename = soup.find('span', {'class': 'uc-name-size'}).find('a').text
                 match = re.search(r'\b\w+\.\w+\b', filename)
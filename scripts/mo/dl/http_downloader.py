@@ -5,10 +5,11 @@ import requests
 from requests.exceptions import ConnectTimeout, HTTPError, ConnectionError
 from tqdm import tqdm
 
+from scripts.mo.dl.bandwidth import BandwidthShaper
 from scripts.mo.dl.downloader import Downloader
 from scripts.mo.environment import env
 
-def _civitai_api_url(url: str, api_key: str = None) -> str:
+def civitai_api_url(url: str, api_key: str = None) -> str:
     parsed_url = urlparse(url)
     if api_key and parsed_url.hostname == 'civitai.com':
         url = url + '&token=' + api_key if "?" in url else url + '?token=' + api_key
@@ -21,7 +22,7 @@ class HttpDownloader(Downloader):
         return parsed_url.scheme in ['http', 'https'] and parsed_url.hostname not in ['drive.google.com', 'mega.nz']
 
     def check_url_available(self, url: str):
-        url = _civitai_api_url(url, env.api_key())
+        url = civitai_api_url(url, env.api_key())
         try:
             response = requests.get(url, stream=True, timeout=10)
             response.raise_for_status()
@@ -78,6 +79,8 @@ class HttpDownloader(Downloader):
             return
 
         progress_bar = tqdm(total=total_size, unit='iB', unit_scale=True, desc=description)
+        throttle = BandwidthShaper.instance().throttle(stop_event)
+        throttle_step, throttle_pending = throttle.consume(0), 0
 
         with open(destination_file, 'wb') as file:
 
@@ -92,6 +95,9 @@ class HttpDownloader(Downloader):
                     return
 
                 file.write(data)
+                throttle_pending += len(data)
+                if throttle_pending >= throttle_step:
+                    throttle_step, throttle_pending = throttle.consume(throttle_pending), 0
                 progress_bar.update(len(data))
                 format_dict = progress_bar.format_dict
 
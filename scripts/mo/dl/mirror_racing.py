@@ -0,0 +1,259 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from scripts.mo.dl.bandwidth import BandwidthShaper, Throttle
+from scripts.mo.dl.download_history import DownloadHistory
+from scripts.mo.dl.downloader import Downloader
+from scripts.mo.dl.http_downloader import HttpDownloader, civitai_api_url
+from scripts.mo.dl.peer_downloader import is_sha256
+from scripts.mo.environment import env, logger
+
+_PROBE_TIMEOUT = 10
+_PROBE_BYTES = 4 * 1024 * 1024
+_PROBE_SECONDS = 3
+_PROBE_CHUNK_SIZE = 64 * 1024
+
+_REQUEST_TIMEOUT = 30
+_CHUNK_SIZE = 1024 * 1024
+_PROGRESS_INTERVAL = 0.5
+
+# Splitting pays off for large files only, and only when the slower mirror adds a noticeable share.
+_SPLIT_MIN_SIZE = 64 * 1024 * 1024
+_SPLIT_MIN_SPEED_RATIO = 0.2
+_SPLIT_ALIGNMENT = 1024 * 1024
+
+
+class MirrorProbe:
+    """
+    Result of reading the beginning of the file from a mirror.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        # URL after redirects, ranges are requested from it directly.
+        self.final_url = url
+        self.host = urlparse(url).hostname or ''
+        self.ttfb = None
+        self.speed = None
+        self.size = None
+        self.accepts_ranges = False
+        self.error = None
+        # Throughput measured on previous downloads from the host.
+        self.known_speed = None
+
+    def estimated_speed(self) -> Optional[float]:
+        """
+        :return: early throughput averaged with the throughput measured on previous downloads from the host.
+        """
+        speeds = [speed for speed in (self.speed, self.known_speed) if speed]
+        return sum(speeds) / len(speeds) if speeds else None
+
+    def estimated_time(self) -> float:
+        speed = self.estimated_speed()
+        if self.size and speed:
+            return self.ttfb + self.size / speed
+        return self.ttfb
+
+    def __repr__(self):
+        return f'{self.host}: ttfb={self.ttfb}, speed={self.speed}, size={self.size}, error={self.error}'
+
+
+class MirrorChoice:
+    def __init__(self, url: str, downloader: Downloader, probes: List[MirrorProbe]):
+        self.url = url
+        self.downloader = downloader
+        self.probes = probes
+
+
+def _probe(url: str, stop_event: threading.Event) -> MirrorProbe:
+    probe = MirrorProbe(url)
+    started_at = time.perf_counter()
+    try:
+        with requests.get(civitai_api_url(url, env.api_key()), stream=True, timeout=_PROBE_TIMEOUT) as response:
+            response.raise_for_status()
+            probe.final_url = response.url
+            probe.size = int(response.headers.get('content-length', 0)) or None
+            probe.accepts_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+
+            first_byte_at = None
+            received = 0
+            for data in response.iter_content(_PROBE_CHUNK_SIZE):
+                now = time.perf_counter()
+                if first_byte_at is None:
+                    first_byte_at = now
+                    probe.ttfb = now - started_at
+                else:
+                    # Counted after the first chunk, so the throughput doesn't include the response latency.
+                    received += len(data)
+                if received >= _PROBE_BYTES or now - first_byte_at >= _PROBE_SECONDS or stop_event.is_set():
+                    break
+
+            if first_byte_at is None:
+                probe.ttfb = time.perf_counter() - started_at
+            elif received > 0:
+                probe.speed = received / max(time.perf_counter() - first_byte_at, 1e-6)
+    except requests.RequestException as ex:
+        probe.error = ex
+    probe.known_speed = DownloadHistory.instance().average_speed(probe.host)
+    return probe
+
+
+def _is_split_possible(fastest: MirrorProbe, slowest: MirrorProbe, sha256: str) -> bool:
+    # Same size is not enough to mix parts of two files, the result is verified against the known hash.
+    return (is_sha256(sha256) and fastest.accepts_ranges and slowest.accepts_ranges
+            and fastest.size is not None and fastest.size == slowest.size and fastest.size >= _SPLIT_MIN_SIZE
+            and (slowest.estimated_speed() or 0) >= (fastest.estimated_speed() or 0) * _SPLIT_MIN_SPEED_RATIO)
+
+
+def choose_mirror(urls: List[str], sha256: str, stop_event: threading.Event) -> Optional[MirrorChoice]:
+    """
+    Probes mirrors concurrently and chooses the one with the lowest estimated download time.
+    When two mirrors serve the same file with range requests, the download is split between them.
+    :param urls: URLs of the same file.
+    :param sha256: expected SHA256 hash, required to split the download.
+    :param stop_event: event that interrupts probing.
+    :return: chosen URL and downloader, None if no mirror is available.
+    """
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        probes = list(executor.map(lambda url: _probe(url, stop_event), urls))
+    logger.debug('Mirror probes: %s', probes)
+
+    available = sorted((probe for probe in probes if probe.error is None), key=lambda probe: probe.estimated_time())
+    if not available:
+        return None
+
+    fastest = available[0]
+    if len(available) > 1 and _is_split_possible(fastest, available[1], sha256):
+        logger.info('Splitting download between %s and %s', fastest.host, available[1].host)
+        return MirrorChoice(fastest.url, SplitRangeDownloader(available[:2], sha256), probes)
+
+    logger.info('Downloading from the fastest mirror: %s', fastest.host)
+    return MirrorChoice(fastest.url, HttpDownloader(), probes)
+
+
+class _Segment:
+    def __init__(self, start: int, end: int, source: int):
+        self.start = start
+        self.end = end
+        self.position = start
+        self.source = source
+        self.error = None
+
+    def is_complete(self) -> bool:
+        return self.position > self.end
+
+
+class SplitRangeDownloader(Downloader):
+    """
+    Downloads byte ranges of one file from several mirrors at once, ranges are sized by mirror speed.
+    Range of a failed mirror is finished by another one. Result is verified against the expected hash.
+    """
+
+    def __init__(self, probes: List[MirrorProbe], sha256: str):
+        self._probes = probes
+        self._sha256 = sha256.lower()
+
+    def accepts_url(self, url: str) -> bool:
+        return False
+
+    def fetch_filename(self, url: str):
+        return HttpDownloader().fetch_filename(url)
+
+    def check_url_available(self, url: str):
+        return True, None
+
+    def _segments(self) -> List[_Segment]:
+        size = self._probes[0].size
+        speeds = [probe.estimated_speed() or 1 for probe in self._probes]
+        segments = []
+        start = 0
+        for index, speed in enumerate(speeds):
+            if index == len(speeds) - 1:
+                end = size - 1
+            else:
+                length = int(size * speed / sum(speeds)) // _SPLIT_ALIGNMENT * _SPLIT_ALIGNMENT
+                end = start + max(length, _SPLIT_ALIGNMENT) - 1
+            segments.append(_Segment(start, end, index))
+            start = end + 1
+        return segments
+
+    def _fetch_segment(self, segment: _Segment, destination_file: str, stop_event: threading.Event,
+                       throttle: Throttle):
+        sources = [segment.source] + [index for index in range(len(self._probes)) if index != segment.source]
+        for source in sources:
+            url = self._probes[source].final_url
+            try:
+                headers = {'Range': f'bytes={segment.position}-{segment.end}'}
+                with requests.get(url, headers=headers, stream=True, timeout=_REQUEST_TIMEOUT) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise requests.RequestException(f'Range requests are not supported by {url}')
+                    with open(destination_file, 'r+b') as file:
+                        file.seek(segment.position)
+                        throttle_step, throttle_pending = throttle.consume(0), 0
+                        for data in response.iter_content(_CHUNK_SIZE):
+                            if stop_event.is_set():
+                                return
+                            data = data[:segment.end + 1 - segment.position]
+                            file.write(data)
+                            segment.position += len(data)
+                            throttle_pending += len(data)
+                            if throttle_pending >= throttle_step:
+                                throttle_step, throttle_pending = throttle.consume(throttle_pending), 0
+                            if segment.is_complete():
+                                return
+            except (requests.RequestException, OSError) as ex:
+                logger.warning('Range download from %s interrupted: %s', self._probes[source].host, ex)
+                segment.error = ex
+        if not segment.is_complete() and segment.error is None:
+            segment.error = Exception(f'Range {segment.start}-{segment.end} is incomplete')
+
+    def download(self, url: str, destination_file: str, description: str, stop_event: threading.Event):
+        if stop_event.is_set():
+            return
+
+        size = self._probes[0].size
+        segments = self._segments()
+        yield {'bytes_ready': 0, 'bytes_total': size, 'speed_rate': 0, 'elapsed': 0}
+
+        started_at = time.time()
+        # Both ranges share the limit of one download.
+        throttle = BandwidthShaper.instance().throttle(stop_event)
+        threads = [threading.Thread(target=self._fetch_segment, args=(segment, destination_file, stop_event, throttle),
+                                    daemon=True) for segment in segments]
+        for thread in threads:
+            thread.start()
+
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(_PROGRESS_INTERVAL / len(threads))
+            bytes_ready = sum(segment.position - segment.start for segment in segments)
+            elapsed = time.time() - started_at
+            yield {
+                'bytes_ready': bytes_ready,
+                'bytes_total': size,
+                'speed_rate': bytes_ready / elapsed if elapsed > 0 else 0,
+                'elapsed': elapsed
+            }
+
+        if stop_event.is_set():
+            return
+
+        failed = [segment for segment in segments if not segment.is_complete()]
+        if failed:
+            raise Exception(f'Failed to download from mirrors: {failed[0].error}')
+
+        sha256_hash = hashlib.sha256()
+        with open(destination_file, 'rb') as file:
+            while chunk := file.read(_CHUNK_SIZE):
+                sha256_hash.update(chunk)
+        if sha256_hash.hexdigest() != self._sha256:
+            os.remove(destination_file)
+            raise Exception(f'File downloaded from mirrors has different hash: {sha256_hash.hexdigest()}')
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from scripts.mo.data.hash_index import HashIndex
+from scripts.mo.dl.bandwidth import BandwidthShaper
+from scripts.mo.dl.blob_store import BlobStore, is_sha256
+from scripts.mo.dl.downloader import Downloader
+from scripts.mo.environment import env, logger
+
+PEER_URL_PREFIX = 'mo-peer://'
+
+_BLOB_ENDPOINT = '/mo/blobs/{sha256}'
+_REQUEST_TIMEOUT = 5
+# Peers found by the availability check are reused by the download started right after it.
+_PROBE_TTL_SECONDS = 60
+_CHUNK_SIZE = 1024 * 1024
+
+
+def peer_url(sha256: str) -> str:
+    return PEER_URL_PREFIX + sha256.lower()
+
+
+def find_blob_file(sha256: str) -> Optional[str]:
+    """
+    Looks up local file with the given hash in the blob store, shared cache and hash index.
+    :param sha256: SHA256 hex digest.
+    :return: file path or None.
+    """
+    stores = [BlobStore.instance() if env.blob_store_enabled() else None, BlobStore.shared_cache()]
+    for store in stores:
+        if store is not None and store.has_blob(sha256):
+            return store.blob_path(sha256)
+    return HashIndex.instance().find_path(sha256)
+
+
+def get_peers() -> List[str]:
+    return [peer.strip().rstrip('/') for peer in env.peers().split(',') if peer.strip()]
+
+
+class PeerDownloader(Downloader):
+    """
+    Downloads model files by SHA256 from other Model Organizer instances listed in settings.
+    Handles "mo-peer://<sha256>" URLs, a transfer interrupted by one peer is resumed from another one.
+    """
+
+    def __init__(self):
+        self._probed_peers: Dict[str, Tuple[float, List[str]]] = {}
+
+    def accepts_url(self, url: str) -> bool:
+        return url.startswith(PEER_URL_PREFIX)
+
+    def fetch_filename(self, url: str):
+        return None
+
+    def check_url_available(self, url: str):
+        sha256 = url[len(PEER_URL_PREFIX):]
+        peers = self._find_peers(sha256)
+        self._probed_peers[sha256] = (time.monotonic(), peers)
+        if peers:
+            return True, None
+        return False, 'File not found on peers'
+
+    def _take_probed_peers(self, sha256: str) -> List[str]:
+        probed_at, peers = self._probed_peers.pop(sha256, (None, None))
+        if peers and time.monotonic() - probed_at < _PROBE_TTL_SECONDS:
+            return peers
+        return self._find_peers(sha256)
+
+    def _find_peers(self, sha256: str) -> List[str]:
+        peers = []
+        for peer in get_peers():
+            try:
+                response = requests.head(peer + _BLOB_ENDPOINT.format(sha256=sha256), timeout=_REQUEST_TIMEOUT)
+                if response.status_code == 200:
+                    peers.append(peer)
+            except requests.RequestException as ex:
+                logger.debug('Peer %s is not available: %s', peer, ex)
+        return peers
+
+    def download(self, url: str, destination_file: str, description: str, stop_event: threading.Event):
+        if stop_event.is_set():
+            return
+
+        sha256 = url[len(PEER_URL_PREFIX):]
+        yield {'bytes_ready': 'None', 'bytes_total': 'None', 'speed_rate': 'None', 'elapsed': 'None'}
+
+        sha256_hash = hashlib.sha256()
+        bytes_ready = 0
+        bytes_total = 0
+        started_at = time.time()
+        throttle = BandwidthShaper.instance().throttle(stop_event)
+        throttle_step, throttle_pending = throttle.consume(0), 0
+
+        peers = self._take_probed_peers(sha256)
+        if not peers:
+            raise Exception(f'File {sha256} not found on peers')
+
+        with open(destination_file, 'wb') as file:
+            for peer in peers:
+                headers = {'Range': f'bytes={bytes_ready}-'} if bytes_ready else {}
+                try:
+                    with requests.get(peer + _BLOB_ENDPOINT.format(sha256=sha256), headers=headers, stream=True,
+                                      timeout=_REQUEST_TIMEOUT) as response:
+                        response.raise_for_status()
+                        if bytes_ready and response.status_code != 206:
+                            logger.warning('Peer %s does not support resume', peer)
+                            continue
+                        bytes_total = bytes_ready + int(response.headers.get('content-length', 0))
+
+                        for data in response.iter_content(_CHUNK_SIZE):
+                            if stop_event.is_set():
+                                return
+                            file.write(data)
+                            sha256_hash.update(data)
+                            bytes_ready += len(data)
+                            throttle_pending += len(data)
+                            if throttle_pending >= throttle_step:
+                                throttle_step, throttle_pending = throttle.consume(throttle_pending), 0
+                            elapsed = time.time() - started_at
+                            yield {
+                                'bytes_ready': bytes_ready,
+                                'bytes_total': bytes_total,
+                                'speed_rate': bytes_ready / elapsed if elapsed > 0 else 0,
+                                'elapsed': elapsed
+                            }
+                except requests.RequestException as ex:
+                    logger.warning('Download from peer %s interrupted: %s', peer, ex)
+                    continue
+
+                if bytes_ready == bytes_total:
+                    break
+
+        if bytes_ready == 0 or bytes_ready != bytes_total:
+            raise Exception(f'Failed to download {sha256} from peers')
+        if sha256_hash.hexdigest() != sha256.lower():
+            os.remove(destination_file)
+            raise Exception(f'File downloaded from peers has different hash: {sha256_hash.hexdigest()}')
@@ -1,7 +1,7 @@
 import hashlib
 import logging
 import os.path
-from typing import Callable
+from typing import Callable, Optional
 
 from scripts.mo.data.storage import Storage
 from scripts.mo.models import ModelType
@@ -72,12 +72,29 @@ class Environment:
     lycoris_path: Callable[[], str]
     embeddings_path: Callable[[], str]
     script_dir: str
+    database_dir: Callable[[], str]
     layout: Callable[[], str]
     card_width: Callable[[], str]
     card_height: Callable[[], str]
     is_debug_mode_enabled: Callable[[], bool]
     api_key: Callable[[], str]
     check_duplicates: Callable[[], bool]
+    blob_store_enabled: Callable[[], bool]
+    blob_store_path: Callable[[], str]
+    shared_cache_path: Callable[[], str]
+    serve_blobs: Callable[[], bool]
+    api_control: Callable[[], bool]
+    peers: Callable[[], str]
+    mirror_racing: Callable[[], bool]
+    download_workers: Callable[[], int]
+    download_retries: Callable[[], int]
+    download_limit: Callable[[], int]
+    download_file_limit: Callable[[], int]
+    download_limit_schedule: Callable[[], str]
+
+    # WebUI adapters, the rest of the package does not import WebUI modules.
+    lora_alias: Callable[[str], Optional[str]]
+    embedding_name: Callable[[str], Optional[str]]
 
     def is_storage_initialized(self) -> bool:
         return hasattr(self, 'storage')
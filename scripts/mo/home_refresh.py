@@ -0,0 +1,131 @@
+import itertools
+import threading
+from typing import Callable, Dict, List, Tuple
+
+import scripts.mo.tracing as tracing
+from scripts.mo.environment import logger
+
+_SUPERSEDED_CHECK_SECONDS = 0.1
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class RefreshCoordinator:
+    """
+    Coordinates home screen refreshes. A render superseded by a newer request of the same session is cancelled between
+    stages. Concurrent requests for the same state share one render. Search input is debounced by the client.
+    """
+    __instance = None
+    __lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Generations are unique across sessions, so a session entry can be removed once its last request is done.
+        self._generation_counter = itertools.count(1)
+        self._generations: Dict[str, int] = {}
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._last_timings: Dict[str, float] = {}
+
+    @staticmethod
+    def instance():
+        if RefreshCoordinator.__instance is None:
+            with RefreshCoordinator.__lock:
+                if RefreshCoordinator.__instance is None:
+                    RefreshCoordinator.__instance = RefreshCoordinator()
+        return RefreshCoordinator.__instance
+
+    def last_timings(self) -> Dict[str, float]:
+        """
+        :return: duration of each stage of the last completed render in milliseconds.
+        """
+        return dict(self._last_timings)
+
+    def refresh(self, session: str, key: str, stages: List[Tuple[str, Callable]]):
+        """
+        Runs refresh stages unless the request is superseded by a newer one from the same session.
+        :param session: client session id.
+        :param key: requested state, concurrent requests with the same key share the result.
+        :param stages: list of (name, function) pairs, each function receives the previous stage result.
+        :return: result of the last stage or None if the request was superseded.
+        """
+        with self._lock:
+            generation = next(self._generation_counter)
+            self._generations[session] = generation
+            flight = self._in_flight.get(key)
+            is_owner = flight is None
+            if is_owner:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+            else:
+                flight.waiters += 1
+
+        try:
+            if not is_owner:
+                logger.debug('Home refresh joined in-flight render')
+                return self._wait(session, generation, flight)
+
+            try:
+                flight.result = self._run_stages(session, generation, key, flight, stages)
+            except _Cancelled:
+                logger.debug('Home refresh cancelled, superseded during render')
+                return None
+            except Exception as ex:
+                flight.error = ex
+                raise
+            finally:
+                with self._lock:
+                    if self._in_flight.get(key) is flight:
+                        del self._in_flight[key]
+                flight.done.set()
+
+            return None if self._is_superseded(session, generation) else flight.result
+        finally:
+            with self._lock:
+                if not self._is_superseded(session, generation):
+                    del self._generations[session]
+
+    def _wait(self, session: str, generation: int, flight: _InFlight):
+        try:
+            while not flight.done.wait(_SUPERSEDED_CHECK_SECONDS):
+                # The render is not needed anymore if all of its waiters are superseded.
+                if self._is_superseded(session, generation):
+                    return None
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+
+        if flight.error is not None:
+            raise flight.error
+        return None if self._is_superseded(session, generation) else flight.result
+
+    def _is_superseded(self, session: str, generation: int) -> bool:
+        return self._generations.get(session) != generation
+
+    def _run_stages(self, session: str, generation: int, key: str, flight: _InFlight, stages):
+        timings = {}
+        result = None
+        for name, stage in stages:
+            with self._lock:
+                # Keep rendering while other requests wait for the result.
+                if self._is_superseded(session, generation) and flight.waiters == 0:
+                    del self._in_flight[key]
+                    raise _Cancelled()
+
+            with tracing.span(f'home.{name}') as span:
+                result = stage(result)
+            timings[name] = span.duration_ms
+
+        self._last_timings = timings
+        logger.debug('Home refresh timings: %s',
+                     ', '.join(f'{name}={duration:.1f}ms' for name, duration in timings.items()))
+        return result
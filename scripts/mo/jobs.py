@@ -0,0 +1,246 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from scripts.mo.data.sqlite_pool import SQLitePool
+from scripts.mo.environment import env, logger
+
+_DB_FILE = 'jobs.sqlite'
+_MAX_WORKERS = 2
+_HISTORY_LIMIT = 200
+_PROGRESS_SAVE_INTERVAL = 1
+
+JOB_QUEUED = 'Queued'
+JOB_RUNNING = 'Running'
+JOB_COMPLETED = 'Completed'
+JOB_CANCELLED = 'Cancelled'
+JOB_FAILED = 'Failed'
+JOB_INTERRUPTED = 'Interrupted'
+
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED, JOB_INTERRUPTED)
+
+_JOB_FIELDS = ('id', 'kind', 'title', 'status', 'processed', 'total', 'message', 'result', 'error', 'created_at',
+               'started_at', 'finished_at')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """
+    Handle passed to a job function to report progress and check for cancellation.
+    """
+
+    def __init__(self, manager, job_id: str):
+        self._manager = manager
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def progress(self, processed: int, total: int = None, message: str = None):
+        self._manager._update_progress(self.job_id, processed, total, message)
+
+
+def _map_row_to_job(row) -> dict:
+    job = dict(zip(_JOB_FIELDS, row))
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+class JobManager:
+    """
+    Runs long maintenance operations on background daemon workers, so Gradio handlers return right away.
+    Jobs are persisted in a SQLite table, their status and results outlive the browser tab.
+    Jobs left unfinished by the previous WebUI run are marked as interrupted.
+    """
+    __instance = None
+    __lock = threading.Lock()
+
+    def __init__(self):
+        self._pool = SQLitePool(os.path.join(env.database_dir(), _DB_FILE), max_connections=4)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._contexts: Dict[str, JobContext] = {}
+        self._live: Dict[str, dict] = {}
+        self._saved_at: Dict[str, float] = {}
+        self._initialize()
+
+        for index in range(_MAX_WORKERS):
+            threading.Thread(target=self._worker_loop, name=f'mo-job-{index}', daemon=True).start()
+
+    @staticmethod
+    def instance():
+        if JobManager.__instance is None:
+            with JobManager.__lock:
+                if JobManager.__instance is None:
+                    JobManager.__instance = JobManager()
+        return JobManager.__instance
+
+    def _initialize(self):
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute('''CREATE TABLE IF NOT EXISTS Job
+                                        (id TEXT PRIMARY KEY,
+                                        kind TEXT,
+                                        title TEXT,
+                                        status TEXT,
+                                        processed INTEGER DEFAULT 0,
+                                        total INTEGER,
+                                        message TEXT DEFAULT '',
+                                        result TEXT,
+                                        error TEXT,
+                                        created_at REAL,
+                                        started_at REAL,
+                                        finished_at REAL)''')
+                connection.execute('UPDATE Job SET status=?, finished_at=? WHERE status IN (?, ?)',
+                                   (JOB_INTERRUPTED, time.time(), JOB_QUEUED, JOB_RUNNING))
+
+    def submit(self, kind: str, title: str, fn: Callable, *args) -> str:
+        """
+        Queues job execution.
+        :param kind: job type identifier.
+        :param title: human-readable job description.
+        :param fn: job function, receives JobContext followed by args. Returned value is stored as JSON result.
+        :param args: job function arguments.
+        :return: job id.
+        """
+        job = {field: None for field in _JOB_FIELDS}
+        job.update(id=uuid.uuid4().hex, kind=kind, title=title, status=JOB_QUEUED, processed=0, message='',
+                   created_at=time.time())
+        context = JobContext(self, job['id'])
+
+        with self._lock:
+            self._contexts[job['id']] = context
+            self._live[job['id']] = job
+        self._save(job)
+        self._prune_history()
+
+        self._queue.put((context, fn, args))
+        logger.info('Job "%s" queued: %s', title, job['id'])
+        return job['id']
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._live.get(job_id)
+            if job is not None:
+                return dict(job)
+
+        with self._pool.connection() as connection:
+            row = connection.execute(f'SELECT {", ".join(_JOB_FIELDS)} FROM Job WHERE id=?', (job_id,)).fetchone()
+        return _map_row_to_job(row) if row is not None else None
+
+    def list_jobs(self, limit: int = 50) -> List[dict]:
+        with self._pool.connection() as connection:
+            rows = connection.execute(f'SELECT {", ".join(_JOB_FIELDS)} FROM Job ORDER BY created_at DESC LIMIT ?',
+                                      (limit,)).fetchall()
+        jobs = [_map_row_to_job(row) for row in rows]
+        with self._lock:
+            return [dict(self._live[job['id']]) if job['id'] in self._live else job for job in jobs]
+
+    def find_active_job(self, kind: str) -> Optional[dict]:
+        with self._lock:
+            for job in self._live.values():
+                if job['kind'] == kind:
+                    return dict(job)
+        return None
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            context = self._contexts.get(job_id)
+        if context is None:
+            return False
+        context.cancel_event.set()
+        return True
+
+    def _worker_loop(self):
+        while True:
+            context, fn, args = self._queue.get()
+            try:
+                self._run(context, fn, args)
+            except Exception as ex:
+                # The worker must survive, otherwise queued jobs are never started.
+                logger.exception('Job %s failed to finish: %s', context.job_id, ex)
+
+    def _run(self, context: JobContext, fn: Callable, args):
+        job_id = context.job_id
+        try:
+            self._transition(job_id, status=JOB_RUNNING, started_at=time.time())
+            context.check_cancelled()
+            result = fn(context, *args)
+            try:
+                json.dumps(result)
+            except (TypeError, ValueError) as ex:
+                raise ValueError(f'Job result is not JSON serializable: {ex}')
+            fields = {'status': JOB_CANCELLED if context.is_cancelled() else JOB_COMPLETED, 'result': result}
+        except JobCancelled:
+            fields = {'status': JOB_CANCELLED}
+        except Exception as ex:
+            logger.exception(ex)
+            fields = {'status': JOB_FAILED, 'error': str(ex)}
+        self._transition(job_id, **fields)
+
+    def _transition(self, job_id: str, **fields):
+        with self._lock:
+            job = self._live.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            is_finished = job['status'] in FINISHED_STATUSES
+            if is_finished:
+                job['finished_at'] = time.time()
+            job = dict(job)
+
+        try:
+            # Saved before leaving the live jobs, so readers never see a stale row of a finished job.
+            self._save(job)
+        finally:
+            if is_finished:
+                with self._lock:
+                    self._live.pop(job_id, None)
+                    self._contexts.pop(job_id, None)
+                    self._saved_at.pop(job_id, None)
+        logger.debug('Job %s: %s', job_id, job['status'])
+
+    def _update_progress(self, job_id: str, processed: int, total: int = None, message: str = None):
+        with self._lock:
+            job = self._live.get(job_id)
+            if job is None:
+                return
+            job['processed'] = processed
+            if total is not None:
+                job['total'] = total
+            if message is not None:
+                job['message'] = message
+
+            # Live progress is served from memory, the table is updated periodically.
+            now = time.time()
+            if now - self._saved_at.get(job_id, 0) < _PROGRESS_SAVE_INTERVAL:
+                return
+            self._saved_at[job_id] = now
+            job = dict(job)
+        self._save(job)
+
+    def _save(self, job: dict):
+        result = json.dumps(job['result']) if job['result'] is not None else None
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute(f'INSERT OR REPLACE INTO Job({", ".join(_JOB_FIELDS)}) '
+                                   f'VALUES ({", ".join("?" * len(_JOB_FIELDS))})',
+                                   tuple(result if field == 'result' else job[field] for field in _JOB_FIELDS))
+
+    def _prune_history(self):
+        with self._pool.connection() as connection:
+            with connection:
+                connection.execute('DELETE FROM Job WHERE id NOT IN '
+                                   '(SELECT id FROM Job ORDER BY created_at DESC LIMIT ?)', (_HISTORY_LIMIT,))
@@ -0,0 +1,168 @@
+import bisect
+import functools
+import threading
+import time
+from typing import Dict, List, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple, values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labels: Tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}' for key, value in values]
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, value: float = 1, **labels):
+        self.inc(-value, **labels)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple = (), buckets: Tuple = _LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per labels: non-cumulative bucket counts (the last one is +Inf), sum and count.
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = data
+            data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    def time(self, **labels):
+        """
+        Decorator that observes duration of every function call in seconds.
+        """
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+
+            return wrapper
+
+        return decorator
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, ([*data[0]], data[1], data[2])) for key, data in self._values.items())
+        lines = []
+        for key, (bucket_counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+            labels = _format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+_registry: List[_Metric] = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """
+    :return: all metrics in Prometheus text exposition format.
+    """
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+DOWNLOADS = _register(Counter(
+    'mo_downloads_total', 'Finished record downloads by status.', ('status',)))
+DOWNLOAD_BYTES = _register(Counter(
+    'mo_download_bytes_total', 'Bytes transferred by host, including interrupted downloads.', ('host',)))
+DOWNLOAD_FAILURES = _register(Counter(
+    'mo_download_failures_total', 'Failed record downloads by exception type.', ('exception',)))
+DOWNLOAD_DURATION = _register(Histogram(
+    'mo_download_duration_seconds', 'Model file transfer duration by host.', ('host',), _DURATION_BUCKETS))
+DOWNLOAD_QUEUE_DEPTH = _register(Gauge(
+    'mo_download_queue_depth', 'Records waiting for download or being downloaded.'))
+SCAN_DURATION = _register(Histogram(
+    'mo_scan_duration_seconds', 'Model directory scan duration.'))
+SCANNED_FILES = _register(Counter(
+    'mo_scanned_files_total', 'Model files found by directory scans.'))
+STORAGE_QUERY_DURATION = _register(Histogram(
+    'mo_storage_query_duration_seconds', 'Storage operation latency by operation.', ('operation',)))
+
+DOWNLOAD_QUEUE_DEPTH.set(0)
@@ -1,5 +1,6 @@
 import os.path
 from enum import Enum
+from typing import Callable
 
 
 class ModelType(Enum):
@@ -33,7 +34,27 @@ class ModelSort(Enum):
         raise ValueError(f'There is no model sort defined with name "{value}"')
 
 
+class _NotLoaded:
+    """
+    Marker of a heavy record field that is loaded on first access. Stays a singleton on copy and pickle.
+    """
+
+    def __reduce__(self):
+        return 'NOT_LOADED'
+
+    def __repr__(self):
+        return 'NOT_LOADED'
+
+
+NOT_LOADED = _NotLoaded()
+
+
 class Record:
+    __slots__ = ('id_', 'name', 'model_type', 'url', 'download_url', 'backup_url', 'download_path',
+                 'download_filename', 'preview_url', '_description', '_positive_prompts', '_negative_prompts',
+                 'sha256_hash', 'md5_hash', 'location', 'created_at', 'updated_at', 'groups', 'subdir', 'weight',
+                 '_heavy_fields_loader')
+
     def __init__(self, id_,
                  name: str,
                  model_type: ModelType,
@@ -52,7 +73,9 @@ class Record:
                  created_at: float = 0,
                  groups=None,
                  subdir: str = '',
-                 weight: float = 1):
+                 weight: float = 1,
+                 updated_at: float = 0,
+                 heavy_fields_loader: Callable = None):
         if groups is None:
             groups = []
 
@@ -65,9 +88,9 @@ class Record:
         self.download_path = download_path
         self.download_filename = download_filename
         self.preview_url = preview_url
-        self.description = description
-        self.positive_prompts = positive_prompts
-        self.negative_prompts = negative_prompts
+        self._description = description
+        self._positive_prompts = positive_prompts
+        self._negative_prompts = negative_prompts
         self.sha256_hash = sha256_hash
         self.md5_hash = md5_hash
         self.location = location
@@ -75,6 +98,53 @@ class Record:
         self.groups = groups
         self.subdir = subdir
         self.weight = weight
+        self.updated_at = updated_at
+        self._heavy_fields_loader = heavy_fields_loader
+
+    def _load_heavy_fields(self):
+        """
+        Loads description and prompts skipped by the list view storage projection.
+        Loader returns (description, positive_prompts, negative_prompts) tuple for the record id.
+        """
+        loader = self._heavy_fields_loader
+        self._heavy_fields_loader = None
+        description, positive_prompts, negative_prompts = loader(self.id_) if loader is not None else ('', '', '')
+        if self._description is NOT_LOADED:
+            self._description = description
+        if self._positive_prompts is NOT_LOADED:
+            self._positive_prompts = positive_prompts
+        if self._negative_prompts is NOT_LOADED:
+            self._negative_prompts = negative_prompts
+
+    @property
+    def description(self) -> str:
+        if self._description is NOT_LOADED:
+            self._load_heavy_fields()
+        return self._description
+
+    @description.setter
+    def description(self, value: str):
+        self._description = value
+
+    @property
+    def positive_prompts(self) -> str:
+        if self._positive_prompts is NOT_LOADED:
+            self._load_heavy_fields()
+        return self._positive_prompts
+
+    @positive_prompts.setter
+    def positive_prompts(self, value: str):
+        self._positive_prompts = value
+
+    @property
+    def negative_prompts(self) -> str:
+        if self._negative_prompts is NOT_LOADED:
+            self._load_heavy_fields()
+        return self._negative_prompts
+
+    @negative_prompts.setter
+    def negative_prompts(self, value: str):
+        self._negative_prompts = value
 
     def is_file_exists(self) -> bool:
         return bool(self.location) and os.path.isfile(self.location)
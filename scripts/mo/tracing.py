@@ -0,0 +1,166 @@
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+_RECENT_SPANS_LIMIT = 200
+
+
+class Span:
+    """
+    Timed operation. Counters added while the span is open are reported with it and summed per span name.
+    """
+
+    def __init__(self, name: str, parent: Optional[str]):
+        self.name = name
+        self.parent = parent
+        self.counters: Dict[str, float] = {}
+        self.started_at = time.time()
+        self.duration_ms = None
+        self._start = time.perf_counter()
+
+    def count(self, counter: str, value: float = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def _finish(self):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration_ms, 3),
+            'counters': dict(self.counters)
+        }
+
+
+class _Tracer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats: Dict[str, dict] = {}
+        self._recent = deque(maxlen=_RECENT_SPANS_LIMIT)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    @contextmanager
+    def span(self, name: str):
+        stack = self._stack()
+        span = Span(name, stack[-1].name if stack else None)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span._finish()
+            # Removed by identity, a span opened in a generator may be closed after spans opened later.
+            if span in stack:
+                stack.remove(span)
+            self._add(span)
+
+    def current(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def _add(self, span: Span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0, 'counters': {}}
+                self._stats[span.name] = stats
+            stats['count'] += 1
+            stats['total_ms'] += span.duration_ms
+            stats['max_ms'] = max(stats['max_ms'], span.duration_ms)
+            stats['last_ms'] = span.duration_ms
+            for counter, value in span.counters.items():
+                stats['counters'][counter] = stats['counters'].get(counter, 0) + value
+            self._recent.append(span)
+
+    def report(self) -> dict:
+        with self._lock:
+            spans = {
+                name: {
+                    'count': stats['count'],
+                    'total_ms': round(stats['total_ms'], 3),
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 3),
+                    'max_ms': round(stats['max_ms'], 3),
+                    'last_ms': round(stats['last_ms'], 3),
+                    'counters': dict(stats['counters'])
+                } for name, stats in sorted(self._stats.items())
+            }
+            recent = [span.to_dict() for span in reversed(self._recent)]
+        return {'spans': spans, 'recent': recent}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._recent.clear()
+
+
+_tracer = _Tracer()
+
+
+def span(name: str):
+    """
+    Context manager that times the enclosed block:
+
+        with tracing.span('home.query') as s:
+            s.count('records', len(records))
+
+    :param name: dot separated span name, statistics are aggregated by name.
+    :return: context manager yielding the Span.
+    """
+    return _tracer.span(name)
+
+
+def traced(name: str):
+    """
+    Decorator that wraps every function call into a span.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _tracer.span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(counter: str, value: float = 1):
+    """
+    Adds value to the counter of the innermost open span of the current thread, does nothing outside of spans.
+    """
+    current = _tracer.current()
+    if current is not None:
+        current.count(counter, value)
+
+
+def record(name: str, duration_ms: float, **counters):
+    """
+    Adds span measured by the caller, e.g. a module import time.
+    """
+    recorded = Span(name, None)
+    recorded.duration_ms = duration_ms
+    recorded.counters.update(counters)
+    _tracer._add(recorded)
+
+
+def get_report() -> dict:
+    """
+    :return: dictionary with per name statistics ("spans") and the latest spans, newest first ("recent").
+    """
+    return _tracer.report()
+
+
+def reset():
+    _tracer.reset()
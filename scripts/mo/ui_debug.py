@@ -1,4 +1,5 @@
 import hashlib
+import html
 import json
 import os
 import time
@@ -6,10 +7,18 @@ import zlib
 
 import gradio as gr
 
+import scripts.mo.tracing as tracing
+from scripts.mo.data import library_hashing, duplicate_files
+from scripts.mo.data.hash_index import HashIndex
 from scripts.mo.environment import env
+from scripts.mo.jobs import JobManager, JobContext, JOB_COMPLETED
 from scripts.mo.models import ModelType
-from scripts.mo.utils import get_model_files_in_dir, find_preview_file, link_preview, read_hash_cache, \
-    calculate_file_temp_hash, write_hash_cache, calculate_sha256
+from scripts.mo.ui_jobs import follow_job, job_status_html
+from scripts.mo.utils import get_model_files_in_dir, find_preview_file, link_preview, calculate_file_temp_hash, \
+    calculate_sha256
+
+_SCANNED_MODEL_TYPES = [ModelType.CHECKPOINT, ModelType.VAE, ModelType.LORA, ModelType.HYPER_NETWORK,
+                        ModelType.EMBEDDING, ModelType.LYCORIS]
 
 
 def _ui_state_report():
@@ -17,7 +26,7 @@ def _ui_state_report():
         gr.Button('Generate state report')
 
 
-def _on_local_files_scan_click():
+def _scan_local_files_job(job: JobContext) -> list:
     result = []
 
     def search_in_dir(model_type) -> list:
@@ -25,6 +34,7 @@ def _on_local_files_scan_click():
         local = []
         files = get_model_files_in_dir(dir_path)
         for file in files:
+            job.check_cancelled()
             preview_file = find_preview_file(file)
             rec = {
                 'filename': os.path.basename(file),
@@ -41,31 +51,48 @@ def _on_local_files_scan_click():
                 rec.update(prev)
 
             local.append(rec)
+            job.progress(len(result) + len(local))
         return local
 
-    result.extend(search_in_dir(ModelType.CHECKPOINT))
-    result.extend(search_in_dir(ModelType.VAE))
-    result.extend(search_in_dir(ModelType.LORA))
-    result.extend(search_in_dir(ModelType.HYPER_NETWORK))
-    result.extend(search_in_dir(ModelType.EMBEDDING))
-    result.extend(search_in_dir(ModelType.LYCORIS))
+    for model_type in _SCANNED_MODEL_TYPES:
+        result.extend(search_in_dir(model_type))
+
+    return result
 
-    return gr.JSON(value=json.dumps(result))
+
+def _follow_json_job(job_id: str, *extra_outputs):
+    """
+    Polls the job and yields its status, the result is shown in the JSON widget once completed.
+    """
+    for job in follow_job(job_id):
+        is_completed = job['status'] == JOB_COMPLETED
+        yield [
+            gr.HTML(value=job_status_html(job)),
+            gr.JSON(value=json.dumps(job['result']) if is_completed else None),
+            *[output(is_completed) for output in extra_outputs]
+        ]
+
+
+def _on_local_files_scan_click():
+    job_id = JobManager.instance().submit('debug_scan', 'Scan local model files', _scan_local_files_job)
+    yield from _follow_json_job(job_id)
 
 
 def _ui_local_files():
     with gr.Column():
         scan_button = gr.Button('Scan Local Model files')
 
+        job_status_widget = gr.HTML()
         local_files_json = gr.JSON(label='Local files')
 
         scan_button.click(fn=_on_local_files_scan_click,
-                          outputs=local_files_json)
+                          outputs=[job_status_widget, local_files_json])
 
 
 def _on_read_hash_click():
-    cache = read_hash_cache()
+    cache = HashIndex.instance().get_all_entries()
     return [
+        gr.HTML(value=''),
         gr.JSON(value=json.dumps(cache)),
         gr.Button(visible=False)
     ]
@@ -146,101 +173,101 @@ def calculate_adler32(file_path):
         return None
 
 
-def _on_calculate_hash_click():
-    result = []
-
-    def calc_in_dir(model_type) -> list:
-        dir_path = env.get_model_path(model_type)
-        local = []
-        files = get_model_files_in_dir(dir_path)
-        for file in files:
-            start_ms = int(time.time() * 1000)
-            sha256 = calculate_sha256(file)
-            time_spent_sha256 = int(time.time() * 1000) - start_ms
-
-            start_ms = int(time.time() * 1000)
-            crc32 = calculate_crc32(file)
-            time_spent_crc32 = int(time.time() * 1000) - start_ms
-
-            start_ms = int(time.time() * 1000)
-            md5 = calculate_md5(file)
-            time_spent_md5 = int(time.time() * 1000) - start_ms
-
-            start_ms = int(time.time() * 1000)
-            adler32 = calculate_adler32(file)
-            time_spent_adler32 = int(time.time() * 1000) - start_ms
+def _calculate_hashes_job(job: JobContext) -> list:
+    files = []
+    for model_type in _SCANNED_MODEL_TYPES:
+        files.extend(get_model_files_in_dir(env.get_model_path(model_type)))
 
-            rec = {
-                'path': file,
-                'file_size': os.path.getsize(file),
-                'temp_hash': calculate_file_temp_hash(file),
-                'sha256': sha256,
-                'sha256_time_ms': time_spent_sha256,
-                'crc32': crc32,
-                'crc32_time_ms': time_spent_crc32,
-                'md5': md5,
-                'md5_time_ms': time_spent_md5,
-                'adler32': adler32,
-                'adler32_time_ms': time_spent_adler32
-            }
-            local.append(rec)
-        return local
+    result = []
+    for file in files:
+        job.check_cancelled()
+        job.progress(len(result), len(files), os.path.basename(file))
+        start_ms = int(time.time() * 1000)
+        sha256 = calculate_sha256(file)
+        time_spent_sha256 = int(time.time() * 1000) - start_ms
+
+        start_ms = int(time.time() * 1000)
+        crc32 = calculate_crc32(file)
+        time_spent_crc32 = int(time.time() * 1000) - start_ms
+
+        start_ms = int(time.time() * 1000)
+        md5 = calculate_md5(file)
+        time_spent_md5 = int(time.time() * 1000) - start_ms
+
+        start_ms = int(time.time() * 1000)
+        adler32 = calculate_adler32(file)
+        time_spent_adler32 = int(time.time() * 1000) - start_ms
+
+        rec = {
+            'path': file,
+            'file_size': os.path.getsize(file),
+            'temp_hash': calculate_file_temp_hash(file),
+            'sha256': sha256,
+            'sha256_time_ms': time_spent_sha256,
+            'crc32': crc32,
+            'crc32_time_ms': time_spent_crc32,
+            'md5': md5,
+            'md5_time_ms': time_spent_md5,
+            'adler32': adler32,
+            'adler32_time_ms': time_spent_adler32
+        }
+        result.append(rec)
+
+    return result
 
-    result.extend(calc_in_dir(ModelType.CHECKPOINT))
-    result.extend(calc_in_dir(ModelType.VAE))
-    result.extend(calc_in_dir(ModelType.LORA))
-    result.extend(calc_in_dir(ModelType.HYPER_NETWORK))
-    result.extend(calc_in_dir(ModelType.EMBEDDING))
-    result.extend(calc_in_dir(ModelType.LYCORIS))
 
-    return [
-        gr.JSON(value=json.dumps(result)),
-        gr.Button(visible=True)
-    ]
+def _on_calculate_hash_click():
+    job_id = JobManager.instance().submit('debug_hash', 'Calculate hashes', _calculate_hashes_job)
+    yield from _follow_json_job(job_id, lambda is_completed: gr.Button(visible=is_completed))
 
 
-def _on_compare_hash_click():
+def _compare_hash_job(job: JobContext) -> list:
     result = []
 
-    cache = read_hash_cache()
-
-    def find_in_cache(file_path, temp_hash):
-        for entry in cache:
-            if entry.get('path') == file_path and entry.get('temp_hash') == temp_hash and \
-                    entry.get('sha256') is not None:
-                return entry['sha256']
+    hash_index = HashIndex.instance()
 
     def search_in_dir(model_type) -> list:
         dir_path = env.get_model_path(model_type)
         local = []
         files = get_model_files_in_dir(dir_path)
         for file in files:
+            job.check_cancelled()
             temp_hash = calculate_file_temp_hash(file)
 
             rec = {
                 'path': file,
                 'temp_hash': temp_hash,
-                'sha256': find_in_cache(file, temp_hash)
+                'sha256': hash_index.get(file, temp_hash)
             }
 
             local.append(rec)
+            job.progress(len(result) + len(local))
         return local
 
-    result.extend(search_in_dir(ModelType.CHECKPOINT))
-    result.extend(search_in_dir(ModelType.VAE))
-    result.extend(search_in_dir(ModelType.LORA))
-    result.extend(search_in_dir(ModelType.HYPER_NETWORK))
-    result.extend(search_in_dir(ModelType.EMBEDDING))
-    result.extend(search_in_dir(ModelType.LYCORIS))
+    for model_type in _SCANNED_MODEL_TYPES:
+        result.extend(search_in_dir(model_type))
 
-    return [
-        gr.JSON(value=json.dumps(result)),
-        gr.Button(visible=False)
-    ]
+    return result
+
+
+def _on_compare_hash_click():
+    job_id = JobManager.instance().submit('debug_compare_hash', 'Compare hash with cache', _compare_hash_job)
+    yield from _follow_json_job(job_id, lambda _: gr.Button(visible=False))
 
 
 def _on_hash_cache_save_click(json_data):
-    write_hash_cache(json_data)
+    HashIndex.instance().put_entries(json_data)
+
+
+def _on_hash_library_click(force):
+    manager = JobManager.instance()
+    job = manager.find_active_job(library_hashing.JOB_KIND)
+    if job is not None:
+        job_id = job['id']
+    else:
+        job_id = manager.submit(library_hashing.JOB_KIND, 'Hash model library', library_hashing.run_library_hashing,
+                                force)
+    yield from _follow_json_job(job_id, lambda _: gr.Button(visible=False))
 
 
 def _ui_hash_cache():
@@ -248,39 +275,158 @@ def _ui_hash_cache():
         read_button = gr.Button('Read hash cache')
         compare_hash_button = gr.Button('Compare hash with cache')
         calculate_button = gr.Button('Calculate hashes')
+        with gr.Row():
+            hash_library_button = gr.Button('Hash model library')
+            hash_library_force_checkbox = gr.Checkbox(label='Rehash indexed files', value=False)
         save_hash_button = gr.Button('Save hash', visible=False)
 
+        job_status_widget = gr.HTML()
         hash_cache_json = gr.JSON(label='Local files')
 
-    read_button.click(fn=_on_read_hash_click, outputs=[hash_cache_json, save_hash_button])
-    calculate_button.click(fn=_on_calculate_hash_click, outputs=[hash_cache_json, save_hash_button])
-    compare_hash_button.click(fn=_on_compare_hash_click, outputs=[hash_cache_json, save_hash_button])
+    read_button.click(fn=_on_read_hash_click, outputs=[job_status_widget, hash_cache_json, save_hash_button])
+    calculate_button.click(fn=_on_calculate_hash_click, outputs=[job_status_widget, hash_cache_json, save_hash_button])
+    compare_hash_button.click(fn=_on_compare_hash_click,
+                              outputs=[job_status_widget, hash_cache_json, save_hash_button])
+
+    hash_library_button.click(fn=_on_hash_library_click, inputs=hash_library_force_checkbox,
+                              outputs=[job_status_widget, hash_cache_json, save_hash_button])
 
     save_hash_button.click(fn=_on_hash_cache_save_click, inputs=hash_cache_json)
 
 
-def _on_remove_duplicates_click():
-    records = env.storage.get_all_records()
+def _remove_duplicates_job(job: JobContext) -> dict:
+    records = env.storage.get_all_records(list_view=True)
     counter_set = set()
     duplicates_list = []
 
     for record in records:
+        job.check_cancelled()
         key = f'{record.name}-{record.url}'
         if key in counter_set:
             duplicates_list.append(record)
         else:
             counter_set.add(key)
 
-    for record in duplicates_list:
-        env.storage.remove_record(record.id_)
+    env.storage.remove_records([record.id_ for record in duplicates_list])
+    job.progress(len(duplicates_list), message=f'{len(duplicates_list)} duplicates has been removed.')
+
+    return {'removed': len(duplicates_list)}
+
+
+def _on_remove_duplicates_click():
+    job_id = JobManager.instance().submit('remove_duplicates', 'Remove records duplicates', _remove_duplicates_job)
+    for job in follow_job(job_id):
+        yield job_status_html(job)
+
+
+def _duplicates_report_html(result: dict) -> str:
+    if not result['groups']:
+        return 'No duplicate files found.'
+
+    output = f"<b>Reclaimable space: {result['reclaimable'] / 1024 ** 3:.2f} GB " \
+             f"in {len(result['groups'])} groups</b>"
+    for group in result['groups']:
+        output += f"<br><br>{html.escape(group['keep'])} ({group['size'] / 1024 ** 2:.1f} MB)"
+        for duplicate in group['duplicates']:
+            output += f'<br>&nbsp;&nbsp;duplicate: {html.escape(duplicate)}'
+            if not duplicate_files.is_removable_duplicate(group['keep'], duplicate):
+                output += ' (other model type directory, hardlink only)'
+    return output
+
+
+def _on_find_duplicate_files_click():
+    job_id = JobManager.instance().submit(duplicate_files.FIND_JOB_KIND, 'Find duplicate files',
+                                          duplicate_files.find_duplicate_files)
+    for job in follow_job(job_id):
+        if job['status'] == JOB_COMPLETED:
+            yield [
+                gr.HTML(value=_duplicates_report_html(job['result'])),
+                job_id,
+                gr.Button(visible=bool(job['result']['groups']))
+            ]
+        else:
+            yield [gr.HTML(value=job_status_html(job)), None, gr.Button(visible=False)]
+
+
+def _on_resolve_duplicate_files_click(find_job_id, mode):
+    find_job = JobManager.instance().get_job(find_job_id) if find_job_id else None
+    if find_job is None or find_job['result'] is None:
+        yield gr.HTML(value='Find duplicate files first.')
+        return
+
+    job_id = JobManager.instance().submit(duplicate_files.RESOLVE_JOB_KIND, mode,
+                                          duplicate_files.resolve_duplicate_files, find_job['result']['groups'],
+                                          mode)
+    for job in follow_job(job_id):
+        if job['status'] == JOB_COMPLETED:
+            result = job['result']
+            yield gr.HTML(value=f"Resolved: {result['resolved']}, skipped: {result['skipped']}, "
+                                f"reclaimed: {result['reclaimed'] / 1024 ** 3:.2f} GB")
+        else:
+            yield gr.HTML(value=job_status_html(job))
+
+
+def _ui_duplicate_files():
+    find_job_state = gr.State()
+    with gr.Column():
+        gr.Markdown('Finds identical model files saved under different names or directories. Duplicates in other '
+                    'model type directories than the kept file are replaced with hardlinks, even if removal is '
+                    'selected.')
+        find_button = gr.Button('Find duplicate files')
+        with gr.Row():
+            mode_radio = gr.Radio(choices=[duplicate_files.MODE_HARDLINK, duplicate_files.MODE_REMOVE],
+                                  value=duplicate_files.MODE_HARDLINK, show_label=False, interactive=True)
+            resolve_button = gr.Button('Apply', visible=False)
+        resolve_result_widget = gr.HTML()
+        report_widget = gr.HTML()
+
+    find_button.click(fn=_on_find_duplicate_files_click, outputs=[report_widget, find_job_state, resolve_button])
+    resolve_button.click(fn=_on_resolve_duplicate_files_click, inputs=[find_job_state, mode_radio],
+                         outputs=resolve_result_widget)
+
+
+def _timings_html(report: dict) -> str:
+    if not report['spans']:
+        return 'No timings recorded yet.'
+
+    output = '<table><tr><th>Span</th><th>Count</th><th>Total, ms</th><th>Avg, ms</th><th>Max, ms</th>' \
+             '<th>Last, ms</th><th>Counters</th></tr>'
+    for name, stats in report['spans'].items():
+        counters = ', '.join(f'{counter}: {value:g}' for counter, value in stats['counters'].items())
+        output += f"<tr><td>{html.escape(name)}</td><td>{stats['count']}</td><td>{stats['total_ms']:.1f}</td>" \
+                  f"<td>{stats['avg_ms']:.1f}</td><td>{stats['max_ms']:.1f}</td><td>{stats['last_ms']:.1f}</td>" \
+                  f"<td>{html.escape(counters)}</td></tr>"
+    output += '</table>'
+    return output
+
+
+def _on_timings_refresh_click():
+    report = tracing.get_report()
+    return [gr.HTML(value=_timings_html(report)), gr.JSON(value=json.dumps(report['recent']))]
+
 
-    return f'{len(duplicates_list)} duplicates has been removed.'
+def _on_timings_reset_click():
+    tracing.reset()
+    return _on_timings_refresh_click()
+
+
+def _ui_timings():
+    with gr.Column():
+        gr.Markdown('Startup, home page render and download stage timings. '
+                    'Also available as JSON at /mo/debug/timings.')
+        with gr.Row():
+            refresh_button = gr.Button('Refresh')
+            reset_button = gr.Button('Reset')
+        timings_widget = gr.HTML()
+        recent_json = gr.JSON(label='Recent spans')
+
+    refresh_button.click(fn=_on_timings_refresh_click, outputs=[timings_widget, recent_json])
+    reset_button.click(fn=_on_timings_reset_click, outputs=[timings_widget, recent_json])
 
 
 def _on_remove_all_records_click():
     records = env.storage.get_all_records()
-    for record in records:
-        env.storage.remove_record(record.id_)
+    env.storage.remove_records([record.id_ for record in records])
 
     return "All records has been removed."
 
@@ -315,6 +461,12 @@ def debug_ui_block():
         with gr.Tab('Hash cache'):
             _ui_hash_cache()
 
+        with gr.Tab('Duplicate files'):
+            _ui_duplicate_files()
+
+        with gr.Tab('Timings'):
+            _ui_timings()
+
         with gr.Tab('Utils'):
             _ui_debug_utils()
 
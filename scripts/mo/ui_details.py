@@ -34,33 +34,32 @@ def on_id_changed(record_id):
 
 
 def details_ui_block():
-    with gr.Blocks():
-        details_id_box = gr.Textbox(label='details_id_box', elem_classes='mo-alert-warning', visible=False)
-        with gr.Row():
-            back_button = gr.Button("⬅️ Back")
-            remove_button = gr.Button("🗑️ Remove")
-            edit_button = gr.Button('✏️ Edit')
-            download_button = gr.Button("🌐 Download")
+    details_id_box = gr.Textbox(label='details_id_box', elem_classes='mo-alert-warning', visible=False)
+    with gr.Row():
+        back_button = gr.Button("⬅️ Back")
+        remove_button = gr.Button("🗑️ Remove")
+        edit_button = gr.Button('✏️ Edit')
+        download_button = gr.Button("🌐 Download")
 
-        content_widget = gr.HTML()
-        description_html = '<div><p style="margin-left: 0.2rem;">Description:</p>' \
-                           '<textarea id="mo-description-preview"></textarea></div>'
-        description_html_widget = gr.HTML(label='Description:', value=description_html)
-        description_input_widget = gr.Textbox(label='description_input_widget',
-                                              elem_classes='mo-alert-warning',
-                                              interactive=False,
-                                              visible=False)
+    content_widget = gr.HTML()
+    description_html = '<div><p style="margin-left: 0.2rem;">Description:</p>' \
+                       '<textarea id="mo-description-preview"></textarea></div>'
+    description_html_widget = gr.HTML(label='Description:', value=description_html)
+    description_input_widget = gr.Textbox(label='description_input_widget',
+                                          elem_classes='mo-alert-warning',
+                                          interactive=False,
+                                          visible=False)
 
-        details_id_box.change(on_id_changed, inputs=details_id_box,
-                              outputs=[content_widget, description_html_widget, description_input_widget, edit_button,
-                                       download_button])
+    details_id_box.change(on_id_changed, inputs=details_id_box,
+                          outputs=[content_widget, description_html_widget, description_input_widget, edit_button,
+                                   download_button])
 
-        description_input_widget.change(fn=None, inputs=description_input_widget,
-                                        _js='handleDescriptionPreviewContentChange')
+    description_input_widget.change(fn=None, inputs=description_input_widget,
+                                    _js='handleDescriptionPreviewContentChange')
 
-        back_button.click(fn=None, _js='navigateBack')
-        download_button.click(fn=None, inputs=details_id_box, _js='navigateDownloadRecord')
-        remove_button.click(fn=None, inputs=details_id_box, _js='navigateRemove')
-        edit_button.click(fn=None, inputs=details_id_box, _js='navigateEdit')
+    back_button.click(fn=None, _js='navigateBack')
+    download_button.click(fn=None, inputs=details_id_box, _js='navigateDownloadRecord')
+    remove_button.click(fn=None, inputs=details_id_box, _js='navigateRemove')
+    edit_button.click(fn=None, inputs=details_id_box, _js='navigateEdit')
 
     return details_id_box
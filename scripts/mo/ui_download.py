@@ -7,6 +7,7 @@ import scripts.mo.ui_format as ui_format
 import scripts.mo.ui_navigation as nav
 import scripts.mo.ui_styled_html as styled
 from scripts.mo.dl.download_manager import *
+from scripts.mo.dl.download_queue import DownloadQueue, ACTIVE_STATUSES
 from scripts.mo.environment import env, logger
 from scripts.mo.data.record_utils import load_records_and_filter
 
@@ -16,6 +17,8 @@ _STATE_COMPLETED = 'Completed'
 _STATE_EXISTS = 'Exists'
 _STATE_ERROR = 'Error'
 
+_POLL_INTERVAL = 0.5
+
 
 def _build_widget_update(progress_update=None, status_message=None, is_start_button_visible=None,
                          is_cancel_button_visible=None,
@@ -165,6 +168,37 @@ def _generate_general_update(update):
     )
 
 
+def _follow_queue_items(records, item_ids):
+    """
+    Polls states of queued record downloads until all of them are finished.
+    Closing the browser tab stops polling, not the downloads.
+    """
+    queue = DownloadQueue.instance()
+    record_ids = dict(zip(item_ids, [record.id_ for record in records]))
+    previous_states = {}
+    while True:
+        states = queue.get_states(item_ids)
+        changed = {record_ids[item_id]: state for item_id, state in states.items()
+                   if state != previous_states.get(item_id)}
+        previous_states = states
+
+        is_active = any(state.get('status') in ACTIVE_STATUSES for state in states.values())
+        if is_active:
+            yield _generate_general_update({'records': changed} if changed else {})
+            time.sleep(_POLL_INTERVAL)
+            continue
+
+        if any(state.get('exception') is not None for state in states.values()):
+            general_status = GENERAL_STATUS_ERROR
+        elif any(state.get('status') == RECORD_STATUS_CANCELLED for state in states.values()):
+            general_status = GENERAL_STATUS_CANCELLED
+        else:
+            general_status = GENERAL_STATUS_COMPLETED
+        yield _generate_general_update({'general_status': general_status, 'records': changed})
+        logger.debug('Completed.')
+        return
+
+
 def _on_start_click(records):
     yield _build_widget_update(
         status_message=styled.alert_primary('Download in progress.'),
@@ -173,21 +207,22 @@ def _on_start_click(records):
         is_back_button_visible=False,
     )
 
-    DownloadManager.instance().start_download(records)
+    # Records that are already queued or downloading are not added twice, their progress is followed.
+    item_ids = DownloadQueue.instance().enqueue([record.id_ for record in records])
+    yield from _follow_queue_items(records, item_ids)
 
-    counter = 0
-    while DownloadManager.instance().is_running():
-        if counter % 20 == 0:
-            download_state = DownloadManager.instance().get_state()
-        else:
-            download_state = DownloadManager.instance().get_latest_state()
-        yield _generate_general_update(download_state)
-        time.sleep(0.2)
 
-    general_state = DownloadManager.instance().get_state()
+def _on_attach(records):
+    item_ids = DownloadQueue.instance().active_item_ids([record.id_ for record in records])
+    if not item_ids:
+        yield _build_widget_update()
+        return
 
-    yield _generate_general_update(general_state)
-    logger.debug('Completed.')
+    yield _generate_general_update({'general_status': GENERAL_STATUS_IN_PROGRESS})
+    active_records = {record.id_: record for record in records}
+    items = DownloadQueue.instance().get_items(item_ids)
+    yield from _follow_queue_items([active_records[item['record_id']] for item in items],
+                                   [item['id'] for item in items])
 
 
 def _on_id_change(data):
@@ -229,41 +264,43 @@ def _on_id_change(data):
     ]
 
 
-def _on_cancel_click():
-    DownloadManager.instance().stop_download()
+def _on_cancel_click(records):
+    queue = DownloadQueue.instance()
+    queue.cancel(queue.active_item_ids([record.id_ for record in records]))
 
 
 def download_ui_block():
-    with gr.Blocks():
-        download_state = gr.State(value=[])
-        download_id_box = gr.Textbox(label='download_id_box',
-                                     elem_classes='mo-alert-warning',
-                                     visible=False,
-                                     interactive=False)
-        download_progress_box = gr.Textbox(label='download_progress_box',
-                                           elem_classes='mo-alert-warning',
-                                           visible=False,
-                                           interactive=False)
-        gr.Markdown('## Downloads')
-        status_message_widget = gr.HTML(visible=False)
-        with gr.Row():
-            gr.Markdown()
-            back_button = gr.Button('⬅️ Back', visible=True)
-            start_button = gr.Button('📥 Start Download', visible=True)
-            cancel_button = gr.Button('❎ Cancel Download', visible=False)
-            gr.Markdown()
-        gr.HTML('</hr>')
-        html_widget = gr.HTML()
+    download_state = gr.State(value=[])
+    download_id_box = gr.Textbox(label='download_id_box',
+                                 elem_classes='mo-alert-warning',
+                                 visible=False,
+                                 interactive=False)
+    download_progress_box = gr.Textbox(label='download_progress_box',
+                                       elem_classes='mo-alert-warning',
+                                       visible=False,
+                                       interactive=False)
+    gr.Markdown('## Downloads')
+    status_message_widget = gr.HTML(visible=False)
+    with gr.Row():
+        gr.Markdown()
+        back_button = gr.Button('⬅️ Back', visible=True)
+        start_button = gr.Button('📥 Start Download', visible=True)
+        cancel_button = gr.Button('❎ Cancel Download', visible=False)
+        gr.Markdown()
+    gr.HTML('</hr>')
+    html_widget = gr.HTML()
 
     download_id_box.change(_on_id_change, inputs=download_id_box,
                            outputs=[html_widget, download_state, start_button, cancel_button, back_button,
-                                    status_message_widget])
+                                    status_message_widget]) \
+        .then(_on_attach, inputs=download_state,
+              outputs=[status_message_widget, start_button, cancel_button, back_button, download_progress_box])
     download_progress_box.change(fn=None, inputs=download_progress_box, _js='handleProgressUpdates')
 
     start_button.click(_on_start_click, inputs=download_state,
                        outputs=[status_message_widget, start_button, cancel_button, back_button, download_progress_box])
 
-    cancel_button.click(_on_cancel_click, queue=False)
+    cancel_button.click(_on_cancel_click, inputs=download_state, queue=False)
     back_button.click(fn=None, _js='navigateBack')
 
     return download_id_box
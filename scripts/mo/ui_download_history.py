@@ -0,0 +1,70 @@
+import html
+from datetime import datetime
+
+import gradio as gr
+
+import scripts.mo.ui_format as ui_format
+import scripts.mo.ui_styled_html as styled
+from scripts.mo.dl.download_history import DownloadHistory
+
+_HISTORY_LIST_LIMIT = 100
+_DAILY_STATS_DAYS = 30
+
+
+def _format_speed(speed) -> str:
+    return ui_format.format_download_speed(speed) if speed is not None else ''
+
+
+def _aggregates_table_html(title: str, key_field: str, rows) -> str:
+    content = f'<table class="mo-jobs-table"><tr><th>{title}</th><th>Downloads</th><th>Failed</th>' \
+              '<th>Retries</th><th>Transferred</th><th>Average speed</th><th>Peak speed</th></tr>'
+    for row in rows:
+        content += f"<tr><td>{html.escape(row[key_field] or '-')}</td>" \
+                   f"<td>{row['downloads']}</td>" \
+                   f"<td>{row['failed']}</td>" \
+                   f"<td>{row['retries']}</td>" \
+                   f"<td>{ui_format.format_bytes(row['bytes'] or 0)}</td>" \
+                   f"<td>{_format_speed(row['average_speed'])}</td>" \
+                   f"<td>{_format_speed(row['peak_speed'])}</td></tr>"
+    content += '</table>'
+    return content
+
+
+def _entries_table_html(entries) -> str:
+    content = '<table class="mo-jobs-table"><tr><th>Finished</th><th>Record</th><th>Host</th><th>Outcome</th>' \
+              '<th>Transferred</th><th>Duration</th><th>Average speed</th><th>Peak speed</th><th>Retries</th></tr>'
+    for entry in entries:
+        outcome = entry['outcome'] or ''
+        if entry['error']:
+            outcome += f": {entry['error']}"
+        content += f"<tr><td>{datetime.fromtimestamp(entry['finished_at']).strftime('%Y-%m-%d %H:%M:%S')}</td>" \
+                   f"<td>{html.escape(entry['record_name'] or '')}</td>" \
+                   f"<td>{html.escape(entry['host'] or '')}</td>" \
+                   f"<td>{html.escape(outcome)}</td>" \
+                   f"<td>{ui_format.format_bytes(entry['bytes'] or 0)}</td>" \
+                   f"<td>{ui_format.format_time(entry['duration'] or 0)}</td>" \
+                   f"<td>{_format_speed(entry['average_speed'])}</td>" \
+                   f"<td>{_format_speed(entry['peak_speed'])}</td>" \
+                   f"<td>{entry['retries']}</td></tr>"
+    content += '</table>'
+    return content
+
+
+def _on_history_refresh_click():
+    history = DownloadHistory.instance()
+    entries = history.list_entries(_HISTORY_LIST_LIMIT)
+    if not entries:
+        return styled.alert_primary('No downloads')
+
+    return '<h3>By host</h3>' + _aggregates_table_html('Host', 'host', history.host_stats()) + \
+        f'<h3>By day (last {_DAILY_STATS_DAYS} days)</h3>' + \
+        _aggregates_table_html('Day', 'day', history.daily_stats(_DAILY_STATS_DAYS)) + \
+        f'<h3>Latest {_HISTORY_LIST_LIMIT} downloads</h3>' + _entries_table_html(entries)
+
+
+def download_history_ui_block():
+    with gr.Column():
+        refresh_button = gr.Button('🔄 Refresh')
+        history_widget = gr.HTML()
+
+    refresh_button.click(_on_history_refresh_click, outputs=history_widget)
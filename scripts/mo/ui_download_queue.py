@@ -0,0 +1,116 @@
+import html
+from datetime import datetime
+
+import gradio as gr
+
+import scripts.mo.ui_styled_html as styled
+from scripts.mo.dl.bandwidth import BandwidthShaper
+from scripts.mo.dl.download_manager import RECORD_STATUS_ERROR, RECORD_STATUS_CANCELLED
+from scripts.mo.dl.download_queue import DownloadQueue, ACTIVE_STATUSES
+
+_QUEUE_LIST_LIMIT = 100
+
+
+def _format_time(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else ''
+
+
+def _item_choice(item: dict) -> str:
+    return f"{item['id']}: {item['record_name'] or item['record_id']} ({item['status']})"
+
+
+def _queue_table_html(items) -> str:
+    if not items:
+        return styled.alert_primary('Download queue is empty')
+
+    content = '<table class="mo-jobs-table"><tr><th>Record</th><th>Status</th><th>Attempts</th><th>Details</th>' \
+              '<th>Queued</th><th>Finished</th><th>Id</th></tr>'
+    for item in items:
+        details = item['destination'] or item['error'] or ''
+        if item['status'] in ACTIVE_STATUSES and item['error']:
+            details = f"Retry at {_format_time(item['next_attempt_at'])}, last error: {item['error']}"
+        content += f"<tr><td>{html.escape(item['record_name'] or str(item['record_id']))}</td>" \
+                   f"<td>{html.escape(item['status'])}</td>" \
+                   f"<td>{item['attempts']} / {item['max_attempts']}</td>" \
+                   f"<td>{html.escape(details)}</td>" \
+                   f"<td>{_format_time(item['created_at'])}</td>" \
+                   f"<td>{_format_time(item['finished_at'])}</td>" \
+                   f"<td><samp>{item['id']}</samp></td></tr>"
+    content += '</table>'
+    return content
+
+
+def _limit_text(limit: int) -> str:
+    return f'{limit} KiB/s' if limit else 'unlimited'
+
+
+def _bandwidth_html() -> str:
+    limits = BandwidthShaper.instance().get_limits()
+    lines = [f"Total speed: {_limit_text(limits['limit'])} ({limits['source']})",
+             f"Each download: {_limit_text(limits['download_limit'])}"
+             f"{' (override)' if limits['is_download_limit_overridden'] else ''}"]
+    if limits['schedule']:
+        lines.append(f"Schedule: {limits['schedule']}")
+    return styled.alert_primary(lines)
+
+
+def _on_bandwidth_apply_click(limit, download_limit):
+    BandwidthShaper.instance().set_limits(limit, download_limit)
+    return _bandwidth_html()
+
+
+def _on_bandwidth_reset_click():
+    BandwidthShaper.instance().reset_limits()
+    return _bandwidth_html()
+
+
+def _on_queue_refresh_click():
+    items = DownloadQueue.instance().list_items(_QUEUE_LIST_LIMIT)
+    choices = [_item_choice(item) for item in items
+               if item['status'] in ACTIVE_STATUSES + (RECORD_STATUS_ERROR, RECORD_STATUS_CANCELLED)]
+    return [
+        gr.HTML(value=_queue_table_html(items)),
+        gr.Dropdown(choices=choices, value=None)
+    ]
+
+
+def _selected_item_ids(choice) -> list:
+    return [int(choice.split(':', 1)[0])] if choice else []
+
+
+def _on_item_cancel_click(choice):
+    DownloadQueue.instance().cancel(_selected_item_ids(choice))
+    return _on_queue_refresh_click()
+
+
+def _on_item_retry_click(choice):
+    DownloadQueue.instance().retry(_selected_item_ids(choice))
+    return _on_queue_refresh_click()
+
+
+def download_queue_ui_block():
+    with gr.Column():
+        with gr.Row():
+            refresh_button = gr.Button('🔄 Refresh')
+            items_dropdown = gr.Dropdown(label='Queued, failed and cancelled downloads', choices=[],
+                                         interactive=True)
+            cancel_button = gr.Button('❎ Cancel download')
+            retry_button = gr.Button('🔁 Retry download')
+        queue_widget = gr.HTML()
+        with gr.Accordion('Speed limits', open=False):
+            gr.Markdown('Changes apply to running downloads right away and are kept until "Use settings" is clicked '
+                        'or WebUI is restarted. 0 is unlimited.')
+            with gr.Row():
+                limit_widget = gr.Number(label='Total speed limit, KiB/s', value=0, precision=0)
+                download_limit_widget = gr.Number(label='Speed limit of each download, KiB/s', value=0, precision=0)
+                apply_button = gr.Button('✔️ Apply')
+                reset_button = gr.Button('↩️ Use settings')
+            bandwidth_widget = gr.HTML()
+
+    refresh_button.click(_on_queue_refresh_click, outputs=[queue_widget, items_dropdown]) \
+        .then(_bandwidth_html, outputs=bandwidth_widget)
+    apply_button.click(_on_bandwidth_apply_click, inputs=[limit_widget, download_limit_widget],
+                       outputs=bandwidth_widget)
+    reset_button.click(_on_bandwidth_reset_click, outputs=bandwidth_widget)
+    cancel_button.click(_on_item_cancel_click, inputs=items_dropdown, outputs=[queue_widget, items_dropdown])
+    retry_button.click(_on_item_retry_click, inputs=items_dropdown, outputs=[queue_widget, items_dropdown])
@@ -6,9 +6,11 @@ import time
 import gradio as gr
 
 import scripts.mo.ui_styled_html as styled
+from scripts.mo.data.hash_index import HashIndex
 from scripts.mo.data.storage import map_dict_to_record
-from scripts.mo.dl.download_manager import DownloadManager, calculate_sha256
+from scripts.mo.dl.download_manager import DownloadManager
 from scripts.mo.environment import env, logger
+from scripts.mo.jobs import JobManager, JobContext
 from scripts.mo.models import Record, ModelType
 from scripts.mo.ui_navigation import generate_ui_token
 from scripts.mo.utils import is_blank, is_valid_filename, is_valid_url, get_model_files_in_dir, find_preview_file
@@ -29,6 +31,16 @@ def is_filename_with_extension(download_filename):
     filename, extension = os.path.splitext(download_filename)
     return bool(filename and extension)
 
+
+def _hash_record_file_job(job: JobContext, location: str) -> dict:
+    sha256_hash = HashIndex.instance().get_sha256(location)
+    job.check_cancelled()
+
+    # Only the hash is set, record edits saved while hashing are kept.
+    updated = env.storage.set_missing_sha256(location, sha256_hash)
+    return {'location': location, 'sha256': sha256_hash, 'records': updated}
+
+
 def _on_description_output_changed(record_data, name: str, model_type_value: str, download_url: str, backup_url: str, url: str,
                                    download_path: str, download_filename: str, rename_filename: bool, download_subdir: str, preview_url: str,
                                    description_output: str, positive_prompts: str, negative_prompts: str,
@@ -116,15 +128,10 @@ def _on_description_output_changed(record_data, name: str, model_type_value: str
         else:
             created_at = time.time()
 
-        if old_record is not None:
-            if old_record.location == location:
-                sha256_hash = old_record.sha256_hash
-            elif os.path.isfile(location):
-                sha256_hash = calculate_sha256(location)
-        elif sha256_state is not None:
+        if old_record is not None and old_record.location == location:
+            sha256_hash = old_record.sha256_hash
+        elif old_record is None and sha256_state is not None:
             sha256_hash = sha256_state
-        elif os.path.isfile(location):
-            sha256_hash = calculate_sha256(location)
 
         record = Record(
             id_=record_id,
@@ -155,6 +162,11 @@ def _on_description_output_changed(record_data, name: str, model_type_value: str
         else:
             env.storage.add_record(record)
 
+        # Hash is calculated in background, the record is updated once it is ready.
+        if not sha256_hash and os.path.isfile(location):
+            JobManager.instance().submit('hash_record', f'Hash {os.path.basename(location)}',
+                                         _hash_record_file_job, location)
+
         return [
             gr.HTML(visible=False),
             generate_ui_token()
@@ -1,95 +1,252 @@
+import html
 import json
 import os.path
 from datetime import datetime
 
 import gradio as gr
 
+from scripts.mo.data import civitai_backfill, manifest_sync
 from scripts.mo.data.record_utils import load_records_and_filter
-from scripts.mo.data.storage import map_record_to_dict, map_dict_to_record
+from scripts.mo.data.records_io import export_records, import_records, FORMAT_JSON, FORMAT_NDJSON
 from scripts.mo.environment import env
+from scripts.mo.jobs import JobManager, JobContext, JOB_COMPLETED
 from scripts.mo.ui_civitai_import import civitai_import_ui_block
+from scripts.mo.ui_download_history import download_history_ui_block
+from scripts.mo.ui_download_queue import download_queue_ui_block
+from scripts.mo.ui_jobs import follow_job, job_status_html, jobs_ui_block
 
+_IMPORT_NAMES_DISPLAY_LIMIT = 100
 
-def _on_import_file_change(import_file):
-    if import_file is None or not import_file or not os.path.exists(import_file.name):
-        return gr.HTML('')
 
-    with open(import_file.name, 'r') as f:
-        records_dict_list = json.load(f)
+def _import_records_job(job: JobContext, path: str) -> dict:
+    imported_count = 0
+    records_imported = []
+    for batch in import_records(path):
+        imported_count += len(batch)
+        if len(records_imported) < _IMPORT_NAMES_DISPLAY_LIMIT:
+            records_imported.extend(record.name for record in batch[:_IMPORT_NAMES_DISPLAY_LIMIT])
+        job.progress(imported_count)
+        job.check_cancelled()
+    return {'count': imported_count, 'names': records_imported[:_IMPORT_NAMES_DISPLAY_LIMIT]}
+
+
+def _import_result_html(result: dict) -> str:
+    imported_count = result['count']
+    if imported_count == 0:
+        return 'Nothing to import'
+
+    output = f'<b>Imported records: ({imported_count})</b>'
+    for name in result['names']:
+        output += '<br>'
+        output += html.escape(name)
+    if imported_count > _IMPORT_NAMES_DISPLAY_LIMIT:
+        output += f'<br>... and {imported_count - _IMPORT_NAMES_DISPLAY_LIMIT} more'
+    return output
 
-    if len(records_dict_list) == 0:
-        return gr.HTML('Nothing to import')
+
+def _on_import_file_change(import_file):
+    if import_file is None or not import_file or not os.path.exists(import_file.name):
+        yield gr.HTML('')
+        return
+
+    job_id = JobManager.instance().submit('import_records', f'Import {os.path.basename(import_file.name)}',
+                                          _import_records_job, import_file.name)
+    for job in follow_job(job_id):
+        if job['status'] == JOB_COMPLETED:
+            yield gr.HTML(value=_import_result_html(job['result']))
+        else:
+            yield gr.HTML(value=job_status_html(job))
+
+
+def _names_html(title: str, items: list, details_key: str = None) -> str:
+    if not items:
+        return ''
+
+    output = f'<br><b>{title}: ({len(items)})</b>'
+    for item in items[:_IMPORT_NAMES_DISPLAY_LIMIT]:
+        output += '<br>'
+        if isinstance(item, dict):
+            output += html.escape(item['name'])
+            if details_key is not None:
+                output += f' - {html.escape(str(item[details_key]))}'
+        else:
+            output += html.escape(item)
+    if len(items) > _IMPORT_NAMES_DISPLAY_LIMIT:
+        output += f'<br>... and {len(items) - _IMPORT_NAMES_DISPLAY_LIMIT} more'
+    return output
+
+
+def _sync_plan_html(plan: dict) -> str:
+    output = f"<b>Manifest records: {plan['total']}, up to date: {plan['up_to_date']}</b>"
+    output += _names_html('Records to import', plan['import'])
+    output += _names_html('Files found locally', plan['bind'], 'path')
+    output += _names_html('Files to download', plan['download'], 'reason')
+    output += _names_html('Files without download URL', plan['no_source'])
+    return output
+
+
+def _sync_result_html(result: dict) -> str:
+    output = f"<b>Imported records: {result['imported']}, bound files: {result['bound']}, " \
+             f"downloaded: {result['downloaded']}, failed: {result['failed']}</b>"
+    output += _names_html('Failed', result['failures'], 'error')
+    return output
+
+
+def _follow_sync_job(job_id: str, result_html):
+    for job in follow_job(job_id):
+        if job['status'] == JOB_COMPLETED:
+            yield gr.HTML(value=result_html(job['result']))
+        else:
+            yield gr.HTML(value=job_status_html(job))
+
+
+def _on_manifest_file_change(manifest_file):
+    if manifest_file is None or not manifest_file or not os.path.exists(manifest_file.name):
+        yield gr.HTML('')
+        return
+
+    job_id = JobManager.instance().submit(manifest_sync.PLAN_JOB_KIND,
+                                          f'Sync plan {os.path.basename(manifest_file.name)}',
+                                          manifest_sync.plan_manifest_sync, manifest_file.name)
+    yield from _follow_sync_job(job_id, _sync_plan_html)
+
+
+def _on_manifest_sync_click(manifest_file):
+    if manifest_file is None or not manifest_file or not os.path.exists(manifest_file.name):
+        yield gr.HTML('Upload manifest file first')
+        return
+
+    manager = JobManager.instance()
+    job = manager.find_active_job(manifest_sync.SYNC_JOB_KIND)
+    if job is not None:
+        job_id = job['id']
     else:
-        records_imported = []
-        for record_dict in records_dict_list:
-            record = map_dict_to_record('', record_dict)
-            env.storage.add_record(record)
-            records_imported.append(record.name)
+        job_id = manager.submit(manifest_sync.SYNC_JOB_KIND, f'Sync {os.path.basename(manifest_file.name)}',
+                                manifest_sync.run_manifest_sync, manifest_file.name)
+    yield from _follow_sync_job(job_id, _sync_result_html)
 
-        output = f'<b>Imported records: ({len(records_imported)})</b>'
-        for name in records_imported:
-            output += '<br>'
-            output += name
-        return gr.HTML(value=output)
 
+def _on_manifest_sync_stop_click():
+    manager = JobManager.instance()
+    job = manager.find_active_job(manifest_sync.SYNC_JOB_KIND)
+    if job is not None:
+        manager.cancel(job['id'])
 
-def _on_export_click(filter_state_json, export_option):
+
+def _on_export_click(filter_state_json, export_option, export_format, export_gzip):
     if export_option == 'Export All':
-        records = env.storage.get_all_records()
+        records = env.storage.iterate_all_records()
     else:
         filter_state = json.loads(filter_state_json)
         records = load_records_and_filter(filter_state, False)
 
-    records_dict_list = []
-
-    for record in records:
-        records_dict_list.append(map_record_to_dict(record))
+    export_dir = os.path.join(env.script_dir, 'export')
+    if not os.path.isdir(export_dir):
+        os.mkdir(export_dir)
 
-    if len(records_dict_list) > 0:
-        export_dir = os.path.join(env.script_dir, 'export')
-        if not os.path.isdir(export_dir):
-            os.mkdir(export_dir)
-
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        path = os.path.join(export_dir, filename)
-        with open(path, 'w') as f:
-            json.dump(records_dict_list, f)
+    extension = '.ndjson' if export_format == FORMAT_NDJSON else '.json'
+    if export_gzip:
+        extension += '.gz'
+    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+    path = os.path.join(export_dir, filename)
 
+    if export_records(records, path, export_format) > 0:
         return gr.File(value=path, label='Exported, Click "Download"', visible=True)
     else:
+        os.remove(path)
         return gr.File(visible=False)
 
 
+def _on_backfill_start_click(retry_not_found):
+    manager = JobManager.instance()
+    job = manager.find_active_job(civitai_backfill.JOB_KIND)
+    if job is not None:
+        job_id = job['id']
+    else:
+        job_id = manager.submit(civitai_backfill.JOB_KIND, 'Civitai backfill', civitai_backfill.run_civitai_backfill,
+                                retry_not_found)
+
+    for job in follow_job(job_id):
+        yield gr.HTML(value=job_status_html(job))
+
+
+def _on_backfill_stop_click():
+    manager = JobManager.instance()
+    job = manager.find_active_job(civitai_backfill.JOB_KIND)
+    if job is not None:
+        manager.cancel(job['id'])
+
+
 def import_export_ui_block():
-    with gr.Blocks():
+    with gr.Row():
+        gr.Markdown('## Records import/export')
+        gr.Markdown('')
+        back_button = gr.Button('⬅️ Back')
+    with gr.Tab("Import Civitai URL"):
+        with gr.Column():
+            civitai_import_ui_block()
+    with gr.Tab("Import JSON"):
+        import_file_widget = gr.File(label='Import .json, .ndjson or gzip compressed file',
+                                     file_types=['.json', '.ndjson', '.gz'])
+        import_result_widget = gr.HTML()
+    with gr.Tab("Sync from Manifest"):
+        gr.Markdown('Makes this installation match records exported from another one: missing records are '
+                    'imported, files are matched by SHA256 and missing ones are downloaded in parallel. '
+                    'The plan is shown after upload, nothing is changed until "Sync" is clicked.')
+        manifest_file_widget = gr.File(label='Manifest .json, .ndjson or gzip compressed file',
+                                       file_types=['.json', '.ndjson', '.gz'])
+        with gr.Row():
+            manifest_sync_button = gr.Button('🔄 Sync')
+            manifest_stop_button = gr.Button('❎ Stop')
+        manifest_result_widget = gr.HTML()
+    with gr.Tab("Civitai Backfill"):
+        gr.Markdown('Looks up unbound local files on Civitai by SHA256 hash and saves found metadata into '
+                    '".civitai.info" files next to the models. Hashes are cached, files are processed once.')
+        backfill_retry_checkbox = gr.Checkbox(label='Retry files not found on previous runs', value=False)
+        with gr.Row():
+            backfill_start_button = gr.Button('🌐 Start Backfill')
+            backfill_stop_button = gr.Button('❎ Stop')
+        backfill_status_widget = gr.HTML()
+    with gr.Tab("Jobs"):
+        jobs_ui_block()
+    with gr.Tab("Download Queue"):
+        download_queue_ui_block()
+    with gr.Tab("Download History"):
+        download_history_ui_block()
+    with gr.Tab("Export JSON"):
+        filter_state_box = gr.Textbox(value='',
+                                      label='filter_state_box',
+                                      elem_classes='mo-alert-warning',
+                                      elem_id='mo-home-state-box',
+                                      visible=False,
+                                      interactive=False)
+
+        export_option_radio = gr.Radio(choices=['Export All', 'Export filtered from home screen'],
+                                       interactive=True,
+                                       value='Export All')
         with gr.Row():
-            gr.Markdown('## Records import/export')
-            gr.Markdown('')
-            back_button = gr.Button('⬅️ Back')
-        with gr.Tab("Import Civitai URL"):
-            with gr.Column():
-                civitai_import_ui_block()
-        with gr.Tab("Import JSON"):
-            import_file_widget = gr.File(label='Import .json file', file_types=['.json'])
-            import_result_widget = gr.HTML()
-        with gr.Tab("Export JSON"):
-            filter_state_box = gr.Textbox(value='',
-                                          label='filter_state_box',
-                                          elem_classes='mo-alert-warning',
-                                          elem_id='mo-home-state-box',
-                                          visible=False,
-                                          interactive=False)
-
-            export_option_radio = gr.Radio(choices=['Export All', 'Export filtered from home screen'],
+            export_format_radio = gr.Radio(choices=[FORMAT_JSON, FORMAT_NDJSON],
+                                           label='Format',
                                            interactive=True,
-                                           value='Export All')
-            export_button = gr.Button(value='Export')
-            export_file_widget = gr.File(visible=False)
+                                           value=FORMAT_JSON)
+            export_gzip_checkbox = gr.Checkbox(label='Gzip compression', value=False)
+        export_button = gr.Button(value='Export')
+        export_file_widget = gr.File(visible=False)
 
     back_button.click(fn=None, _js='navigateBack')
 
     import_file_widget.change(_on_import_file_change, inputs=import_file_widget,
                               outputs=import_result_widget)
-    export_button.click(_on_export_click, inputs=[filter_state_box, export_option_radio], outputs=export_file_widget)
+    manifest_file_widget.change(_on_manifest_file_change, inputs=manifest_file_widget,
+                                outputs=manifest_result_widget)
+    manifest_sync_button.click(_on_manifest_sync_click, inputs=manifest_file_widget, outputs=manifest_result_widget)
+    manifest_stop_button.click(_on_manifest_sync_stop_click, queue=False)
+    export_button.click(_on_export_click,
+                        inputs=[filter_state_box, export_option_radio, export_format_radio, export_gzip_checkbox],
+                        outputs=export_file_widget)
+
+    backfill_start_button.click(_on_backfill_start_click, inputs=backfill_retry_checkbox,
+                                outputs=backfill_status_widget)
+    backfill_stop_button.click(_on_backfill_stop_click, queue=False)
 
     return filter_state_box
@@ -0,0 +1,97 @@
+import html
+import time
+from datetime import datetime
+from typing import Iterator
+
+import gradio as gr
+
+import scripts.mo.ui_styled_html as styled
+from scripts.mo.jobs import JobManager, FINISHED_STATUSES, JOB_FAILED, JOB_COMPLETED, JOB_QUEUED, JOB_RUNNING
+
+_POLL_INTERVAL = 1
+_JOBS_LIST_LIMIT = 50
+
+
+def job_status_html(job: dict) -> str:
+    lines = [f"{job['title']}: {job['status']}"]
+    if job.get('total'):
+        lines.append(f"Processed: {job['processed']} / {job['total']}")
+    elif job.get('processed'):
+        lines.append(f"Processed: {job['processed']}")
+    if job.get('message'):
+        lines.append(job['message'])
+    if job.get('error'):
+        lines.append(job['error'])
+
+    status = job['status']
+    if status == JOB_FAILED:
+        return styled.alert_danger(lines)
+    elif status == JOB_COMPLETED:
+        return styled.alert_success(lines)
+    elif status in (JOB_QUEUED, JOB_RUNNING):
+        return styled.alert_primary(lines)
+    return styled.alert_warning(lines)
+
+
+def follow_job(job_id: str) -> Iterator[dict]:
+    """
+    Polls the job state until it is finished. Closing the browser tab stops polling, not the job.
+    :param job_id: job id.
+    :return: iterator of job states, the last one is finished.
+    """
+    while True:
+        job = JobManager.instance().get_job(job_id)
+        yield job
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return
+        time.sleep(_POLL_INTERVAL)
+
+
+def _format_time(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else ''
+
+
+def _jobs_table_html(jobs) -> str:
+    if not jobs:
+        return styled.alert_primary('No jobs')
+
+    content = '<table class="mo-jobs-table"><tr><th>Job</th><th>Status</th><th>Progress</th><th>Created</th>' \
+              '<th>Finished</th><th>Id</th></tr>'
+    for job in jobs:
+        progress = f"{job['processed']} / {job['total']}" if job.get('total') else str(job.get('processed') or '')
+        details = job.get('error') or job.get('message') or ''
+        content += f"<tr><td>{html.escape(job['title'])}</td>" \
+                   f"<td>{html.escape(job['status'])}</td>" \
+                   f"<td>{html.escape(progress)}<br>{html.escape(details)}</td>" \
+                   f"<td>{_format_time(job['created_at'])}</td>" \
+                   f"<td>{_format_time(job['finished_at'])}</td>" \
+                   f"<td><samp>{job['id']}</samp></td></tr>"
+    content += '</table>'
+    return content
+
+
+def _on_jobs_refresh_click():
+    jobs = JobManager.instance().list_jobs(_JOBS_LIST_LIMIT)
+    active = [job['id'] for job in jobs if job['status'] not in FINISHED_STATUSES]
+    return [
+        gr.HTML(value=_jobs_table_html(jobs)),
+        gr.Dropdown(choices=active, value=None)
+    ]
+
+
+def _on_job_cancel_click(job_id):
+    if job_id:
+        JobManager.instance().cancel(job_id)
+    return _on_jobs_refresh_click()
+
+
+def jobs_ui_block():
+    with gr.Column():
+        with gr.Row():
+            refresh_button = gr.Button('🔄 Refresh')
+            active_jobs_dropdown = gr.Dropdown(label='Active jobs', choices=[], interactive=True)
+            cancel_button = gr.Button('❎ Cancel job')
+        jobs_widget = gr.HTML()
+
+    refresh_button.click(_on_jobs_refresh_click, outputs=[jobs_widget, active_jobs_dropdown])
+    cancel_button.click(_on_job_cancel_click, inputs=active_jobs_dropdown, outputs=[jobs_widget, active_jobs_dropdown])
@@ -95,38 +95,37 @@ def _on_remove_both_button(record_id):
     return generate_ui_token()
 
 def remove_ui_block():
-    with gr.Blocks():
-        remove_id_box = gr.Textbox(label='remove_id_box', elem_classes='mo-alert-warning', visible=False)
-        remove_back_box = gr.Textbox(label='remove_back_box', elem_classes='mo-alert-warning', visible=False)
+    remove_id_box = gr.Textbox(label='remove_id_box', elem_classes='mo-alert-warning', visible=False)
+    remove_back_box = gr.Textbox(label='remove_back_box', elem_classes='mo-alert-warning', visible=False)
 
-        gr.Markdown('## Record removal')
-        html_widget = gr.HTML()
+    gr.Markdown('## Record removal')
+    html_widget = gr.HTML()
 
-        with gr.Row():
-            gr.Markdown()
-            cancel_button = gr.Button('❎ Cancel')
-            remove_record_button = gr.Button('📑 Remove Record', visible=False, elem_id='mo_button_remove')
-            remove_files_button = gr.Button('📦 Remove Files', visible=False, elem_id='mo_button_remove')
-            remove_both_button = gr.Button('⚠️ Remove Record and Files', visible=False, elem_id='mo_button_remove')
-            gr.Markdown()
+    with gr.Row():
+        gr.Markdown()
+        cancel_button = gr.Button('❎ Cancel')
+        remove_record_button = gr.Button('📑 Remove Record', visible=False, elem_id='mo_button_remove')
+        remove_files_button = gr.Button('📦 Remove Files', visible=False, elem_id='mo_button_remove')
+        remove_both_button = gr.Button('⚠️ Remove Record and Files', visible=False, elem_id='mo_button_remove')
+        gr.Markdown()
 
-        remove_record_button.click(_on_remove_record_button_click,
-                                   inputs=remove_id_box,
-                                   outputs=remove_back_box)
+    remove_record_button.click(_on_remove_record_button_click,
+                               inputs=remove_id_box,
+                               outputs=remove_back_box)
 
-        remove_files_button.click(_on_remove_files_button_click,
-                                  inputs=remove_id_box,
-                                  outputs=remove_back_box)
+    remove_files_button.click(_on_remove_files_button_click,
+                              inputs=remove_id_box,
+                              outputs=remove_back_box)
 
-        remove_both_button.click(_on_remove_both_button,
-                                 inputs=remove_id_box,
-                                 outputs=remove_back_box)
+    remove_both_button.click(_on_remove_both_button,
+                             inputs=remove_id_box,
+                             outputs=remove_back_box)
 
-        cancel_button.click(fn=None, _js='navigateBack')
+    cancel_button.click(fn=None, _js='navigateBack')
 
-        remove_id_box.change(_on_id_change, inputs=remove_id_box,
-                             outputs=[html_widget, cancel_button, remove_record_button, remove_files_button,
-                                      remove_both_button])
+    remove_id_box.change(_on_id_change, inputs=remove_id_box,
+                         outputs=[html_widget, cancel_button, remove_record_button, remove_files_button,
+                                  remove_both_button])
 
-        remove_back_box.change(fn=None, _js='navigateHome')
+    remove_back_box.change(fn=None, _js='navigateHome')
     return remove_id_box
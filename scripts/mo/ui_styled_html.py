@@ -1,17 +1,26 @@
 import html
-import json
 import os
+import threading
+from collections import OrderedDict
 from typing import List
 
+import scripts.mo.tracing as tracing
 import scripts.mo.ui_format as ui_format
-from scripts.mo.data.storage import map_record_to_dict
+from scripts.mo.data.record_utils import local_file_key
 from scripts.mo.environment import env
 from scripts.mo.models import Record, ModelType
-from scripts.mo.utils import get_best_preview_url
+from scripts.mo.utils import get_best_preview_url, find_preview_file
 
 _NO_PREVIEW_DARK = 'file=extensions/sd-model-organizer/pic/no-preview-dark-blue.png'
 _NO_PREVIEW_LIGHT = 'file=extensions/sd-model-organizer/pic/no-preview-light.png'
 
+_FRAGMENT_TABLE_ROW = 'table_row'
+_FRAGMENT_CARD = 'card'
+_FRAGMENTS_CACHE_SIZE = 10000
+
+_fragments_cache = OrderedDict()
+_fragments_cache_lock = threading.Lock()
+
 
 def alert_danger(value) -> str:
     if isinstance(value, list):
@@ -106,83 +115,129 @@ def _no_preview_image_url() -> str:
         return _NO_PREVIEW_LIGHT
 
 
-def records_table(records: List) -> str:
-    table_html = '<div id="organizer_record_table" class="mo-container">'
-    table_html += '<div class="mo-row mo-row-header">'
-    table_html += '<div class="mo-col mo-col-preview"><span class="mo-text-header">Preview</span></div>'
-    table_html += '<div class="mo-col mo-col-type"><span class="mo-text-header">Type</span></div>'
-    table_html += '<div class="mo-col mo-col-name"><span class="mo-text-header">Name</span></div>'
-    table_html += '<div class="mo-col mo-col-description"><span class="mo-text-header">Description</span></div>'
-    table_html += '<div class="mo-col mo-col-actions"><span class="mo-text-header">Actions</span></div>'
-    table_html += '</div>'
+def _preview_mtime(record: Record) -> float:
+    preview_path = find_preview_file(record.location) if record.location else None
+    return os.path.getmtime(preview_path) if preview_path is not None else 0
+
+
+def _join_cached_fragments(records: List, fragment_type: str, render) -> str:
+    """
+    Renders records html fragments, reusing cached fragments of records that haven't changed.
+    :param records: records to render.
+    :param fragment_type: layout of the fragment, part of the cache key.
+    :param render: function that renders a single record fragment, receives record and nsfw blur flag.
+    :return: joined html of all records.
+    """
     nsfw_blur = env.nsfw_blur()
-    for record in records:
-        contains_nsfw = any('nsfw' in group.lower() for group in record.groups) and nsfw_blur
-        name = html.escape(record.name)
-        type_ = record.model_type.value
-        preview_url = get_best_preview_url(record)
-        description = _limit_description(record.description)
+    settings_key = (fragment_type, env.theme(), env.card_width(), env.card_height(), nsfw_blur)
+    fragments = []
+    with tracing.span(f'html.{fragment_type}') as span:
+        span.count('records', len(records))
+        for record in records:
+            if record.id_ is None:
+                # Local file records have no version to track changes.
+                fragments.append(render(record, nsfw_blur))
+                span.count('not_cached')
+                continue
+
+            key = (record.id_, record.updated_at, _preview_mtime(record), record.is_file_exists(), settings_key)
+            with _fragments_cache_lock:
+                fragment = _fragments_cache.get(key)
+                if fragment is not None:
+                    _fragments_cache.move_to_end(key)
+
+            if fragment is None:
+                fragment = render(record, nsfw_blur)
+                span.count('cache_misses')
+                with _fragments_cache_lock:
+                    _fragments_cache[key] = fragment
+                    if len(_fragments_cache) > _FRAGMENTS_CACHE_SIZE:
+                        _fragments_cache.popitem(last=False)
+            else:
+                span.count('cache_hits')
+
+            fragments.append(fragment)
+    return ''.join(fragments)
+
+
+def _record_table_row(record: Record, nsfw_blur: bool) -> str:
+    contains_nsfw = any('nsfw' in group.lower() for group in record.groups) and nsfw_blur
+    name = html.escape(record.name)
+    type_ = record.model_type.value
+    preview_url = get_best_preview_url(record)
+    description = _limit_description(record.description)
 
-        # Add row
-        table_html += '<div class="mo-row">'
+    # Add row
+    row_html = '<div class="mo-row">'
 
-        # Add preview URL column
-        table_html += '<div class="mo-col mo-col-preview">'
+    # Add preview URL column
+    row_html += '<div class="mo-col mo-col-preview">'
 
-        isLocalFileRecord = record.is_local_file_record()
+    isLocalFileRecord = record.is_local_file_record()
 
-        img = f'<img class="mo-preview-image" src="{preview_url}" ' \
-                      f'alt="Preview image"' \
-                      f' onerror="this.onerror=null; this.src=\'{_no_preview_image_url()}\';"/'
-        if not isLocalFileRecord:
-            img += f'onclick="fillPrompt({record.id_})"'
-        img += '>'
-        table_html += img
+    img = f'<img class="mo-preview-image" src="{preview_url}" ' \
+                  f'alt="Preview image"' \
+                  f' onerror="this.onerror=null; this.src=\'{_no_preview_image_url()}\';"/'
+    if not isLocalFileRecord:
+        img += f'data-mo-record-id="{record.id_}" onclick="fillPrompt({record.id_})"'
+    img += '>'
+    row_html += img
 
-        table_html += '</div>'
+    row_html += '</div>'
 
-        # Add type column
-        type_badge_class = _model_type_css_class(record.model_type)
-        table_html += f'<div class="mo-col mo-col-type"><span class="mo-badge {type_badge_class}">{type_}</span></div>'
+    # Add type column
+    type_badge_class = _model_type_css_class(record.model_type)
+    row_html += f'<div class="mo-col mo-col-type"><span class="mo-badge {type_badge_class}">{type_}</span></div>'
 
-        # Add name column
-        table_html += f'<div class="mo-col mo-col-name">'
-        table_html += f'<button class="mo-button-name" onclick="navigateDetails(\'{record.id_}\', event)">{name}</button>'
-        table_html += '</div>'
+    # Add name column
+    row_html += f'<div class="mo-col mo-col-name">'
+    row_html += f'<button class="mo-button-name" onclick="navigateDetails(\'{record.id_}\', event)">{name}</button>'
+    row_html += '</div>'
 
-        # Add description column
-        table_html += f'<div class="mo-col mo-col-description">'
-        table_html += f'<span class="mo-text-description">{html.escape(description)}</span>'
-        table_html += '</div>'
+    # Add description column
+    row_html += f'<div class="mo-col mo-col-description">'
+    row_html += f'<span class="mo-text-description">{html.escape(description)}</span>'
+    row_html += '</div>'
 
-        # Add actions column
-        table_html += '<div class="mo-col mo-col-actions ">'
+    # Add actions column
+    row_html += '<div class="mo-col mo-col-actions ">'
 
-        if record.is_local_file_record():
-            json_record = html.escape(json.dumps(map_record_to_dict(record)))
+    if record.is_local_file_record():
+        row_html += '<button type="button" class="mo-btn mo-btn-success" ' \
+                    f'onclick="navigateAddLocalFile(\'{local_file_key(record.location)}\', event)">Add</button><br>'
 
-            table_html += '<button type="button" class="mo-btn mo-btn-success" ' \
-                          f'onclick="navigateEditPrefilled(\'{json_record}\', event)">Add</button><br>'
+        row_html += '<button type="button" class="mo-btn mo-btn-danger" ' \
+                    f'onclick="navigateRemove(\'{record.location}\', event)">Remove</button><br>'
+    else:
+        row_html += '<button type="button" class="mo-btn mo-btn-success" ' \
+                    f'onclick="navigateDetails(\'{record.id_}\', event)">Details</button><br>'
+
+        if record.is_download_possible():
+            row_html += '<button type="button" class="mo-btn mo-btn-primary" ' \
+                        f'onclick="navigateDownloadRecord(\'{record.id_}\', event)">Download</button><br>'
 
-            table_html += '<button type="button" class="mo-btn mo-btn-danger" ' \
-                          f'onclick="navigateRemove(\'{record.location}\', event)">Remove</button><br>'
-        else:
-            table_html += '<button type="button" class="mo-btn mo-btn-success" ' \
-                          f'onclick="navigateDetails(\'{record.id_}\', event)">Details</button><br>'
+        row_html += '<button type="button" class="mo-btn mo-btn-warning" ' \
+                    f'onclick="navigateEdit(\'{record.id_}\', event)">Edit</button><br>'
 
-            if record.is_download_possible():
-                table_html += '<button type="button" class="mo-btn mo-btn-primary" ' \
-                              f'onclick="navigateDownloadRecord(\'{record.id_}\', event)">Download</button><br>'
+        row_html += '<button type="button" class="mo-btn mo-btn-danger" ' \
+                    f'onclick="navigateRemove(\'{record.id_}\', event)">Remove</button><br>'
 
-            table_html += '<button type="button" class="mo-btn mo-btn-warning" ' \
-                          f'onclick="navigateEdit(\'{record.id_}\', event)">Edit</button><br>'
+    row_html += '</div>'
+    # Close row
+    row_html += '</div>'
+    return row_html
 
-            table_html += '<button type="button" class="mo-btn mo-btn-danger" ' \
-                          f'onclick="navigateRemove(\'{record.id_}\', event)">Remove</button><br>'
 
-        table_html += '</div>'
-        # Close row
-        table_html += '</div>'
+def records_table(records: List) -> str:
+    table_html = '<div id="organizer_record_table" class="mo-container">'
+    table_html += '<div class="mo-row mo-row-header">'
+    table_html += '<div class="mo-col mo-col-preview"><span class="mo-text-header">Preview</span></div>'
+    table_html += '<div class="mo-col mo-col-type"><span class="mo-text-header">Type</span></div>'
+    table_html += '<div class="mo-col mo-col-name"><span class="mo-text-header">Name</span></div>'
+    table_html += '<div class="mo-col mo-col-description"><span class="mo-text-header">Description</span></div>'
+    table_html += '<div class="mo-col mo-col-actions"><span class="mo-text-header">Actions</span></div>'
+    table_html += '</div>'
+    table_html += _join_cached_fragments(records, _FRAGMENT_TABLE_ROW, _record_table_row)
     # Close table
     table_html += '</div>'
     return table_html
@@ -342,66 +397,64 @@ def record_details(record: Record) -> str:
     return content
 
 
-def records_cards(records: List) -> str:
-    content = '<div id="organizer_record_card_grid" class="mo-card-grid">'
+def _record_card(record: Record, nsfw_blur: bool) -> str:
+    contains_nsfw = any('nsfw' in group.lower() for group in record.groups) and nsfw_blur
 
-    nsfw_blur = env.nsfw_blur()
+    isLocalFileRecord = record.is_local_file_record()
 
-    for record in records:
-        contains_nsfw = any('nsfw' in group.lower() for group in record.groups) and nsfw_blur
-
-        isLocalFileRecord = record.is_local_file_record()
-        
-        # Taken from extra networks cards.
-        cardStr = f'<div class="mo-card {_model_card_type_css_class(record.model_type)} {"blur" if contains_nsfw else ""}"'
-        if not isLocalFileRecord:
-            cardStr += f'onclick="fillPrompt({record.id_})"'
-        cardStr += '>'    
+    # Taken from extra networks cards.
+    cardStr = f'<div class="mo-card {_model_card_type_css_class(record.model_type)} {"blur" if contains_nsfw else ""}"'
+    if not isLocalFileRecord:
+        cardStr += f' data-mo-record-id="{record.id_}" onclick="fillPrompt({record.id_})"'
+    cardStr += '>'    
 
-        content += cardStr
+    content = cardStr
 
-        preview_url = get_best_preview_url(record)
-        content += f'<img src="{preview_url}" alt="Preview Image" ' \
-                   f'onerror="this.onerror=null; this.src=\'{_no_preview_image_url()}\';"/>'
+    preview_url = get_best_preview_url(record)
+    content += f'<img src="{preview_url}" alt="Preview Image" ' \
+               f'onerror="this.onerror=null; this.src=\'{_no_preview_image_url()}\';"/>'
 
-        content += f'<div class="mo-card-blur-overlay-bottom">{html.escape(_limit_card_name(record.name))}</div>'
+    content += f'<div class="mo-card-blur-overlay-bottom">{html.escape(_limit_card_name(record.name))}</div>'
 
-        content += '<div class="mo-card-content-top">'
-        content += f'<div class="mo-card-text-left"><span class="mo-badge {_model_type_css_class(record.model_type)}"' \
-                   f'>{record.model_type.value}</span></div>'
-        content += '</div>'
+    content += '<div class="mo-card-content-top">'
+    content += f'<div class="mo-card-text-left"><span class="mo-badge {_model_type_css_class(record.model_type)}"' \
+               f'>{record.model_type.value}</span></div>'
+    content += '</div>'
 
-        content += '<div class="mo-card-hover">'
-        content += '<div class="mo-card-hover-buttons">'
+    content += '<div class="mo-card-hover">'
+    content += '<div class="mo-card-hover-buttons">'
 
-        if isLocalFileRecord:
-            json_record = html.escape(json.dumps(map_record_to_dict(record)))
+    if isLocalFileRecord:
+        content += '<button type="button" class="mo-btn mo-btn-success" ' \
+                   f'onclick="navigateAddLocalFile(\'{local_file_key(record.location)}\', event)">Add</button><br>'
 
-            content += '<button type="button" class="mo-btn mo-btn-success" ' \
-                       f'onclick="navigateEditPrefilled(\'{json_record}\', event)">Add</button><br>'
+        location = record.location.replace("\\", "\\\\")
+        content += '<button type="button" class="mo-btn mo-btn-danger" ' \
+                   f'onclick="navigateRemove(\'{location}\', event)">Remove</button><br>'
+    else:
+        content += '<button type="button" class="mo-btn mo-btn-success" ' \
+                   f'onclick="navigateDetails(\'{record.id_}\', event)">Details</button><br>'
 
-            location = record.location.replace("\\", "\\\\")
-            content += '<button type="button" class="mo-btn mo-btn-danger" ' \
-                       f'onclick="navigateRemove(\'{location}\', event)">Remove</button><br>'
-        else:
-            content += '<button type="button" class="mo-btn mo-btn-success" ' \
-                       f'onclick="navigateDetails(\'{record.id_}\', event)">Details</button><br>'
+        if record.is_download_possible():
+            content += '<button type="button" class="mo-btn mo-btn-primary" ' \
+                       f'onclick="navigateDownloadRecord(\'{record.id_}\', event)">Download</button><br>'
 
-            if record.is_download_possible():
-                content += '<button type="button" class="mo-btn mo-btn-primary" ' \
-                           f'onclick="navigateDownloadRecord(\'{record.id_}\', event)">Download</button><br>'
+        content += '<button type="button" class="mo-btn mo-btn-warning" ' \
+                   f'onclick="navigateEdit(\'{record.id_}\', event)">Edit</button><br>'
 
-            content += '<button type="button" class="mo-btn mo-btn-warning" ' \
-                       f'onclick="navigateEdit(\'{record.id_}\', event)">Edit</button><br>'
+        content += '<button type="button" class="mo-btn mo-btn-danger" ' \
+                   f'onclick="navigateRemove(\'{record.id_}\', event)">Remove</button><br>'
 
-            content += '<button type="button" class="mo-btn mo-btn-danger" ' \
-                       f'onclick="navigateRemove(\'{record.id_}\', event)">Remove</button><br>'
+    content += '</div>'
+    content += '</div>'
 
-        content += '</div>'
-        content += '</div>'
+    content += '</div>'
+    return content
 
-        content += '</div>'
 
+def records_cards(records: List) -> str:
+    content = '<div id="organizer_record_card_grid" class="mo-card-grid">'
+    content += _join_cached_fragments(records, _FRAGMENT_CARD, _record_card)
     content += '</div>'
     return content
 
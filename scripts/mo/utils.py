@@ -4,18 +4,12 @@ import json
 import os
 import re
 import urllib.parse
-import sys
-sys.path.append('extensions-builtin/Lora')
-import networks
 
 from typing import List
 
-from PIL import Image
-from PIL.PngImagePlugin import PngInfo
-
+import scripts.mo.metrics as metrics
 from scripts.mo.environment import env
 from scripts.mo.models import Record, ModelType
-from modules import sd_hijack
 
 _HASH_CACHE_FILENAME = 'hash_cache.json'
 
@@ -53,6 +47,7 @@ def is_valid_filename(filename: str) -> bool:
     return bool(pattern.match(filename))
 
 
+@metrics.SCAN_DURATION.time()
 def get_model_files_in_dir(lookup_dir: str) -> List:
     """
     Scans for model files in the lookup_dir, and it's child directories.
@@ -70,6 +65,7 @@ def get_model_files_in_dir(lookup_dir: str) -> List:
                 if ext in extensions:
                     filepath = os.path.join(subdir, file)
                     result.append(filepath)
+    metrics.SCANNED_FILES.inc(len(result))
     return result
 
 
@@ -141,6 +137,10 @@ def resize_preview_image(input_file, output_file):
     :param output_file: output image file path.
     :return: None
     """
+    # Pillow is imported on use, it is not needed by the rest of the helpers.
+    from PIL import Image
+    from PIL.PngImagePlugin import PngInfo
+
     image = Image.open(input_file)
     image_format = image.format
 
@@ -209,16 +209,22 @@ def calculate_file_temp_hash(file_path):
     return md5_hash.hexdigest()
 
 
-def calculate_sha256(file_path):
+def calculate_sha256(file_path, on_progress=None):
     """
     Calculates SHA256 file hash.
     :param file_path: target file path.
+    :param on_progress: callback called after each hashed megabyte.
     :return: SHA256 hex digest string.
     """
     with open(file_path, 'rb') as file:
         sha256_hash = hashlib.sha256()
-        while chunk := file.read(4096):
-            sha256_hash.update(chunk)
+        if on_progress is None:
+            while chunk := file.read(4096):
+                sha256_hash.update(chunk)
+        else:
+            while chunk := file.read(1024 * 1024):
+                sha256_hash.update(chunk)
+                on_progress()
     return sha256_hash.hexdigest()
 
 
@@ -242,16 +248,6 @@ def read_hash_cache() -> List:
     return []
 
 
-def write_hash_cache(hash_cache: List):
-    """
-    Writes hash cache data to file.
-    :param hash_cache: list of dictionaries to save.
-    :return: None.
-    """
-    with open(get_hash_cache_file(), 'w') as file:
-        json.dump(hash_cache, file, indent=4)
-
-
 def get_best_preview_url(record: Record) -> str:
     """
     Returns url to local preview file if it available otherwise returns record.preview_url
@@ -286,9 +282,11 @@ def get_json_record_data(id):
     result = {}
     if (id != None) and (isinstance(id, int)) and (id > 0):
         record = env.storage.get_record_by_id(id)
-        weight = 1 if record is None else record.weight
-        pos = '' if record is None else record.positive_prompts
-        neg = '' if record is None else record.negative_prompts
+        if record is None:
+            return {}
+        weight = record.weight
+        pos = record.positive_prompts
+        neg = record.negative_prompts
         isCheckPoint = False
         flname = os.path.basename(record.location) 
         if (record.model_type == ModelType.CHECKPOINT):  
@@ -296,10 +294,9 @@ def get_json_record_data(id):
             pos = flname  
 
         elif(record.model_type == ModelType.LORA or record.model_type == ModelType.LYCORIS):
-            lora_on_disk = networks.available_networks.get(get_model_filename_without_extension(flname))
-            if lora_on_disk is None:
+            alias = env.lora_alias(get_model_filename_without_extension(flname))
+            if alias is None:
                 return {}
-            alias = lora_on_disk.get_alias()
 
             activation_text = record.positive_prompts
             preferred_weight = record.weight
@@ -321,13 +318,13 @@ def get_json_record_data(id):
         
 
         elif(record.model_type == ModelType.EMBEDDING):
-            embedding = sd_hijack.model_hijack.embedding_db.word_embeddings.get(get_model_filename_without_extension(flname))
-            if embedding is None:
+            embedding_name = env.embedding_name(get_model_filename_without_extension(flname))
+            if embedding_name is None:
                 return {}
             if pos:
-                pos = embedding.name
+                pos = embedding_name
             if neg: 
-                neg = embedding.name 
+                neg = embedding_name 
 
 
         elif(record.model_type == ModelType.VAE or record.model_type == ModelType.OTHER):
@@ -1,13 +1,19 @@
+import sys
+import time
 from typing import Optional
 
+# Started before other imports to include them in the extension import time.
+_import_started_at = time.perf_counter()
+
 import gradio as gr
 import modules.scripts as scripts
 from fastapi import FastAPI
 from gradio import Blocks
 from modules import script_callbacks
-from modules import shared, sd_models, sd_vae, paths, ui_extra_networks
+from modules import shared, sd_models, sd_vae, sd_hijack, paths, ui_extra_networks
 from modules.shared import OptionInfo
 
+import scripts.mo.tracing as tracing
 from scripts.mo.api import init_extension_api
 from scripts.mo.data.init_storage import initialize_storage
 from scripts.mo.environment import *
@@ -63,6 +69,26 @@ def _default_embeddings_path() -> str:
         return os.path.join(paths.data_path, 'embeddings')
 
 
+def _default_blob_store_path() -> str:
+    return os.path.join(paths.models_path, 'mo-blob-store')
+
+
+def _lora_alias(name: str) -> Optional[str]:
+    # Built-in Lora extension may be loaded after this script, so its module is imported on use.
+    lora_extension_dir = os.path.join(paths.script_path, 'extensions-builtin', 'Lora')
+    if lora_extension_dir not in sys.path:
+        sys.path.append(lora_extension_dir)
+    import networks
+
+    network = networks.available_networks.get(name)
+    return network.get_alias() if network is not None else None
+
+
+def _embedding_name(name: str) -> Optional[str]:
+    embedding = sd_hijack.model_hijack.embedding_db.word_embeddings.get(name)
+    return embedding.name if embedding is not None else None
+
+
 def _lycoris_path() -> str:
     if hasattr(shared.opts, 'mo_lycoris_path') and shared.opts.mo_lycoris_path:
         return shared.opts.mo_lycoris_path
@@ -173,14 +199,97 @@ env.embeddings_path = (
     else _default_embeddings_path()
 )
 
+env.blob_store_enabled = (
+    lambda: shared.opts.mo_blob_store_enabled
+    if hasattr(shared.opts, 'mo_blob_store_enabled')
+    else False
+)
+
+env.blob_store_path = (
+    lambda: shared.opts.mo_blob_store_path
+    if hasattr(shared.opts, 'mo_blob_store_path') and shared.opts.mo_blob_store_path
+    else _default_blob_store_path()
+)
+
+env.shared_cache_path = (
+    lambda: shared.opts.mo_shared_cache_path
+    if hasattr(shared.opts, 'mo_shared_cache_path')
+    else ''
+)
+
+env.serve_blobs = (
+    lambda: shared.opts.mo_serve_blobs
+    if hasattr(shared.opts, 'mo_serve_blobs')
+    else False
+)
+
+env.api_control = (
+    lambda: shared.opts.mo_api_control
+    if hasattr(shared.opts, 'mo_api_control')
+    else False
+)
+
+env.peers = (
+    lambda: shared.opts.mo_peers
+    if hasattr(shared.opts, 'mo_peers')
+    else ''
+)
+
+env.mirror_racing = (
+    lambda: shared.opts.mo_mirror_racing
+    if hasattr(shared.opts, 'mo_mirror_racing')
+    else False
+)
+
+env.download_workers = (
+    lambda: shared.opts.mo_download_workers
+    if hasattr(shared.opts, 'mo_download_workers')
+    else 1
+)
+
+env.download_retries = (
+    lambda: shared.opts.mo_download_retries
+    if hasattr(shared.opts, 'mo_download_retries')
+    else 2
+)
+
+env.download_limit = (
+    lambda: shared.opts.mo_download_limit
+    if hasattr(shared.opts, 'mo_download_limit')
+    else 0
+)
+
+env.download_file_limit = (
+    lambda: shared.opts.mo_download_file_limit
+    if hasattr(shared.opts, 'mo_download_file_limit')
+    else 0
+)
+
+env.download_limit_schedule = (
+    lambda: shared.opts.mo_download_limit_schedule
+    if hasattr(shared.opts, 'mo_download_limit_schedule')
+    else ''
+)
+
+env.lora_alias = _lora_alias
+env.embedding_name = _embedding_name
+
 env.is_debug_mode_enabled = (
     lambda: hasattr(shared.cmd_opts, 'mo_debug') and shared.cmd_opts.mo_debug
 )
 
 env.script_dir = scripts.basedir()
+env.database_dir = (
+    lambda: shared.cmd_opts.mo_database_dir
+    if getattr(shared.cmd_opts, 'mo_database_dir', None)
+    else env.script_dir
+)
 env.theme = lambda: shared.cmd_opts.theme
 
+tracing.record('startup.import', (time.perf_counter() - _import_started_at) * 1000)
 
+
+@tracing.traced('startup.on_ui_settings')
 def on_ui_settings():
     opts = {
         'mo_layout': OptionInfo(
@@ -205,6 +314,27 @@ def on_ui_settings():
         'mo_autobind_file': OptionInfo(True, 'Automatically bind record to local file'),
         'mo_api_key': OptionInfo("", "Civitai API Key. Create an API key under 'https://civitai.com/user/account' all the way at the bottom. Don't share the token!"),
         'mo_check_duplicates': OptionInfo(False, "Should a duplicate check be performed, upon fetching a file from Civitai"),
+        'mo_blob_store_enabled': OptionInfo(False, 'Keep downloads in a content-addressed store and link them into model '
+                                                   'directories (same model is downloaded and stored once)'),
+        'mo_blob_store_path': OptionInfo('', f'Blob store directory, use the same drive as model directories to allow '
+                                             f'hardlinks (If empty uses default: {_default_blob_store_path()}):'),
+        'mo_shared_cache_path': OptionInfo('', 'Shared download cache directory, e.g. a network mount used by several '
+                                               'WebUI instances (disabled if empty):'),
+        'mo_serve_blobs': OptionInfo(False, 'Serve local model files by SHA256 to other Model Organizer instances '
+                                            '(/mo/blobs endpoint)'),
+        'mo_api_control': OptionInfo(False, 'Allow changing downloads and jobs via API (POST and DELETE requests '
+                                            'of /mo/downloads, /mo/jobs and /mo/debug endpoints)'),
+        'mo_peers': OptionInfo('', 'Comma separated URLs of other WebUI instances to download models from before '
+                                   'using model URLs, e.g. http://192.168.1.10:7860'),
+        'mo_mirror_racing': OptionInfo(False, 'Probe model and backup URLs concurrently and download from the faster '
+                                              'one, or from both at once if they serve the same file'),
+        'mo_download_workers': OptionInfo(1, 'Number of records downloaded from the queue at once (requires restart):'),
+        'mo_download_retries': OptionInfo(2, 'Number of retries of a failed queued download, delay between retries '
+                                             'grows from 30 seconds:'),
+        'mo_download_limit': OptionInfo(0, 'Total download speed limit in KiB/s (0 is unlimited):'),
+        'mo_download_file_limit': OptionInfo(0, 'Speed limit of each download in KiB/s (0 is unlimited):'),
+        'mo_download_limit_schedule': OptionInfo('', 'Total download speed limit by time of day in KiB/s, overrides '
+                                                     'the total limit, e.g. "01:00-07:00=0, 09:00-18:00=2048":'),
     }
 
     dir_opts = {
@@ -240,9 +370,11 @@ def on_ui_settings():
 
     mo_options = shared.options_section(('mo', 'Model Organizer'), opts)
     shared.options_templates.update(mo_options)
-    initialize_storage()
+    with tracing.span('startup.initialize_storage'):
+        initialize_storage()
 
 
+@tracing.traced('startup.on_ui_tabs')
 def on_ui_tabs():
     # if env.is_debug_mode_enabled():  # TODO Remove these lines
     #     ui_extra_networks.allowed_dirs.add(
@@ -267,8 +399,13 @@ def on_ui_tabs():
     return ((main_ui_block(), "Model Organizer", "model_organizer"),)
 
 
+@tracing.traced('startup.on_app_started')
 def on_app_started(demo: Optional[Blocks], app: FastAPI):
+    from scripts.mo.dl.download_queue import DownloadQueue
+
     init_extension_api(app)
+    # Started with the app to resume downloads queued before restart.
+    DownloadQueue.instance()
 
 
 script_callbacks.on_ui_settings(on_ui_settings)
@@ -0,0 +1,34 @@
+import argparse
+import os
+import sys
+
+import pytest
+
+_EXTENSION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EXTENSION_DIR not in sys.path:
+    sys.path.insert(0, _EXTENSION_DIR)
+
+
+def configure_env(webui_dir: str, *options: str):
+    """
+    Sets up the environment and SQLite storage the same way as the CLI does, data is kept in webui_dir.
+    :param webui_dir: directory with models and extension data.
+    :param options: settings overrides in the "mo_option=value" format.
+    """
+    from scripts.mo.cli import _configure_env
+
+    data_dir = os.path.join(webui_dir, 'mo-data')
+    os.makedirs(data_dir, exist_ok=True)
+    _configure_env(argparse.Namespace(webui_dir=webui_dir, models_dir=None, data_dir=data_dir, database_dir=None,
+                                      set=list(options)))
+
+
+@pytest.fixture(scope='session')
+def mo_env(tmp_path_factory):
+    """
+    Environment shared by the test session, singletons like HashIndex keep the first data dir they were created with.
+    """
+    from scripts.mo.environment import env
+
+    configure_env(str(tmp_path_factory.mktemp('webui')))
+    return env
@@ -0,0 +1,130 @@
+import functools
+import hashlib
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts.mo.dl.blob_store import BlobLock, _LOCK_STALE_SECONDS
+
+_EXTENSION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_FETCH_SCRIPT = textwrap.dedent('''
+    import sys
+    sys.path.insert(0, sys.argv[1])
+    from tests.conftest import configure_env
+    configure_env(sys.argv[2], 'mo_shared_cache_path=' + sys.argv[3], 'mo_download_preview=false')
+
+    from scripts.mo.dl.blob_store import BlobStore
+    from scripts.mo.dl.download_manager import DownloadManager
+    from scripts.mo.dl.http_downloader import HttpDownloader
+    from scripts.mo.models import Record, ModelType
+
+    record = Record(id_=1, name='model', model_type=ModelType.OTHER, download_url=sys.argv[4], url='',
+                    download_path='', download_filename='', preview_url='', description='', positive_prompts='',
+                    negative_prompts='', sha256_hash='', md5_hash='', created_at=0, groups=[], subdir='')
+    manager = DownloadManager()
+    manager._stop_event.clear()
+    fetch = manager._fetch_via_shared_cache(BlobStore.shared_cache(), None, HttpDownloader(), sys.argv[4],
+                                            'model.bin', record, sys.argv[5])
+    try:
+        while True:
+            next(fetch)
+    except StopIteration as ex:
+        print(ex.value)
+''')
+
+
+def _age(path: str, seconds: float):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_fresh_lock_is_not_taken_over(tmp_path):
+    path = str(tmp_path / 'blob.lock')
+    first, second = BlobLock(path), BlobLock(path)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    first.release()
+    assert second.try_acquire()
+
+
+def test_stale_lock_takeover_is_not_released_by_previous_holder(tmp_path):
+    path = str(tmp_path / 'blob.lock')
+    first, second, third = BlobLock(path), BlobLock(path), BlobLock(path)
+
+    assert first.try_acquire()
+    _age(path, _LOCK_STALE_SECONDS + 1)
+    assert second.try_acquire()
+
+    # The first holder comes back after the takeover, the lock of the second one stays.
+    first.release()
+    assert os.path.exists(path)
+    assert not third.try_acquire()
+
+    second.release()
+    assert not os.path.exists(path)
+    assert not [name for name in os.listdir(tmp_path) if name != 'blob.lock']
+
+
+def test_refreshed_lock_is_not_taken_over(tmp_path):
+    path = str(tmp_path / 'blob.lock')
+    first, second = BlobLock(path), BlobLock(path)
+
+    assert first.try_acquire()
+    _age(path, _LOCK_STALE_SECONDS + 1)
+    stale_token = second._read_token(path)
+    # Refreshed by the holder between the stale check and the takeover.
+    os.utime(path)
+
+    assert not second._remove_if_owned_by(stale_token, stale_only=True)
+    assert second._read_token(path) == first._token
+
+
+def test_two_processes_fetch_shared_file_once(tmp_path):
+    served_dir = tmp_path / 'served'
+    served_dir.mkdir()
+    content = os.urandom(2 * 1024 * 1024)
+    (served_dir / 'model.bin').write_bytes(content)
+
+    requests_count = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_count.append(self.path)
+            # Slow enough for both processes to ask for the file while it is being downloaded.
+            time.sleep(1)
+            super().do_GET()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=str(served_dir)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/model.bin'
+    cache_dir = tmp_path / 'cache'
+
+    try:
+        processes = []
+        for index in range(2):
+            webui_dir = tmp_path / f'node{index}'
+            webui_dir.mkdir()
+            processes.append(subprocess.Popen(
+                [sys.executable, '-c', _FETCH_SCRIPT, _EXTENSION_DIR, str(webui_dir), str(cache_dir), url,
+                 str(webui_dir / 'model.bin')],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True))
+        outputs = [process.communicate(timeout=120) for process in processes]
+    finally:
+        server.shutdown()
+
+    expected_sha256 = hashlib.sha256(content).hexdigest()
+    for process, (stdout, stderr) in zip(processes, outputs):
+        assert process.returncode == 0, stderr
+        assert stdout.strip().splitlines()[-1] == expected_sha256
+    assert requests_count == ['/model.bin']
+    for index in range(2):
+        assert (tmp_path / f'node{index}' / 'model.bin').read_bytes() == content
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+import requests
+import uvicorn
+from fastapi import FastAPI
+
+from scripts.mo.api import _parse_range, init_extension_api
+from scripts.mo.dl import peer_downloader
+from scripts.mo.dl.peer_downloader import PeerDownloader, peer_url
+
+_SIZE = 1000
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, _SIZE - 1)),
+    ('bytes=-100', (_SIZE - 100, _SIZE - 1)),
+    ('bytes=-5000', (0, _SIZE - 1)),
+    ('bytes=900-5000', (900, _SIZE - 1)),
+    (' bytes=0-0 ', (0, 0)),
+    ('bytes=1000-', None),
+    ('bytes=500-100', None),
+    ('bytes=-', None),
+    ('bytes=0-10,20-30', None),
+    ('items=0-10', None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, _SIZE) == expected
+
+
+@pytest.fixture()
+def blob_server(mo_env, monkeypatch, tmp_path):
+    content = os.urandom(3 * 1024 * 1024 + 123)
+    sha256 = hashlib.sha256(content).hexdigest()
+    blob_path = tmp_path / 'model.safetensors'
+    blob_path.write_bytes(content)
+
+    monkeypatch.setattr(mo_env, 'serve_blobs', lambda: True)
+    monkeypatch.setattr(peer_downloader, 'find_blob_file', lambda value: str(blob_path) if value == sha256 else None)
+
+    head_requests = []
+    app = FastAPI()
+
+    @app.middleware('http')
+    async def count_head_requests(request, call_next):
+        if request.method == 'HEAD':
+            head_requests.append(request.url.path)
+        return await call_next(request)
+
+    init_extension_api(app)
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=0, log_level='error'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    url = f'http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}'
+    try:
+        yield url, sha256, content, head_requests
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def test_blob_partial_content(blob_server):
+    url, sha256, content, _ = blob_server
+
+    response = requests.get(f'{url}/mo/blobs/{sha256}', headers={'Range': 'bytes=100-1048675'})
+    assert response.status_code == 206
+    assert response.headers['content-range'] == f'bytes 100-1048675/{len(content)}'
+    assert response.content == content[100:1048676]
+
+    response = requests.get(f'{url}/mo/blobs/{sha256}', headers={'Range': 'bytes=-10'})
+    assert response.status_code == 206
+    assert response.content == content[-10:]
+
+    response = requests.get(f'{url}/mo/blobs/{sha256}')
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_blob_range_not_satisfiable(blob_server):
+    url, sha256, content, _ = blob_server
+
+    response = requests.get(f'{url}/mo/blobs/{sha256}', headers={'Range': f'bytes={len(content)}-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{len(content)}'
+
+
+def test_blob_serving_disabled(blob_server, mo_env, monkeypatch):
+    url, sha256, _, _ = blob_server
+    monkeypatch.setattr(mo_env, 'serve_blobs', lambda: False)
+
+    assert requests.get(f'{url}/mo/blobs/{sha256}').status_code == 403
+
+
+def test_peer_download_reuses_probed_peers(blob_server, mo_env, monkeypatch, tmp_path):
+    url, sha256, content, head_requests = blob_server
+    monkeypatch.setattr(mo_env, 'peers', lambda: url)
+    destination = tmp_path / 'downloaded.safetensors'
+
+    downloader = PeerDownloader()
+    assert downloader.check_url_available(peer_url(sha256)) == (True, None)
+    for _ in downloader.download(peer_url(sha256), str(destination), 'model', threading.Event()):
+        pass
+
+    assert destination.read_bytes() == content
+    assert head_requests == [f'/mo/blobs/{sha256}']
+
+
+def test_peer_download_missing_file_keeps_destination(blob_server, mo_env, monkeypatch, tmp_path):
+    url, _, _, _ = blob_server
+    monkeypatch.setattr(mo_env, 'peers', lambda: url)
+    destination = tmp_path / 'existing.safetensors'
+    destination.write_bytes(b'existing')
+
+    with pytest.raises(Exception, match='not found on peers'):
+        for _ in PeerDownloader().download(peer_url('0' * 64), str(destination), 'model', threading.Event()):
+            pass
+
+    assert destination.read_bytes() == b'existing'
+
+
+def test_timings_reset_requires_api_control(blob_server, mo_env, monkeypatch):
+    url = blob_server[0]
+
+    monkeypatch.setattr(mo_env, 'api_control', lambda: False)
+    assert requests.post(f'{url}/mo/debug/timings/reset').status_code == 403
+
+    monkeypatch.setattr(mo_env, 'api_control', lambda: True)
+    assert requests.post(f'{url}/mo/debug/timings/reset').json() == {'reset': True}
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import threading
+
+import scripts.mo.data.civitai_backfill as civitai_backfill
+from scripts.mo.models import ModelType
+
+
+class _Response:
+    def __init__(self, status_code: int, data=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class _Job:
+    def __init__(self):
+        self.cancel_event = threading.Event()
+
+    def is_cancelled(self):
+        return False
+
+    def progress(self, *args, **kwargs):
+        pass
+
+
+def _version(sha256: str, version_id: int) -> dict:
+    return {'id': version_id, 'files': [{'hashes': {'SHA256': sha256.upper()}}]}
+
+
+def test_hashes_missing_from_bulk_response_are_looked_up_one_by_one(mo_env, monkeypatch, tmp_path):
+    lora_dir = tmp_path / 'Lora'
+    lora_dir.mkdir()
+    monkeypatch.setattr(mo_env, 'lora_path', lambda: str(lora_dir))
+    monkeypatch.setattr(mo_env, 'script_dir', str(tmp_path))
+
+    hashes = {}
+    for name in ('bulk', 'single', 'missing'):
+        content = os.urandom(1024)
+        (lora_dir / f'{name}.safetensors').write_bytes(content)
+        hashes[name] = hashlib.sha256(content).hexdigest()
+
+    requested = []
+
+    def request(method, url, **kwargs):
+        requested.append((method, url))
+        if method == 'POST':
+            # Truncated bulk response, only the first hash is returned.
+            return _Response(200, [_version(hashes['bulk'], 1)])
+        if url.endswith(hashes['single']):
+            return _Response(200, _version(hashes['single'], 2))
+        return _Response(404)
+
+    monkeypatch.setattr(civitai_backfill.requests, 'request', request)
+
+    counters = civitai_backfill.run_civitai_backfill(_Job())
+
+    assert counters['found'] == 2 and counters['not_found'] == 1 and counters['errors'] == 0
+    assert ('GET', civitai_backfill._BY_HASH_URL.format(hash=hashes['bulk'])) not in requested
+    with open(lora_dir / 'single.civitai.info') as file:
+        assert json.load(file)['id'] == 2
+    with open(tmp_path / 'civitai_backfill.json') as file:
+        state = json.load(file)
+    assert {sha256: entry['status'] for sha256, entry in state.items()} == {
+        hashes['bulk']: civitai_backfill.LOOKUP_FOUND,
+        hashes['single']: civitai_backfill.LOOKUP_FOUND,
+        hashes['missing']: civitai_backfill.LOOKUP_NOT_FOUND,
+    }
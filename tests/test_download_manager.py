@@ -0,0 +1,102 @@
+import functools
+import hashlib
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scripts.mo.dl.download_manager import DownloadManager
+from scripts.mo.models import Record, ModelType
+
+_SERVED_NAME = 'served.safetensors'
+
+
+@pytest.fixture()
+def model_server(tmp_path):
+    served_dir = tmp_path / 'served'
+    served_dir.mkdir()
+    requests_log = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_log.append(self.path)
+            # Civitai-like URL without extension, the filename comes from Content-Disposition.
+            with open(served_dir / 'model.bin', 'rb') as file:
+                content = file.read()
+            self.send_response(200)
+            self.send_header('Content-Disposition', f'attachment; filename="{_SERVED_NAME}"')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_HEAD(self):
+            requests_log.append(self.path)
+            self.send_response(200)
+            self.end_headers()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=str(served_dir)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/api/download/models/1', served_dir, requests_log
+    finally:
+        server.shutdown()
+
+
+@pytest.fixture()
+def blob_store_env(mo_env, monkeypatch, tmp_path):
+    models_dir = tmp_path / 'models'
+    models_dir.mkdir()
+    monkeypatch.setattr(mo_env, 'blob_store_enabled', lambda: True)
+    monkeypatch.setattr(mo_env, 'blob_store_path', lambda: str(tmp_path / 'store'))
+    monkeypatch.setattr(mo_env, 'download_preview', lambda: False)
+    return models_dir
+
+
+def _record(url: str, download_path: str, sha256_hash: str = '') -> Record:
+    return Record(id_=None, name='model', model_type=ModelType.OTHER, download_url=url,
+                  download_path=download_path, sha256_hash=sha256_hash)
+
+
+def _download(mo_env, record: Record) -> dict:
+    mo_env.storage.add_record(record)
+    record.id_ = max(item.id_ for item in mo_env.storage.get_all_records(list_view=True))
+    return DownloadManager.download_record(record, threading.Event())
+
+
+def test_stored_model_url_is_not_requested(mo_env, model_server, blob_store_env):
+    url, served_dir, requests_log = model_server
+    (served_dir / 'model.bin').write_bytes(os.urandom(64 * 1024))
+
+    first = _download(mo_env, _record(url, str(blob_store_env / 'first')))
+    assert first['filename'] == _SERVED_NAME
+    requests_log.clear()
+
+    second = _download(mo_env, _record(url, str(blob_store_env / 'second')))
+
+    assert requests_log == []
+    assert second['filename'] == _SERVED_NAME
+    assert (blob_store_env / 'second' / _SERVED_NAME).read_bytes() == (served_dir / 'model.bin').read_bytes()
+
+
+@pytest.mark.parametrize('store_option', ['blob_store', 'shared_cache'])
+def test_url_hit_with_other_hash_is_downloaded_again(mo_env, model_server, blob_store_env, monkeypatch, tmp_path,
+                                                     store_option):
+    url, served_dir, requests_log = model_server
+    if store_option == 'shared_cache':
+        monkeypatch.setattr(mo_env, 'blob_store_enabled', lambda: False)
+        monkeypatch.setattr(mo_env, 'shared_cache_path', lambda: str(tmp_path / 'cache'))
+    (served_dir / 'model.bin').write_bytes(os.urandom(64 * 1024))
+    _download(mo_env, _record(url, str(blob_store_env / 'old')))
+
+    # The URL serves another file now, the record knows its hash.
+    new_content = os.urandom(64 * 1024)
+    (served_dir / 'model.bin').write_bytes(new_content)
+    requests_log.clear()
+    state = _download(mo_env, _record(url, str(blob_store_env / 'new'), hashlib.sha256(new_content).hexdigest()))
+
+    assert requests_log
+    assert (blob_store_env / 'new' / state['filename']).read_bytes() == new_content
@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from scripts.mo.jobs import JobManager, JOB_COMPLETED, JOB_FAILED, FINISHED_STATUSES, _MAX_WORKERS
+
+
+def _wait_finished(manager: JobManager, job_id: str, timeout: float = 10) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get_job(job_id)
+        if job['status'] in FINISHED_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'Job {job_id} did not finish: {job}')
+
+
+def test_not_serializable_result_fails_job(mo_env, monkeypatch, tmp_path):
+    monkeypatch.setattr(mo_env, 'database_dir', lambda: str(tmp_path))
+    manager = JobManager()
+
+    job = _wait_finished(manager, manager.submit('test', 'Not serializable', lambda job: {'value': object()}))
+
+    assert job['status'] == JOB_FAILED
+    assert 'not JSON serializable' in job['error']
+
+
+def test_workers_survive_failed_save(mo_env, monkeypatch, tmp_path):
+    monkeypatch.setattr(mo_env, 'database_dir', lambda: str(tmp_path))
+    manager = JobManager()
+    save = manager._save
+
+    def failing_save(job):
+        if job['status'] in FINISHED_STATUSES and job['title'] == 'Broken':
+            raise sqlite3.OperationalError('database is locked')
+        save(job)
+
+    monkeypatch.setattr(manager, '_save', failing_save)
+    for _ in range(_MAX_WORKERS + 1):
+        manager.submit('test', 'Broken', lambda job: 1)
+    job = _wait_finished(manager, manager.submit('test', 'Healthy', lambda job: 2))
+
+    assert job['status'] == JOB_COMPLETED
+    assert job['result'] == 2
+    # Jobs which could not be saved don't stay running in memory.
+    assert manager.find_active_job('test') is None
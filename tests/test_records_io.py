@@ -0,0 +1,30 @@
+import io
+import json
+
+import pytest
+
+import scripts.mo.data.records_io as records_io
+
+_ARRAYS = [
+    '[123456789, 5]',
+    '[1.5e10,-2.25 , 3]',
+    '[ true, false, null, "a string", {"id": 1, "groups": ["x", "y"]}, [1, 2] ]',
+    '[]',
+    '[12345678901234567890]',
+]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64])
+@pytest.mark.parametrize('content', _ARRAYS)
+def test_iterate_json_array_with_values_split_across_chunks(monkeypatch, content, chunk_size):
+    monkeypatch.setattr(records_io, '_CHUNK_SIZE', chunk_size)
+
+    assert list(records_io._iterate_json_array(io.StringIO(content))) == json.loads(content)
+
+
+@pytest.mark.parametrize('content', ['[1, 2', '[1 2]', '{"id": 1}', '[1,'])
+def test_iterate_json_array_rejects_malformed_content(monkeypatch, content):
+    monkeypatch.setattr(records_io, '_CHUNK_SIZE', 2)
+
+    with pytest.raises(ValueError):
+        list(records_io._iterate_json_array(io.StringIO(content)))
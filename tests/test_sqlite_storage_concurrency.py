@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+import time
+
+from scripts.mo.data.sqlite_storage import SQLiteStorage
+from scripts.mo.models import Record, ModelType
+
+_READERS = 12
+_WRITERS = 2
+_DURATION = 3
+
+
+def _record(index: int) -> Record:
+    return Record(id_=None, name=f'model {index}', model_type=ModelType.LORA,
+                  download_url=f'https://example.com/{index}.safetensors', groups=['stress'])
+
+
+def test_concurrent_readers_and_writers(mo_env, monkeypatch, tmp_path):
+    monkeypatch.setattr(mo_env, 'database_dir', lambda: str(tmp_path))
+    storage = SQLiteStorage()
+    for index in range(200):
+        storage.add_record(_record(index))
+
+    errors = []
+    counters = {'reads': 0, 'writes': 0}
+    counters_lock = threading.Lock()
+    deadline = time.time() + _DURATION
+
+    def run(fn):
+        try:
+            while time.time() < deadline:
+                fn()
+        except Exception as ex:
+            errors.append(ex)
+
+    def read(index: int):
+        def fn():
+            if index % 2:
+                records = storage.get_all_records(list_view=True)
+            else:
+                records = list(storage.iterate_all_records())
+            assert len(records) >= 200
+            with counters_lock:
+                counters['reads'] += 1
+        return fn
+
+    def write(index: int):
+        def fn():
+            records = storage.get_all_records()[:50]
+            for record in records:
+                record.description = f'updated by writer {index} at {time.time()}'
+            storage.update_records(records)
+            storage.add_record(_record(1000 + index))
+            with counters_lock:
+                counters['writes'] += 1
+        return fn
+
+    threads = [threading.Thread(target=run, args=(read(index),)) for index in range(_READERS)] + \
+              [threading.Thread(target=run, args=(write(index),)) for index in range(_WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    storage.close()
+
+    assert not [error for error in errors if isinstance(error, sqlite3.OperationalError)]
+    assert not errors
+    assert counters['reads'] > 0 and counters['writes'] > 0
+
+
+def test_iterate_all_records_does_not_hold_connection(mo_env, monkeypatch, tmp_path):
+    monkeypatch.setattr(mo_env, 'database_dir', lambda: str(tmp_path))
+    storage = SQLiteStorage()
+    for index in range(1200):
+        storage.add_record(_record(index))
+
+    iterator = storage.iterate_all_records()
+    first = next(iterator)
+    # The batch is fetched, the connection is back in the pool while the consumer holds the iterator.
+    assert storage._pool._local.connection is None
+    storage.add_record(_record(5000))
+
+    records = [first] + list(iterator)
+    storage.close()
+
+    assert [record.id_ for record in records] == sorted(record.id_ for record in records)
+    assert len(records) == 1201